@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Offline přepočet COP a energie z historického CSV
+
+Použití: python lgscan.py analyze scan.csv [--by hour|day] [--out report.csv]
+
+Dlouhý CSV formát lgscan (jeden řádek = jeden registr v jedné iteraci)
+se po dávkách převádí na matici iterace × registr a COP, tepelný výkon
+a energie se počítají vektorově (NumPy) se stejnými podmínkami jako
+evaluate_cop() v lgscan.py. Výsledkem jsou hodinové nebo denní souhrny.
+Paměť je omezená velikostí dávky (--chunk), ne velikostí souboru.
+"""
+
+import argparse
+import csv
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from csvstream import DEFAULT_TOLERANCE, iter_chunks
+from energy import (COMPRESSOR_REG, DEFAULT_MAX_GAP, DEFROST_REG, FLOW_RATE_REG, INLET_TEMP_REG,
+                    OPERATION_REG, OUTLET_TEMP_REG, POWER_REGS, WATER_CP)
+
+# Sloupce matice iterací (pořadí registrů)
+COLUMNS = (FLOW_RATE_REG, OUTLET_TEMP_REG, INLET_TEMP_REG) + POWER_REGS + (
+    COMPRESSOR_REG, DEFROST_REG, OPERATION_REG)
+COLUMN_INDEX = {reg: i for i, reg in enumerate(COLUMNS)}
+
+DEFAULT_CHUNK = 50000      # Počet iterací v jedné dávce
+
+# Sloupce výstupní tabulky
+REPORT_HEADER = ['period', 'samples', 'cop_samples', 'cop_mean', 'cop_min', 'cop_max',
+                 'electrical_kwh', 'thermal_kwh', 'energy_cop']
+
+
+def iter_cycle_chunks(csv_file: Path, chunk_size: int = DEFAULT_CHUNK,
+                      tolerance: float = DEFAULT_TOLERANCE,
+                      scales: Optional[Dict[int, float]] = None,
+                      start=None, end=None) -> Iterator[Tuple[np.ndarray, List[str], List[str], np.ndarray]]:
+    """
+    Převede dlouhý CSV na dávky iterací (snímky z csvstream).
+
+    Args:
+        csv_file: Vstupní CSV (formát lgscan)
+        chunk_size: Počet iterací v dávce
+        tolerance: Max. rozptyl časů řádků jedné iterace [s]
+        scales: Volitelně nová měřítka {reg: scale} - hodnota se přepočítá z raw
+        start, end: Časový rozsah (viz csvstream.iter_snapshots)
+
+    Yields:
+        (epoch časy, klíče hodin, klíče dnů, matice hodnot [iterace × COLUMNS] s NaN)
+    """
+    scales = scales or {}
+    for chunk in iter_chunks(csv_file, chunk_size, columns=('raw', 'scaled'), start=start, end=end,
+                             registers=COLUMNS, ok_only=True, tolerance=tolerance):
+        matrix = np.full((len(chunk), len(COLUMNS)), np.nan)
+        epochs = np.empty(len(chunk))
+        hours, days = [], []
+        for i, snapshot in enumerate(chunk):
+            epochs[i] = snapshot.epoch
+            moment = snapshot.moment
+            hours.append(moment.strftime('%Y-%m-%d %H:00'))
+            days.append(moment.strftime('%Y-%m-%d'))
+            for reg, row in snapshot.rows.items():
+                matrix[i, COLUMN_INDEX[reg]] = (row['raw'] * scales[reg] if reg in scales
+                                                else row['scaled'])
+        yield epochs, hours, days, matrix
+
+
+def forward_fill(matrix: np.ndarray, carry: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Doplní chybějící hodnoty (NaN) poslední známou hodnotou sloupce.
+
+    Odpovídá živému režimu, kde se COP počítá z posledních úspěšných
+    hodnot všech registrů (registry s delší periodou, výpadky čtení).
+    """
+    if carry is not None:
+        matrix = np.vstack([carry, matrix])
+    n = matrix.shape[0]
+    positions = np.where(np.isnan(matrix), 0, np.arange(n)[:, None])
+    np.maximum.accumulate(positions, axis=0, out=positions)
+    filled = matrix[positions, np.arange(matrix.shape[1])]
+    return filled[1:] if carry is not None else filled
+
+
+def evaluate_cop_vectorized(values: np.ndarray, water_cp: float = WATER_CP) -> Dict[str, np.ndarray]:
+    """
+    Vektorová obdoba evaluate_cop() z lgscan.py pro matici iterací.
+
+    Returns:
+        Slovník polí: 'cop' (NaN kde podmínky nejsou splněny), 'electrical_power'
+        a 'thermal_power' (se znaménkem ΔT, pro integraci energie)
+    """
+    column = {reg: values[:, i] for i, reg in enumerate(COLUMNS)}
+    flow = column[FLOW_RATE_REG]
+    delta_temp = column[OUTLET_TEMP_REG] - column[INLET_TEMP_REG]
+
+    # Příkon z 30018, záložně 40018
+    power = column[POWER_REGS[0]]
+    for reg in POWER_REGS[1:]:
+        power = np.where(np.isnan(power), column[reg], power)
+    power = np.maximum(power, 0.0)
+
+    compressor, defrost, operation = column[COMPRESSOR_REG], column[DEFROST_REG], column[OPERATION_REG]
+    status_known = ~(np.isnan(compressor) | np.isnan(defrost) | np.isnan(operation))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        thermal_cop = flow / 60.0 * water_cp * np.abs(delta_temp)
+        cop = thermal_cop / power
+        valid = (~np.isnan(flow) & ~np.isnan(delta_temp) & ~np.isnan(power)
+                 & (~status_known | ((compressor == 1) & (defrost == 0) & (operation == 2)))
+                 & (flow > 0) & (power > 0) & (np.abs(delta_temp) >= 0.05)
+                 & (cop >= 0.1) & (cop <= 25.0))
+
+        # Tepelný výkon pro energii - jako energy.thermal_power()
+        thermal = np.where((flow <= 0) | (compressor == 0), 0.0, flow / 60.0 * water_cp * delta_temp)
+
+    return {
+        'cop': np.where(valid, cop, np.nan),
+        'electrical_power': power,
+        'thermal_power': thermal,
+    }
+
+
+class Aggregator:
+    """Souhrny po obdobích (hodina / den) - velikost roste s délkou historie, ne s počtem řádků."""
+
+    def __init__(self):
+        self.periods = {}
+
+    def add(self, keys: List[str], cop: np.ndarray, electrical: np.ndarray, thermal: np.ndarray) -> None:
+        unique, inverse = np.unique(np.array(keys), return_inverse=True)
+        count = len(unique)
+        has_cop = ~np.isnan(cop)
+        cop_values = np.where(has_cop, cop, 0.0)
+
+        samples = np.bincount(inverse, minlength=count)
+        cop_samples = np.bincount(inverse, weights=has_cop, minlength=count)
+        cop_sum = np.bincount(inverse, weights=cop_values, minlength=count)
+        electrical_kwh = np.bincount(inverse, weights=electrical, minlength=count)
+        thermal_kwh = np.bincount(inverse, weights=thermal, minlength=count)
+        cop_min = np.full(count, np.inf)
+        cop_max = np.full(count, -np.inf)
+        np.minimum.at(cop_min, inverse[has_cop], cop[has_cop])
+        np.maximum.at(cop_max, inverse[has_cop], cop[has_cop])
+
+        for i, key in enumerate(unique.tolist()):
+            period = self.periods.get(key)
+            if period is None:
+                period = self.periods[key] = [0, 0, 0.0, np.inf, -np.inf, 0.0, 0.0]
+            period[0] += int(samples[i])
+            period[1] += int(cop_samples[i])
+            period[2] += float(cop_sum[i])
+            period[3] = min(period[3], float(cop_min[i]))
+            period[4] = max(period[4], float(cop_max[i]))
+            period[5] += float(electrical_kwh[i])
+            period[6] += float(thermal_kwh[i])
+
+    def rows(self) -> Iterator[List]:
+        """Řádky výstupní tabulky (REPORT_HEADER) seřazené podle období."""
+        for key in sorted(self.periods):
+            samples, cop_samples, cop_sum, cop_min, cop_max, electrical, thermal = self.periods[key]
+            yield [
+                key,
+                samples,
+                cop_samples,
+                f"{cop_sum / cop_samples:.2f}" if cop_samples else "",
+                f"{cop_min:.2f}" if cop_samples else "",
+                f"{cop_max:.2f}" if cop_samples else "",
+                f"{electrical:.3f}",
+                f"{thermal:.3f}",
+                f"{thermal / electrical:.2f}" if electrical > 0 else "",
+            ]
+
+
+def analyze(csv_file: Path, by: str = 'day', chunk_size: int = DEFAULT_CHUNK,
+            tolerance: float = DEFAULT_TOLERANCE, max_gap: float = DEFAULT_MAX_GAP,
+            scales: Optional[Dict[int, float]] = None, water_cp: float = WATER_CP,
+            start=None, end=None) -> Aggregator:
+    """
+    Přepočítá COP a energii z CSV po dávkách.
+
+    Energie se integruje lichoběžníkovou metodou mezi po sobě jdoucími
+    iteracemi (mezery delší než max_gap se přeskakují) a připisuje se
+    období koncové iterace - stejně jako EnergyIntegrator.
+    """
+    aggregator = Aggregator()
+    carry = None        # Poslední doplněný řádek předchozí dávky
+    previous = None     # (epoch, el. kW, tepelný kW) poslední iterace předchozí dávky
+
+    chunks = iter_cycle_chunks(csv_file, chunk_size, tolerance, scales, start, end)
+    for epochs, hours, days, matrix in chunks:
+        values = forward_fill(matrix, carry)
+        carry = values[-1:].copy()
+        computed = evaluate_cop_vectorized(values, water_cp)
+
+        electrical = computed['electrical_power']
+        thermal = computed['thermal_power']
+        if previous is not None:
+            start_epochs = np.concatenate([[previous[0]], epochs[:-1]])
+            start_electrical = np.concatenate([[previous[1]], electrical[:-1]])
+            start_thermal = np.concatenate([[previous[2]], thermal[:-1]])
+        else:
+            start_epochs = np.concatenate([[np.nan], epochs[:-1]])
+            start_electrical = np.concatenate([[np.nan], electrical[:-1]])
+            start_thermal = np.concatenate([[np.nan], thermal[:-1]])
+
+        dt = epochs - start_epochs
+        usable = (dt > 0) & (dt <= max_gap)
+        with np.errstate(invalid='ignore'):
+            electrical_kwh = np.where(usable, (start_electrical + electrical) / 2.0 * dt / 3600.0, 0.0)
+            thermal_kwh = np.where(usable, (start_thermal + thermal) / 2.0 * dt / 3600.0, 0.0)
+        electrical_kwh = np.nan_to_num(electrical_kwh)
+        thermal_kwh = np.nan_to_num(thermal_kwh)
+
+        aggregator.add(hours if by == 'hour' else days, computed['cop'], electrical_kwh, thermal_kwh)
+        previous = (epochs[-1], electrical[-1], thermal[-1])
+
+    return aggregator
+
+
+def parse_scale(value: str) -> Tuple[int, float]:
+    """Převede volbu --scale REG=MĚŘÍTKO."""
+    try:
+        reg, scale = value.split('=', 1)
+        return int(reg), float(scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Neplatné měřítko: {value} (očekáváno REG=MĚŘÍTKO)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Vstupní bod podpříkazu analyze."""
+    parser = argparse.ArgumentParser(
+        prog="lgscan.py analyze",
+        description="Offline přepočet COP a energie z CSV (hodinové/denní souhrny)"
+    )
+    parser.add_argument('csv', type=Path, help='Vstupní CSV z lgscan (--out)')
+    parser.add_argument('--by', choices=['hour', 'day'], default='day',
+                        help='Období souhrnu (default: day)')
+    parser.add_argument('--out', type=Path, default=None,
+                        help='Výstupní CSV se souhrny (default: standardní výstup)')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK,
+                        help=f'Počet iterací v jedné dávce (default: {DEFAULT_CHUNK})')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Max. rozptyl časů řádků jedné iterace v sekundách (starší CSV)')
+    parser.add_argument('--max-gap', type=float, default=DEFAULT_MAX_GAP,
+                        help='Delší mezera mezi iteracemi se do energie nepočítá (sekundy)')
+    parser.add_argument('--scale', type=parse_scale, action='append', default=[], metavar='REG=SCALE',
+                        help='Opravené měřítko registru - hodnota se přepočítá z raw (lze opakovat)')
+    parser.add_argument('--from', dest='start', type=datetime.fromisoformat, default=None,
+                        help='Začátek rozsahu (ISO čas, např. 2025-11-01)')
+    parser.add_argument('--to', dest='end', type=datetime.fromisoformat, default=None,
+                        help='Konec rozsahu (ISO čas, bez)')
+    parser.add_argument('--cp', type=float, default=WATER_CP,
+                        help=f'Měrná tepelná kapacita vody kJ/(kg·K) (default: {WATER_CP})')
+
+    args = parser.parse_args(argv)
+
+    if not args.csv.exists():
+        print(f"CSV soubor neexistuje: {args.csv}", file=sys.stderr)
+        return 1
+    if args.chunk < 1:
+        print(f"Neplatná velikost dávky: {args.chunk}", file=sys.stderr)
+        return 1
+
+    aggregator = analyze(args.csv, args.by, args.chunk, args.tolerance, args.max_gap,
+                         dict(args.scale), args.cp, args.start, args.end)
+
+    if args.out:
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_HEADER)
+            writer.writerows(aggregator.rows())
+        print(f"📊 {len(aggregator.periods)} období → {args.out}")
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(REPORT_HEADER)
+        writer.writerows(aggregator.rows())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
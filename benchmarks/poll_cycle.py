@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Benchmark dotazovacího cyklu (end-to-end proti lokálnímu simulátoru)
+
+Každý vstupní bod běží v samostatném procesu proti SimulatorThread
+(simulator.py) se stejnou mapou registrů a pevným seedem:
+    scan        - lgscan.scan_registers (CSV + log)
+    simple      - lgscan.simple_monitor (CSV + log)
+    smooth      - lgscan.smooth_table_monitor (CSV + log, diff renderer)
+    modbus_tcp  - modbus_tcp.read_modbus_register pro každý registr REGISTRY
+
+Měří se za cyklus:
+    wall_ms        - doba cyklu (čtení, pauzy mezi dotazy, zpracování)
+    cpu_ms         - CPU čas hlavního vlákna rozdělený na read (read_registers_indexed),
+                     compute (update_trends, evaluate_cop), write (CSV, log, SQLite)
+                     a render (zbytek cyklu - formátování a výpis)
+    requests       - Modbus dotazy, které dorazily na simulátor
+    bytes          - bajty na drátě (dotazy i odpovědi včetně MBAP hlavičky)
+    terminal_bytes - znaky poslané na terminál
+a za celý běh peak_rss_kb (max. RSS procesu včetně simulátoru ve vlákně).
+
+Registry se čtou v každém cyklu (periody z YAML se ignorují) a mezi cykly
+se nečeká. Konzole se zahazuje, soubory jdou do dočasného adresáře.
+
+Použití:
+    python benchmarks/poll_cycle.py --out bench.json
+    python benchmarks/poll_cycle.py --delay-ms 50 --baseline bench.json --threshold 10
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENTRY_POINTS = ('scan', 'simple', 'smooth', 'modbus_tcp')
+PHASES = ('read', 'compute', 'render', 'write')
+
+# Metriky hlídané proti baseline (vše: méně je lépe)
+REGRESSION_METRICS = (
+    ('wall_ms', 'mean'),
+    ('cpu_ms', 'total'),
+    ('requests', None),
+    ('bytes', None),
+    ('peak_rss_kb', None),
+)
+
+
+class TerminalCounter:
+    """Náhrada sys.stdout - výstup zahodí, jen spočítá znaky."""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, text: str) -> int:
+        self.written += len(text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+class CycleRecorder:
+    """
+    Měření po cyklech: wall a CPU čas, CPU čas fází, dotazy a bajty simulátoru.
+
+    next_cycle() se volá na začátku každého cyklu (uzavře předchozí);
+    vrací False, jakmile je změřeno dost cyklů. Prvních warmup cyklů
+    (sestavení plánů, první vykreslení) se do výsledků nepočítá.
+    """
+
+    def __init__(self, sim_stats: Dict, terminal: TerminalCounter, cycles: int, warmup: int):
+        self.sim_stats = sim_stats
+        self.terminal = terminal
+        self.cycles = cycles
+        self.warmup = warmup
+        self.completed = 0
+        self.samples = []
+        self.failed_reads = 0
+        self.phase_cpu = dict.fromkeys(PHASES, 0.0)
+        self.active_phase = None
+        self.started = None
+
+    def _snapshot(self) -> tuple:
+        return (time.perf_counter(), time.thread_time(), dict(self.phase_cpu),
+                self.sim_stats['requests'], self.sim_stats['bytes_in'] + self.sim_stats['bytes_out'],
+                self.terminal.written)
+
+    def next_cycle(self) -> bool:
+        if self.started is not None:
+            wall, cpu, phases, requests, wire, terminal = self._snapshot()
+            wall0, cpu0, phases0, requests0, wire0, terminal0 = self.started
+            self.completed += 1
+            if self.completed > self.warmup:
+                split = {phase: phases[phase] - phases0[phase] for phase in PHASES}
+                split['render'] = max(0.0, (cpu - cpu0) - sum(split.values()))
+                self.samples.append({'wall': wall - wall0, 'cpu': cpu - cpu0, 'phases': split,
+                                     'requests': requests - requests0, 'bytes': wire - wire0,
+                                     'terminal': terminal - terminal0})
+        if len(self.samples) >= self.cycles:
+            self.started = None
+            return False
+        self.started = self._snapshot()
+        return True
+
+    def timed(self, phase: str, func):
+        """Obalí funkci měřením CPU času fáze (vnořená volání se počítají jednou)."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.active_phase is not None:
+                return func(*args, **kwargs)
+            self.active_phase = phase
+            started = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.phase_cpu[phase] += time.thread_time() - started
+                self.active_phase = None
+        return wrapper
+
+    def summary(self) -> Dict:
+        walls = sorted(sample['wall'] * 1000 for sample in self.samples)
+        count = len(self.samples)
+        cpu = {phase: sum(sample['phases'][phase] for sample in self.samples) * 1000 / count
+               for phase in PHASES}
+        cpu['total'] = sum(sample['cpu'] for sample in self.samples) * 1000 / count
+        wall = {'mean': statistics.fmean(walls), 'median': statistics.median(walls),
+                'p95': walls[min(count - 1, int(count * 0.95))], 'min': walls[0], 'max': walls[-1]}
+        return {
+            'cycles': count,
+            'wall_ms': {key: round(value, 3) for key, value in wall.items()},
+            'cpu_ms': {key: round(value, 3) for key, value in cpu.items()},
+            'requests': sum(sample['requests'] for sample in self.samples) / count,
+            'bytes': sum(sample['bytes'] for sample in self.samples) / count,
+            'terminal_bytes': sum(sample['terminal'] for sample in self.samples) / count,
+            'failed_reads': self.failed_reads,
+        }
+
+
+def patch(owner, name: str, wrapper) -> None:
+    setattr(owner, name, wrapper(getattr(owner, name)))
+
+
+def instrument_lgscan(recorder: CycleRecorder) -> None:
+    """Napojí měření na funkce, které režimy lgscan volají přes globální jména."""
+    import lgscan
+
+    def read(func):
+        timed = recorder.timed('read', func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            results = timed(*args, **kwargs)
+            recorder.failed_reads += sum(1 for result in results.values() if not result['ok'])
+            return results
+        return wrapper
+
+    def wait(func):
+        @functools.wraps(func)
+        def wrapper(scheduler):
+            # Ctrl+C je u všech režimů čisté ukončení (zavření sinků v finally)
+            if not recorder.next_cycle():
+                raise KeyboardInterrupt
+            return func(scheduler)
+        return wrapper
+
+    patch(lgscan, 'read_registers_indexed', read)
+    patch(lgscan.PollScheduler, 'wait', wait)
+    for owner, name in ((lgscan, 'update_trends'), (lgscan, 'evaluate_cop')):
+        patch(owner, name, functools.partial(recorder.timed, 'compute'))
+    for owner, name in ((lgscan.CsvSink, 'write_rows'), (lgscan.CsvSink, 'write_cycle'),
+                        (lgscan.CsvSink, 'end_cycle'), (lgscan.LogSink, 'line'), (lgscan.LogSink, 'write'),
+                        (lgscan, 'write_results_to_log'), (lgscan.SqliteSink, 'write_cycle')):
+        patch(owner, name, functools.partial(recorder.timed, 'write'))
+
+
+def bench_mode(entry: str, config: Dict, recorder: CycleRecorder, workdir: Path, settings: Dict) -> None:
+    import lgscan
+
+    instrument_lgscan(recorder)
+    options = {'log_file': workdir / 'scan.log',
+               'db_file': workdir / 'history.sqlite' if settings['db'] else None}
+    if entry == 'scan':
+        lgscan.scan_registers(config, workdir / 'scan.csv', interval=0, **options)
+    elif entry == 'simple':
+        lgscan.simple_monitor(config, 0, workdir / 'scan.csv', **options)
+    else:
+        lgscan.smooth_table_monitor(config, 0, workdir / 'scan.csv', **options)
+
+
+def bench_modbus_tcp(entry: str, config: Dict, recorder: CycleRecorder, workdir: Path, settings: Dict) -> None:
+    import modbus_tcp
+
+    connection = config['connection']
+    read = recorder.timed('read', modbus_tcp.read_modbus_register)
+    registers = sorted(modbus_tcp.REGISTRY.items())
+    while recorder.next_cycle():
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        for register, reg_info in registers:
+            raw, value, success = read(connection['host'], reg_info, connection['timeout'], connection['port'])
+            if success:
+                print(f"{timestamp}  {register}  raw={raw:4d}  value={value:.3f}{reg_info['unit']}")
+            else:
+                recorder.failed_reads += 1
+                print(f"{timestamp}  {register}  ❌ CHYBA: Čtení selhalo")
+
+
+RUNNERS = {'scan': bench_mode, 'simple': bench_mode, 'smooth': bench_mode, 'modbus_tcp': bench_modbus_tcp}
+
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS vrací bajty
+
+
+def run_worker(entry: str, settings: Dict) -> Dict:
+    """Změří jeden vstupní bod (v samostatném procesu kvůli peak RSS)."""
+    import lgscan
+    from modbus_tcp import REGISTRY
+    from simulator import RegisterMap, SimulatorThread
+
+    config = lgscan.load_config(Path(settings['yaml']))
+    for desc in config['descriptors']:
+        desc.period = None  # Celý plán v každém cyklu
+    connection = config['connection']
+    if settings['delay_ms'] is not None:
+        # Pevná pauza (stejné meze = adaptivní řízení vypnuto)
+        connection.update(delay_ms=settings['delay_ms'], delay_min_ms=settings['delay_ms'],
+                          delay_max_ms=settings['delay_ms'])
+
+    # Smooth režim ořezává snímek na výšku terminálu a maže obrazovku přes os.system
+    os.environ.update(COLUMNS='200', LINES='200')
+    os.system = lambda command: 0
+
+    register_map = RegisterMap(config['descriptors'], REGISTRY)
+    with SimulatorThread(register_map, latency=settings['latency_ms'] / 1000.0,
+                         jitter=settings['jitter_ms'] / 1000.0, seed=settings['seed']) as sim:
+        connection.update(host='127.0.0.1', port=sim.port)
+        terminal = TerminalCounter()
+        recorder = CycleRecorder(sim.stats, terminal, settings['cycles'], settings['warmup'])
+        with tempfile.TemporaryDirectory(prefix='lgscan-bench-') as workdir:
+            stdout = sys.stdout
+            sys.stdout = terminal
+            try:
+                RUNNERS[entry](entry, config, recorder, Path(workdir), settings)
+            finally:
+                sys.stdout = stdout
+
+    if len(recorder.samples) < settings['cycles']:
+        raise RuntimeError(f"změřeno jen {len(recorder.samples)} z {settings['cycles']} cyklů")
+    result = recorder.summary()
+    result['peak_rss_kb'] = peak_rss_kb()
+    return result
+
+
+def run_entry(entry: str, settings: Dict) -> Dict:
+    """Spustí měření vstupního bodu v novém interpretu a vrátí jeho výsledek."""
+    with tempfile.TemporaryDirectory(prefix='lgscan-bench-') as tmp:
+        result_file = Path(tmp) / 'result.json'
+        command = [sys.executable, str(Path(__file__).resolve()), '--worker', entry,
+                   '--settings', json.dumps(settings), '--result', str(result_file)]
+        completed = subprocess.run(command, cwd=ROOT)
+        if completed.returncode != 0 or not result_file.exists():
+            raise RuntimeError(f"měření {entry} selhalo (kód {completed.returncode})")
+        return json.loads(result_file.read_text(encoding='utf-8'))
+
+
+def metric_value(result: Dict, key: str, field: Optional[str]):
+    value = result.get(key)
+    return value.get(field) if field and isinstance(value, dict) else value
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Vrátí popisy metrik horších než baseline o více než threshold procent."""
+    regressions = []
+    for entry, result in current['results'].items():
+        previous = baseline.get('results', {}).get(entry)
+        if previous is None:
+            continue
+        for key, field in REGRESSION_METRICS:
+            new = metric_value(result, key, field)
+            old = metric_value(previous, key, field)
+            if not new or not old:
+                continue
+            change = (new - old) / old * 100
+            if change > threshold:
+                label = f"{key}.{field}" if field else key
+                regressions.append(f"{entry} {label}: {old:.2f} → {new:.2f} (+{change:.1f} %)")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                   capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def format_result(entry: str, result: Dict) -> str:
+    wall = result['wall_ms']
+    cpu = result['cpu_ms']
+    split = " / ".join(f"{cpu[phase]:.2f}" for phase in PHASES)
+    rss = f"{result['peak_rss_kb'] / 1024:.1f} MB" if result['peak_rss_kb'] else "n/a"
+    line = (f"⏱️ {entry:<11} {wall['mean']:8.2f} ms/cyklus (p95 {wall['p95']:.2f}) | "
+            f"CPU {cpu['total']:.2f} ms (read/compute/render/write {split}) | "
+            f"📦 {result['requests']:.1f} dotazů, {result['bytes']:.0f} B | 💾 RSS {rss}")
+    if result['failed_reads']:
+        line += f" | ⚠️ chybných čtení: {result['failed_reads']}"
+    return line
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark dotazovacího cyklu lgscan proti lokálnímu simulátoru"
+    )
+    parser.add_argument('--yaml', type=Path, default=ROOT / 'registers.yaml',
+                        help='Konfigurace registrů (připojení se přesměruje na simulátor)')
+    parser.add_argument('--entry', action='append', choices=ENTRY_POINTS,
+                        help='Měřený vstupní bod (lze opakovat; default: všechny)')
+    parser.add_argument('--cycles', type=int, default=30, help='Počet měřených cyklů (default: 30)')
+    parser.add_argument('--warmup', type=int, default=2, help='Počet úvodních neměřených cyklů (default: 2)')
+    parser.add_argument('--latency', type=float, default=5, metavar='MS',
+                        help='Latence odpovědi simulátoru v ms (default: 5)')
+    parser.add_argument('--jitter', type=float, default=0, metavar='MS',
+                        help='Rozptyl latence simulátoru v ms (default: 0)')
+    parser.add_argument('--delay-ms', type=float, default=None,
+                        help='Pevná pauza mezi dotazy místo adaptivní z YAML')
+    parser.add_argument('--db', action='store_true', help='Měřit i zápis do SQLite (--db)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed simulátoru (default: 1)')
+    parser.add_argument('--out', type=Path, default=Path('benchmark.json'),
+                        help='Výstupní JSON (default: benchmark.json)')
+    parser.add_argument('--baseline', type=Path, help='Předchozí JSON pro porovnání')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Povolené zhoršení proti baseline v procentech (default: 10)')
+    parser.add_argument('--worker', choices=ENTRY_POINTS, help=argparse.SUPPRESS)
+    parser.add_argument('--settings', help=argparse.SUPPRESS)
+    parser.add_argument('--result', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = run_worker(args.worker, json.loads(args.settings))
+        args.result.write_text(json.dumps(result), encoding='utf-8')
+        return 0
+
+    if args.cycles < 1 or args.warmup < 0:
+        parser.error("--cycles musí být alespoň 1 a --warmup nezáporný")
+    if not args.yaml.exists():
+        print(f"Konfigurační soubor neexistuje: {args.yaml}", file=sys.stderr)
+        return 1
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            print(f"Nelze načíst baseline {args.baseline}: {e}", file=sys.stderr)
+            return 1
+
+    settings = {'yaml': str(args.yaml.resolve()), 'cycles': args.cycles, 'warmup': args.warmup,
+                'latency_ms': args.latency, 'jitter_ms': args.jitter, 'delay_ms': args.delay_ms,
+                'db': args.db, 'seed': args.seed}
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': settings,
+        'results': {},
+    }
+
+    print(f"🏁 Benchmark: {args.cycles} cyklů (+{args.warmup} zahřívací), latence simulátoru {args.latency:g} ms")
+    for entry in args.entry or ENTRY_POINTS:
+        try:
+            result = run_entry(entry, settings)
+        except RuntimeError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        report['results'][entry] = result
+        print(format_result(entry, result))
+
+    args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+    print(f"💾 Výsledky: {args.out}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ Zhoršení proti {args.baseline} (> {args.threshold:g} %):")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"✅ Bez zhoršení proti {args.baseline} (práh {args.threshold:g} %)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
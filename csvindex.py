@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Časový index CSV výstupu (sidecar soubor scan.csv.idx)
+
+Pro každý časový kbelík (výchozí 1 minuta) drží bajtový offset první
+iterace, která do kbelíku spadá. Dotaz na rozsah si binárním vyhledáním
+v indexu (O(log n), index se nenačítá celý) najde offset, skočí na něj
+a čte jen odpovídající řádky - multi-GB CSV se neprochází od začátku.
+
+Formát: hlavička (MAGIC, velikost kbelíku) a záznamy pevné délky
+(začátek kbelíku v epoch sekundách, offset v CSV), seřazené podle času.
+
+Odolnost proti pádu: záznamy se do indexu zapisují až po flush
+(případně fsync) dat CSV, na která ukazují, a při otevření se
+odříznou záznamy mířící za konec platných dat. Index proto nikdy
+neukazuje za data; v nejhorším chybí poslední kbelíky a dotaz
+začne číst o kus dřív.
+
+Při rotaci (--roll) má index každý prostý segment zvlášť; dotaz čte
+přes všechny segmenty a komprimované (bez indexu) čte celé.
+
+Použití:
+    python lgscan.py query scan.csv --from "2025-11-18 06:00" --to "2025-11-18 09:00"
+    python lgscan.py query scan.csv --rebuild
+"""
+
+import argparse
+import csv
+import os
+import struct
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from segments import is_compressed, open_segment, segment_files
+
+INDEX_SUFFIX = '.idx'
+MAGIC = b'LGIDX001'
+HEADER = struct.Struct('<8sq')   # MAGIC, velikost kbelíku [s]
+RECORD = struct.Struct('<qq')    # začátek kbelíku [epoch s], offset v CSV [B]
+
+DEFAULT_BUCKET = 60              # Velikost časového kbelíku [s]
+
+
+def index_path(csv_file: Path) -> Path:
+    """Cesta k indexu pro CSV soubor (scan.csv → scan.csv.idx)."""
+    csv_file = Path(csv_file)
+    return csv_file.with_name(csv_file.name + INDEX_SUFFIX)
+
+
+def _epoch(moment) -> float:
+    """Převede čas (datetime, ISO text nebo epoch) na epoch."""
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    if isinstance(moment, str):
+        return datetime.fromisoformat(moment).timestamp()
+    return float(moment)
+
+
+def _read_header(f) -> int:
+    """Přečte hlavičku indexu a vrátí velikost kbelíku."""
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError("Index je prázdný nebo poškozený")
+    magic, bucket = HEADER.unpack(data)
+    if magic != MAGIC or bucket <= 0:
+        raise ValueError("Neplatný formát indexu")
+    return bucket
+
+
+def _starts_line(csv_handle, offset: int) -> bool:
+    """True, pokud offset leží na začátku řádku v CSV (před ním je konec řádku)."""
+    if offset == 0:
+        return True
+    csv_handle.seek(offset - 1)
+    return csv_handle.read(1) == b'\n'
+
+
+def _valid_records(index_file: Path, csv_file: Path) -> int:
+    """
+    Počet platných záznamů od začátku indexu.
+
+    Platný záznam ukazuje na začátek řádku uvnitř CSV a časy i offsety
+    rostou. Kontroluje se odzadu - po pádu bývají neplatné jen poslední.
+    """
+    csv_size = csv_file.stat().st_size
+    with open(index_file, 'rb') as f, open(csv_file, 'rb') as csv_handle:
+        _read_header(f)
+        count = (os.fstat(f.fileno()).st_size - HEADER.size) // RECORD.size
+        while count > 0:
+            f.seek(HEADER.size + (count - 1) * RECORD.size)
+            _, offset = RECORD.unpack(f.read(RECORD.size))
+            if offset < csv_size and _starts_line(csv_handle, offset):
+                break
+            count -= 1
+    return count
+
+
+class CsvIndex:
+    """
+    Index otevřený pro dotazy - binární vyhledávání přímo v souboru.
+
+    Záznamy mířící za konec CSV nebo doprostřed řádku se ignorují.
+    """
+
+    def __init__(self, csv_file: Path):
+        self.csv_file = Path(csv_file)
+        self.index_file = index_path(self.csv_file)
+        self.file = open(self.index_file, 'rb')
+        self.bucket = _read_header(self.file)
+        self.count = _valid_records(self.index_file, self.csv_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def record(self, position: int):
+        """Záznam (začátek kbelíku, offset) na pozici."""
+        self.file.seek(HEADER.size + position * RECORD.size)
+        return RECORD.unpack(self.file.read(RECORD.size))
+
+    def find_offset(self, start) -> Optional[int]:
+        """
+        Offset, od kterého stačí číst pro data od času start.
+
+        Vrátí offset posledního kbelíku, který začíná nejpozději v čase
+        start, nebo None, pokud index takový kbelík nemá (číst od začátku).
+        """
+        target = _epoch(start)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle)[0] <= target:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        return self.record(low - 1)[1]
+
+
+def find_offset(csv_file: Path, start) -> Optional[int]:
+    """
+    Offset v CSV pro čtení od času start podle indexu.
+
+    Vrátí None, pokud index neexistuje, je neplatný nebo nepomůže.
+    """
+    if not index_path(csv_file).exists():
+        return None
+    try:
+        with CsvIndex(csv_file) as index:
+            return index.find_offset(start)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+class IndexWriter:
+    """
+    Průběžná údržba indexu při zápisu CSV (používá CsvSink).
+
+    note() si zapamatuje offset první iterace v novém kbelíku, commit()
+    zapíše čekající záznamy - volá se až po flush dat CSV.
+    """
+
+    def __init__(self, csv_file: Path, bucket: int = DEFAULT_BUCKET, fsync: bool = False):
+        self.csv_file = Path(csv_file)
+        self.index_file = index_path(self.csv_file)
+        self.fsync = fsync
+        self.pending = []
+        self.last_bucket = None
+
+        count = 0
+        if self.index_file.exists() and self.csv_file.exists():
+            try:
+                with open(self.index_file, 'rb') as f:
+                    self.bucket = _read_header(f)
+                count = _valid_records(self.index_file, self.csv_file)
+            except (ValueError, struct.error):
+                count = None  # Poškozený index - začne se znovu
+        else:
+            count = None
+
+        if count is None:
+            self.bucket = bucket
+            self.file = open(self.index_file, 'wb')
+            self.file.write(HEADER.pack(MAGIC, self.bucket))
+            self.file.flush()
+        else:
+            # Odříznutí neplatného konce (po pádu) a pokračování v zápisu
+            self.file = open(self.index_file, 'r+b')
+            self.file.truncate(HEADER.size + count * RECORD.size)
+            if count:
+                self.file.seek(HEADER.size + (count - 1) * RECORD.size)
+                self.last_bucket = RECORD.unpack(self.file.read(RECORD.size))[0]
+            self.file.seek(0, os.SEEK_END)
+
+    def note(self, moment: datetime, offset: int) -> None:
+        """Zaznamená iteraci začínající na offsetu (jen první v kbelíku)."""
+        epoch = moment.timestamp()
+        bucket = int(epoch // self.bucket) * self.bucket
+        # Čas, který jde zpět (posun hodin), index nerozbije - záznamy zůstanou seřazené
+        if self.last_bucket is None or bucket > self.last_bucket:
+            self.pending.append(RECORD.pack(bucket, offset))
+            self.last_bucket = bucket
+
+    def commit(self) -> None:
+        """Zapíše čekající záznamy (data CSV už musí být na disku)."""
+        if not self.pending:
+            return
+        self.file.write(b''.join(self.pending))
+        self.pending = []
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.commit()
+            self.file.close()
+
+
+class CountingFile:
+    """Obal textového souboru, který počítá zapsané bajty (UTF-8) bez flush."""
+
+    __slots__ = ('file', 'position')
+
+    def __init__(self, file, position: int):
+        self.file = file
+        self.position = position
+
+    def write(self, text: str) -> int:
+        self.position += len(text) if text.isascii() else len(text.encode('utf-8'))
+        return self.file.write(text)
+
+
+def rebuild_index(csv_file: Path, bucket: int = DEFAULT_BUCKET) -> int:
+    """
+    Sestaví index znovu z existujícího CSV (atomicky přes .tmp).
+
+    Returns:
+        Počet záznamů indexu
+    """
+    csv_file = Path(csv_file)
+    index_file = index_path(csv_file)
+    tmp_file = index_file.with_name(index_file.name + '.tmp')
+    count = 0
+    last_bucket = None
+    last_ts = None
+
+    with open(csv_file, 'rb') as f, open(tmp_file, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, bucket))
+        header = f.readline()
+        if header.split(b',', 1)[0].strip() != b'ts':
+            raise ValueError(f"CSV nemá čas v prvním sloupci: {csv_file}")
+        offset = len(header)
+        for line in f:
+            ts = line.split(b',', 1)[0]
+            if ts != last_ts and line.endswith(b'\n'):
+                try:
+                    epoch = datetime.fromisoformat(ts.decode('ascii')).timestamp()
+                except (UnicodeDecodeError, ValueError):
+                    epoch = None  # Pokračování víceřádkové hodnoty
+                if epoch is not None:
+                    last_ts = ts
+                    line_bucket = int(epoch // bucket) * bucket
+                    if last_bucket is None or line_bucket > last_bucket:
+                        out.write(RECORD.pack(line_bucket, offset))
+                        last_bucket = line_bucket
+                        count += 1
+            offset += len(line)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_file, index_file)
+    return count
+
+
+def iter_rows(csv_file: Path, start=None, end=None,
+              registers: Optional[List[int]] = None) -> Iterator[List[str]]:
+    """
+    Řádky CSV v časovém rozsahu <start, end) - čtení začne na offsetu z indexu.
+
+    Čte se přes všechny segmenty souboru (viz segments.py); segmenty mimo
+    rozsah se přeskočí, komprimované se čtou celé.
+
+    Yields:
+        Hlavička (jednou) a pak odpovídající řádky (seznamy textových hodnot)
+    """
+    start_epoch = _epoch(start) if start is not None else None
+    end_epoch = _epoch(end) if end is not None else None
+    registers = {str(reg) for reg in registers} if registers else None
+    header_sent = False
+
+    for segment in segment_files(csv_file, start_epoch, end_epoch):
+        offset = None
+        if start_epoch is not None and not is_compressed(segment):
+            offset = find_offset(segment, start_epoch)
+
+        with open_segment(segment) as f:
+            header_line = f.readline()
+            if not header_line:
+                continue
+            header = next(csv.reader([header_line]))
+            if not header_sent:
+                yield header
+                header_sent = True
+            if offset is not None:
+                f.seek(offset)
+            ts_col, reg_col = header.index('ts'), header.index('reg')
+
+            last_ts = None
+            in_range = False
+            for row in csv.reader(f):
+                if len(row) != len(header):
+                    continue
+                ts = row[ts_col]
+                if ts != last_ts:
+                    epoch = datetime.fromisoformat(ts).timestamp()
+                    if end_epoch is not None and epoch >= end_epoch:
+                        return
+                    in_range = start_epoch is None or epoch >= start_epoch
+                    last_ts = ts
+                if in_range and (registers is None or row[reg_col] in registers):
+                    yield row
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Vstupní bod podpříkazu query."""
+    parser = argparse.ArgumentParser(
+        prog="lgscan.py query",
+        description="Výběr časového rozsahu z CSV pomocí indexu (scan.csv.idx)"
+    )
+    parser.add_argument('csv', type=Path, help='CSV z lgscan (--out)')
+    parser.add_argument('--from', dest='start', type=datetime.fromisoformat, default=None,
+                        help='Začátek rozsahu (ISO čas, např. "2025-11-18 06:00")')
+    parser.add_argument('--to', dest='end', type=datetime.fromisoformat, default=None,
+                        help='Konec rozsahu (ISO čas, bez)')
+    parser.add_argument('--reg', type=int, action='append', default=None,
+                        help='Jen vybraný registr (lze opakovat)')
+    parser.add_argument('--out', type=Path, default=None,
+                        help='Výstupní CSV (default: standardní výstup)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Sestaví index znovu z CSV a skončí')
+    parser.add_argument('--bucket', type=int, default=DEFAULT_BUCKET,
+                        help=f'Velikost kbelíku při --rebuild v sekundách (default: {DEFAULT_BUCKET})')
+
+    args = parser.parse_args(argv)
+
+    if not args.csv.exists():
+        print(f"CSV soubor neexistuje: {args.csv}", file=sys.stderr)
+        return 1
+
+    if args.rebuild:
+        if args.bucket < 1:
+            print(f"Neplatná velikost kbelíku: {args.bucket}", file=sys.stderr)
+            return 1
+        count = rebuild_index(args.csv, args.bucket)
+        print(f"🗂️  Index {index_path(args.csv)}: {count} záznamů")
+        return 0
+
+    rows = iter_rows(args.csv, args.start, args.end, args.reg)
+    if args.out:
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            count = -1
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        print(f"📄 {count} řádků → {args.out}")
+    else:
+        writer = csv.writer(sys.stdout)
+        try:
+            for row in rows:
+                writer.writerow(row)
+        except BrokenPipeError:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Streamové čtení CSV výstupu lgscan
+
+Dlouhý CSV formát (jeden řádek = jeden registr v jedné iteraci) se čte
+řádek po řádku a skládá do snímků iterací - generátor nikdy nedrží víc
+než jednu iteraci (případně jednu dávku), takže i roční historie
+s ~130 M řádky se zpracuje v konstantní paměti.
+
+Řádky se společným časem patří do jedné iterace. Jakmile má soubor
+víc řádků se stejným časem, je to CSV s časem iterace a každý další čas
+začíná novou iteraci (i iteraci jen s registry s kratší periodou).
+U starších CSV (čas po řádcích) začíná nová iterace, když se dvojice
+(registr, název) v iteraci opakuje nebo čas překročí toleranci od
+začátku iterace. registers.yaml může mít jeden registr pod více názvy
+(40001, 40002) - takové řádky patří do stejné iterace.
+
+Čte se přes všechny segmenty souboru (--roll), prosté i komprimované.
+
+Použití:
+    for snapshot in iter_snapshots('scan.csv', columns=('raw',), start=od, end=do):
+        snapshot.value(30004, 'raw')
+"""
+
+import csv
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from csvindex import find_offset
+from segments import is_compressed, open_segment, segment_files
+
+DEFAULT_TOLERANCE = 10.0   # Max. rozptyl časů řádků jedné iterace [s]
+DEFAULT_CHUNK = 10000      # Počet snímků v jedné dávce (iter_chunks)
+
+# Převod textových hodnot sloupců CSV na typy výsledku čtení
+CONVERTERS = {
+    'reg': int,
+    'address0': int,
+    'raw': lambda value: int(value) if value != '' else None,
+    'scaled': lambda value: float(value) if value != '' else None,
+    'delta': lambda value: float(value) if value != '' else None,
+    'previous_value': lambda value: float(value) if value != '' else None,
+    'ok': lambda value: value == 'True',
+    'cop': lambda value: float(value) if value != '' else None,
+}
+
+# Výchozí projekce sloupců
+DEFAULT_COLUMNS = ('name', 'raw', 'scaled', 'unit', 'ok')
+
+
+class Snapshot:
+    """
+    Jedna iterace čtení z CSV.
+
+    rows: {reg: {sloupec: hodnota}} jen s projektovanými sloupci; registr
+          čtený pod více názvy (stejná adresa a tabulka) má řádek prvního z nich
+    """
+
+    __slots__ = ('ts', 'epoch', 'rows')
+
+    def __init__(self, ts: str, epoch: float):
+        self.ts = ts          # Čas prvního řádku iterace (ISO text z CSV)
+        self.epoch = epoch    # Tentýž čas jako Unix epoch
+        self.rows = {}
+
+    @property
+    def moment(self) -> datetime:
+        """Čas iterace jako datetime."""
+        return datetime.fromisoformat(self.ts)
+
+    def value(self, reg: int, column: str = 'scaled'):
+        """Hodnota sloupce registru nebo None, pokud registr v iteraci chybí."""
+        row = self.rows.get(reg)
+        return row.get(column) if row is not None else None
+
+    def __repr__(self) -> str:
+        return f"Snapshot({self.ts}, {len(self.rows)} registrů)"
+
+
+def _epoch(moment) -> Optional[float]:
+    """Převede hranici časového filtru (datetime, ISO text nebo epoch) na epoch."""
+    if moment is None:
+        return None
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    if isinstance(moment, str):
+        return datetime.fromisoformat(moment).timestamp()
+    return float(moment)
+
+
+def iter_segment_rows(csv_file: Path, start_epoch: Optional[float] = None,
+                      end_epoch: Optional[float] = None) -> Iterator[tuple]:
+    """
+    Řádky CSV přes všechny segmenty (viz segments.py) v chronologickém pořadí.
+
+    Segmenty mimo rozsah se přeskočí; u prostých souborů s indexem se
+    čtení začne na offsetu začátku rozsahu.
+
+    Yields:
+        (hlavička, iterátor řádků) pro každý segment
+    """
+    for segment in segment_files(csv_file, start_epoch, end_epoch):
+        offset = None
+        if start_epoch is not None and not is_compressed(segment):
+            offset = find_offset(segment, start_epoch)
+        with open_segment(segment) as f:
+            header_line = f.readline()
+            if not header_line:
+                continue
+            header = next(csv.reader([header_line]))
+            if offset is not None:
+                f.seek(offset)
+            yield header, csv.reader(f)
+
+
+def iter_snapshots(csv_file: Path, columns: Optional[Sequence[str]] = None,
+                   start=None, end=None, registers: Optional[Iterable[int]] = None,
+                   ok_only: bool = False, tolerance: float = DEFAULT_TOLERANCE) -> Iterator[Snapshot]:
+    """
+    Generátor snímků iterací z CSV.
+
+    Args:
+        csv_file: Vstupní CSV (formát lgscan)
+        columns: Projekce sloupců v rows (výchozí DEFAULT_COLUMNS); 'ts' a 'reg' jsou vždy
+        start: Od (včetně) - datetime, ISO text nebo epoch; s indexem se skočí rovnou k němu
+        end: Do (bez) - CSV je chronologický, čtení se za koncem zastaví
+        registers: Jen vybrané registry (ostatní se nepřevádějí)
+        ok_only: Vynechá neúspěšná čtení
+        tolerance: Max. rozptyl časů řádků jedné iterace [s]
+
+    Yields:
+        Snapshot pro každou iteraci s alespoň jedním vybraným řádkem
+    """
+    columns = tuple(columns) if columns is not None else DEFAULT_COLUMNS
+    start_epoch, end_epoch = _epoch(start), _epoch(end)
+    registers = frozenset(registers) if registers is not None else None
+
+    snapshot = None
+    current_keys = set()
+    grouped = False   # Soubor s časem iterace (víc řádků se stejným časem)
+
+    for header, rows in iter_segment_rows(csv_file, start_epoch, end_epoch):
+        missing = [column for column in ('ts', 'reg', 'name', 'ok') + columns if column not in header]
+        if missing:
+            raise ValueError(f"CSV neobsahuje sloupce: {', '.join(missing)}")
+
+        width = len(header)
+        ts_col, reg_col, name_col = header.index('ts'), header.index('reg'), header.index('name')
+        ok_col = header.index('ok')
+        projection = [(column, header.index(column), CONVERTERS.get(column, str)) for column in columns]
+
+        # Neúplné řádky (přerušený zápis) se vynechají, zbytek po skupinách se stejným časem
+        complete = (row for row in rows if len(row) == width)
+        for ts, group in groupby(complete, key=lambda row: row[ts_col]):
+            group = list(group)
+            grouped = grouped or len(group) > 1
+            keys = [(int(row[reg_col]), row[name_col]) for row in group]
+            epoch = datetime.fromisoformat(ts).timestamp()
+
+            if (snapshot is None or grouped or not current_keys.isdisjoint(keys)
+                    or epoch - snapshot.epoch > tolerance):
+                if snapshot is not None and snapshot.rows:
+                    yield snapshot
+                if end_epoch is not None and epoch >= end_epoch:
+                    return
+                snapshot = Snapshot(ts, epoch)
+                current_keys = set()
+
+            current_keys.update(keys)
+            if start_epoch is not None and snapshot.epoch < start_epoch:
+                continue
+            for row, (reg, _) in zip(group, keys):
+                if registers is not None and reg not in registers:
+                    continue
+                if ok_only and row[ok_col] != 'True':
+                    continue
+                if reg in snapshot.rows:
+                    continue  # Další název téhož registru - stejné čtení, platí první řádek
+                snapshot.rows[reg] = {column: convert(row[index]) for column, index, convert in projection}
+
+    if snapshot is not None and snapshot.rows:
+        yield snapshot
+
+
+def iter_chunks(csv_file: Path, chunk_size: int = DEFAULT_CHUNK, **options) -> Iterator[List[Snapshot]]:
+    """
+    Snímky po dávkách nejvýše chunk_size iterací (pro vektorové zpracování).
+
+    Ostatní parametry jako iter_snapshots().
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Neplatná velikost dávky: {chunk_size}")
+    chunk = []
+    for snapshot in iter_snapshots(csv_file, **options):
+        chunk.append(snapshot)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
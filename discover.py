@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Rychlé objevování registrů (python lgscan.py discover)
+
+Místo skenování po jedné adrese (dřívější scanner/*.py s timeoutem 0,5 s
+na adresu, desítky minut na celou mapu) se každá tabulka (coils, discrete,
+input, holding) čte co největšími bloky. Blok, který zařízení odmítne
+(Modbus výjimka nebo timeout), se půlí, dokud nezbydou čitelné úseky
+a jednotlivé nečitelné adresy - dotazů je úměrně počtu děr, ne adres.
+
+Čitelné úseky se pak během vzorkovacího okna (--samples × --sample-interval)
+přečtou znovu a adresy se roztřídí na stále nulové, konstantní a měnící se.
+
+Výstup:
+    - souhrn po tabulkách (čitelné úseky, nečitelné adresy, počet dotazů)
+    - fragment registers.yaml s adresami, které nejsou stále nulové
+      a ještě nejsou v konfiguraci (--out, jinak na konzoli)
+    - optimální rozložení bloků: nejméně dotazů pokrývajících registry
+      z konfigurace i nalezené, bez překrytí nečitelné adresy,
+      a hodnoty max_gap / max_bit_gap, se kterými ho plánovač lgscan sestaví
+
+Použití:
+    python lgscan.py discover --yaml registers.yaml
+    python lgscan.py discover --input 30001-30200 --holding 40001-40100 --samples 10 --out discovered.yaml
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pymodbus.client import AsyncModbusTcpClient
+
+TABLES = ('coils', 'discrete', 'input', 'holding')
+
+# Číslo prvního registru tabulky (adresa 0) a výchozí prohledávaný rozsah
+REG_BASE = {'coils': 1, 'discrete': 10001, 'input': 30001, 'holding': 40001}
+DEFAULT_RANGES = {'coils': (1, 64), 'discrete': (10001, 10064), 'input': (30001, 30120),
+                  'holding': (40001, 40064)}
+
+MAX_REGISTERS = 125   # Modbus limit počtu registrů v jednom dotazu
+MAX_BITS = 2000       # Modbus limit počtu bitů v jednom dotazu
+
+BIT_TABLES = ('coils', 'discrete')
+
+DENSE_BLOCK = 16      # Do této velikosti se oblast odmítnutá v obou polovinách čte po adresách
+
+# Stav adresy po průzkumu
+READABLE = 'ok'
+REJECTED = 'exception'
+TIMEOUT = 'timeout'
+
+
+def parse_range(table: str):
+    """Typ pro argparse: rozsah registrů tabulky, např. '30001-30120' (v číslování tabulky)."""
+    def parse(value: str) -> tuple:
+        first, _, last = value.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Neplatný rozsah: {value}")
+        base = REG_BASE[table]
+        if not base <= first <= last <= base + 65535:
+            raise argparse.ArgumentTypeError(f"Rozsah {value} není v tabulce {table} ({base}-{base + 65535})")
+        return first, last
+    return parse
+
+
+def register_number(table: str, address: int) -> int:
+    return REG_BASE[table] + address
+
+
+def format_span(table: str, start: int, end: int) -> str:
+    """Úsek adres [start, end] jako čísla registrů."""
+    if start == end:
+        return str(register_number(table, start))
+    return f"{register_number(table, start)}-{register_number(table, end)}"
+
+
+def runs(addresses) -> List[tuple]:
+    """Souvislé úseky adres jako (první, poslední)."""
+    spans = []
+    for address in sorted(addresses):
+        if spans and address == spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], address)
+        else:
+            spans.append((address, address))
+    return spans
+
+
+def to_int16(value: int) -> int:
+    return value - 65536 if value > 32767 else value
+
+
+class Prober:
+    """Blokové čtení tabulek se sdíleným limitem souběhu a adaptivní pauzou."""
+
+    def __init__(self, client: AsyncModbusTcpClient, unit: int, concurrency: int, pacer):
+        self.client = client
+        self.unit = unit
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pacer = pacer
+        self.requests = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def read(self, table: str, address: int, count: int) -> tuple:
+        """Přečte blok. Vrací (READABLE, hodnoty), (REJECTED, None) nebo (TIMEOUT, None)."""
+        from lgscan import BLOCK_READ_TABLES
+
+        async with self.semaphore:
+            if not self.client.connected:
+                await self.client.connect()  # Po timeoutu pymodbus spojení zavírá
+            self.requests += 1
+            started = time.monotonic()
+            try:
+                response = await getattr(self.client, BLOCK_READ_TABLES[table])(address, count=count,
+                                                                                slave=self.unit)
+            except Exception:
+                response = None
+            self.pacer.record(time.monotonic() - started, response is not None)
+            if self.pacer.delay > 0:
+                await asyncio.sleep(self.pacer.delay)
+
+        if response is None:
+            self.timeouts += 1
+            return TIMEOUT, None
+        if response.isError():
+            self.rejected += 1
+            return REJECTED, None
+        values = response.bits[:count] if table in BIT_TABLES else response.registers
+        if len(values) < count:
+            self.rejected += 1
+            return REJECTED, None
+        return READABLE, [int(value) for value in values]
+
+
+async def sweep(prober: Prober, table: str, first: int, last: int, block: int) -> tuple:
+    """
+    Projde adresy [first, last] tabulky bloky a odmítnuté bloky půlí.
+
+    Jsou-li u bloku do DENSE_BLOCK adres odmítnuté obě poloviny, jde nejspíš
+    o souvislou nečitelnou oblast - adresy se projdou jednotlivě
+    (n dotazů místo 2n - 1 při půlení až na jednotlivé adresy).
+
+    Returns:
+        (adresa → stav, adresa → hodnota čitelných adres)
+    """
+    status = {}
+    values = {}
+
+    def record(address: int, count: int, state: str, words: Optional[List[int]]) -> bool:
+        """Zapíše výsledek dotazu; False = blok je potřeba dál rozdělit."""
+        if state == READABLE:
+            for offset, word in enumerate(words):
+                status[address + offset] = READABLE
+                values[address + offset] = word
+            return True
+        if count == 1:
+            status[address] = state
+            return True
+        return False
+
+    async def read_parts(parts: List[tuple]) -> List[tuple]:
+        results = await asyncio.gather(*(prober.read(table, *part) for part in parts))
+        return [part for part, result in zip(parts, results) if not record(*part, *result)]
+
+    async def split(address: int, count: int):
+        half = count // 2
+        pending = await read_parts([(address, half), (address + half, count - half)])
+        if len(pending) == 2 and count <= DENSE_BLOCK:
+            await read_parts([(single, 1) for single in range(address, address + count)])
+        else:
+            await asyncio.gather(*(split(*part) for part in pending))
+
+    blocks = [(address, min(block, last - address + 1)) for address in range(first, last + 1, block)]
+    await asyncio.gather(*(split(*part) for part in await read_parts(blocks)))
+    return status, values
+
+
+async def sample(prober: Prober, readable: Dict[str, List[int]], samples: Dict, count: int,
+                 interval: float, limits: Dict[str, int]) -> None:
+    """Přečte čitelné úseky count× s odstupem interval a přidá hodnoty do samples."""
+    started = time.monotonic()
+    for _ in range(count):
+        # První vzorek je z průzkumu - další až po intervalu
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+        started = time.monotonic()
+        reads = []
+        for table, addresses in readable.items():
+            for start, end in runs(addresses):
+                for address in range(start, end + 1, limits[table]):
+                    reads.append((table, address, min(limits[table], end - address + 1)))
+        results = await asyncio.gather(*(prober.read(*read) for read in reads))
+        for (table, address, length), (state, words) in zip(reads, results):
+            for offset in range(length):
+                samples[table][address + offset].append(words[offset] if state == READABLE else None)
+
+
+def classify(values: List[Optional[int]]) -> str:
+    seen = [value for value in values if value is not None]
+    if not seen:
+        return 'unknown'
+    if all(value == 0 for value in seen):
+        return 'zero'
+    return 'constant' if len(set(seen)) == 1 else 'changing'
+
+
+def optimal_blocks(wanted: List[int], readable: set, limit: int) -> List[tuple]:
+    """
+    Nejmenší počet bloků (první, poslední) pokrývajících wanted tak, aby blok
+    obsahoval jen čitelné adresy a nejvýše limit adres (hladově - optimální
+    pro souvislé intervaly).
+    """
+    blocks = []
+    for address in sorted(wanted):
+        if blocks:
+            start, end = blocks[-1]
+            if (address - start + 1 <= limit
+                    and all(gap in readable for gap in range(end + 1, address))):
+                blocks[-1] = (start, address)
+                continue
+        blocks.append((address, address))
+    return blocks
+
+
+def recommend_gap(layout: Dict[str, List[tuple]], wanted: Dict[str, List[int]],
+                  readable: Dict[str, set], tables) -> Optional[int]:
+    """
+    max_gap, se kterým plánovač lgscan sestaví přesně dané rozložení:
+    musí pokrýt mezery uvnitř bloků, ale nesmí přemostit nečitelnou adresu.
+    None = jednou hodnotou to nejde.
+    """
+    needed = 0
+    forbidden = None
+    for table in tables:
+        blocks = layout.get(table, [])
+        addresses = wanted.get(table, [])
+        for previous, address in zip(addresses, addresses[1:]):
+            gap = address - previous - 1
+            if any(start <= previous and address <= end for start, end in blocks):
+                needed = max(needed, gap)
+            elif not all(between in readable[table] for between in range(previous + 1, address)):
+                forbidden = gap if forbidden is None else min(forbidden, gap)
+    if forbidden is not None and needed >= forbidden:
+        return None
+    return needed
+
+
+def yaml_fragment(entries: List[Dict], header: List[str]) -> str:
+    lines = [f"# {line}" if line else "#" for line in header]
+    for entry in entries:
+        lines.append("")
+        lines.append(f"  - name: \"{entry['name']}\"")
+        lines.append(f"    reg: {entry['reg']}")
+        lines.append(f"    table: {entry['table']}")
+        lines.append("    scale: 1")
+        lines.append("    unit: \"\"")
+        lines.append(f"    comment: \"{entry['comment']}\"")
+    return "\n".join(lines) + "\n"
+
+
+async def discover(connection: Dict, ranges: Dict[str, tuple], args) -> Dict:
+    """Průzkum tabulek, vzorkování a návrh konfigurace. Vrací souhrn pro výpis."""
+    from lgscan import AdaptivePacer
+
+    client = AsyncModbusTcpClient(host=connection['host'], port=connection['port'],
+                                  timeout=args.timeout, retries=0)
+    await client.connect()
+    if not client.connected:
+        raise ConnectionError(f"Nelze se připojit k {connection['host']}:{connection['port']}")
+    prober = Prober(client, connection['unit'], args.concurrency, AdaptivePacer.from_connection(connection))
+
+    try:
+        started = time.monotonic()
+        sweeps = await asyncio.gather(*(
+            sweep(prober, table, first - REG_BASE[table], last - REG_BASE[table],
+                  min(args.block, MAX_BITS if table in BIT_TABLES else MAX_REGISTERS))
+            for table, (first, last) in ranges.items()))
+        sweep_time = time.monotonic() - started
+        sweep_requests = prober.requests
+
+        status = {}
+        samples = {}
+        for table, (table_status, table_values) in zip(ranges, sweeps):
+            status[table] = table_status
+            samples[table] = {address: [value] for address, value in table_values.items()}
+
+        readable = {table: [address for address, state in status[table].items() if state == READABLE]
+                    for table in ranges}
+        limits = {table: MAX_BITS if table in BIT_TABLES else MAX_REGISTERS for table in ranges}
+        window_started = time.monotonic()
+        if args.samples > 1:
+            await sample(prober, readable, samples, args.samples - 1, args.sample_interval, limits)
+        window = time.monotonic() - window_started
+    finally:
+        client.close()
+
+    return {'status': status, 'samples': samples, 'readable': readable, 'sweep_time': sweep_time,
+            'sweep_requests': sweep_requests, 'window': window, 'prober': prober}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Vstupní bod podpříkazu discover."""
+    from lgscan import (DEFAULT_MAX_BIT_BLOCK, DEFAULT_MAX_BIT_GAP, DEFAULT_MAX_BLOCK, DEFAULT_MAX_GAP,
+                        RegisterDescriptor, describe_plan, handle_sigterm, load_config, plan_reads)
+
+    parser = argparse.ArgumentParser(
+        prog="lgscan.py discover",
+        description="Rychlé objevování registrů - blokové čtení s půlením odmítnutých bloků"
+    )
+    parser.add_argument('--yaml', type=Path, default='registers.yaml',
+                        help='Konfigurace (připojení; registry v ní se do fragmentu nepřidají)')
+    parser.add_argument('--host', help='Adresa zařízení (přepíše connection.host)')
+    parser.add_argument('--port', type=int, help='Port zařízení (přepíše connection.port)')
+    parser.add_argument('--unit', type=int, help='Unit ID (přepíše connection.unit)')
+    parser.add_argument('--timeout', type=float, default=0.5,
+                        help='Timeout jednoho dotazu v sekundách (default: 0.5)')
+    for table in TABLES:
+        first, last = DEFAULT_RANGES[table]
+        parser.add_argument(f'--{table}', type=parse_range(table), default=(first, last), metavar='RANGE',
+                            help=f'Prohledávaný rozsah tabulky {table} (default: {first}-{last})')
+    parser.add_argument('--tables', default=','.join(TABLES),
+                        help='Prohledávané tabulky oddělené čárkou (default: všechny)')
+    parser.add_argument('--block', type=int, default=MAX_REGISTERS,
+                        help=f'Velikost úvodního bloku (default: {MAX_REGISTERS}, u bitů max. {MAX_BITS})')
+    parser.add_argument('--samples', type=int, default=5,
+                        help='Počet čtení každé čitelné adresy ve vzorkovacím okně (default: 5)')
+    parser.add_argument('--sample-interval', type=float, default=2,
+                        help='Odstup vzorků v sekundách (default: 2)')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Max. souběžných dotazů (default: connection.concurrency nebo 1)')
+    parser.add_argument('--include-zero', action='store_true',
+                        help='Do fragmentu zahrne i stále nulové adresy')
+    parser.add_argument('--out', type=Path, default=None,
+                        help='Soubor pro fragment registers.yaml (default: výpis na konzoli)')
+    args = parser.parse_args(argv)
+
+    tables = [table.strip() for table in args.tables.split(',') if table.strip()]
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown or not tables:
+        parser.error(f"Neznámá tabulka: {', '.join(unknown) or args.tables} (povolené: {', '.join(TABLES)})")
+    if args.block < 1 or args.samples < 1 or args.sample_interval < 0 or args.timeout <= 0:
+        parser.error("--block a --samples musí být alespoň 1, --sample-interval nezáporný, --timeout kladný")
+
+    config = {}
+    if args.yaml.exists():
+        config = load_config(args.yaml)
+    elif args.host is None:
+        print(f"Konfigurační soubor neexistuje: {args.yaml} (nebo zadejte --host)", file=sys.stderr)
+        return 1
+    connection = dict(config.get('connection', {}))
+    for key, value in (('host', args.host), ('port', args.port), ('unit', args.unit)):
+        if value is not None:
+            connection[key] = value
+    connection.setdefault('port', 502)
+    connection.setdefault('unit', 1)
+    connection.setdefault('delay_ms', 0)
+    if 'host' not in connection:
+        print("Chybí klíč v connection: host", file=sys.stderr)
+        return 1
+    if args.concurrency is None:
+        args.concurrency = connection.get('concurrency', 1)
+
+    known = {table: set() for table in TABLES}
+    for desc in config.get('descriptors', []):
+        if desc.block_table in known:
+            known[desc.block_table].add(desc.address)
+
+    ranges = {table: getattr(args, table) for table in tables}
+    logging.getLogger('pymodbus').setLevel(logging.CRITICAL)  # Odmítnuté bloky jsou očekávané
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    print(f"🔎 Objevuji registry na {connection['host']}:{connection['port']} (unit {connection['unit']}): "
+          + ", ".join(f"{table} {first}-{last}" for table, (first, last) in ranges.items()))
+    try:
+        found = asyncio.run(discover(connection, ranges, args))
+    except KeyboardInterrupt:
+        print("\n✅ Objevování ukončeno uživatelem!")
+        return 1
+    except (ConnectionError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    prober = found['prober']
+    total = sum(last - first + 1 for first, last in ranges.values())
+    print(f"⚡ Průzkum: {total} adres, {found['sweep_requests']} dotazů za {found['sweep_time']:.1f}s "
+          f"(odmítnuto {prober.rejected}, timeout {prober.timeouts})")
+    print(f"📈 Vzorkování: vzorků {args.samples} za {found['window']:.1f}s")
+
+    classes = {}
+    entries = []
+    wanted = {}
+    for table in ranges:
+        status = found['status'][table]
+        samples = found['samples'][table]
+        table_classes = {address: classify(samples[address]) for address in found['readable'][table]}
+        classes[table] = table_classes
+        counts = {name: sum(1 for value in table_classes.values() if value == name)
+                  for name in ('zero', 'constant', 'changing')}
+        unreadable = [address for address, state in status.items() if state != READABLE]
+        spans = ", ".join(format_span(table, start, end) for start, end in runs(found['readable'][table]))
+        print(f"📋 {table}: čitelné {len(table_classes)} ({spans or '-'}) | nulové {counts['zero']}, "
+              f"konstantní {counts['constant']}, měnící se {counts['changing']} | nečitelné {len(unreadable)}")
+
+        wanted[table] = sorted({address for address in known[table] if address in table_classes}
+                               | {address for address, kind in table_classes.items()
+                                  if kind != 'zero' or args.include_zero})
+        for address, kind in sorted(table_classes.items()):
+            if address in known[table] or (kind == 'zero' and not args.include_zero):
+                continue
+            seen = [value for value in samples[address] if value is not None]
+            if table not in BIT_TABLES:
+                seen = [to_int16(value) for value in seen]
+            if kind == 'changing':
+                detail = f"mění se {min(seen)} … {max(seen)}"
+            elif kind == 'constant':
+                detail = f"konstantní {seen[0]}"
+            else:
+                detail = "stále 0"
+            reg = register_number(table, address)
+            entries.append({'name': f"{table.capitalize()} {reg}", 'reg': reg, 'table': table,
+                            'comment': f"discover: {detail} (vzorků: {len(seen)})"})
+
+    # Optimální rozložení bloků pro registry z konfigurace i nalezené
+    block_limit = config.get('connection', {}).get('max_block', DEFAULT_MAX_BLOCK)
+    bit_block_limit = config.get('connection', {}).get('max_bit_block', DEFAULT_MAX_BIT_BLOCK)
+    readable = {table: set(found['readable'][table]) for table in ranges}
+    layout = {table: optimal_blocks(wanted[table], readable[table],
+                                    bit_block_limit if table in BIT_TABLES else block_limit)
+              for table in ranges}
+    layout_lines = [f"{table} {format_span(table, start, end)} ({end - start + 1})"
+                    for table in ranges for start, end in layout[table]]
+    max_gap = recommend_gap(layout, wanted, readable, ('input', 'holding'))
+    max_bit_gap = recommend_gap(layout, wanted, readable, BIT_TABLES)
+    suggestion = []
+    if max_gap is not None:
+        suggestion.append(f"max_gap: {max_gap}")
+    if max_bit_gap is not None:
+        suggestion.append(f"max_bit_gap: {max_bit_gap}")
+
+    requests = sum(len(blocks) for blocks in layout.values())
+    print(f"📦 Optimální rozložení ({requests}× Modbus dotaz): {', '.join(layout_lines) or '-'}")
+    if suggestion:
+        # Ověření: plán lgscan s doporučenými hodnotami pro stejné registry
+        descriptors = []
+        for table in ranges:
+            for address in wanted[table]:
+                reg = register_number(table, address)
+                descriptors.append(RegisterDescriptor(len(descriptors), {'name': str(reg), 'reg': reg,
+                                                                         'table': table, 'scale': 1}))
+        plan = plan_reads(descriptors, max_gap=DEFAULT_MAX_GAP if max_gap is None else max_gap,
+                          max_block=block_limit,
+                          max_bit_gap=DEFAULT_MAX_BIT_GAP if max_bit_gap is None else max_bit_gap,
+                          max_bit_block=bit_block_limit)
+        print(f"💡 Doporučení pro connection: {', '.join(suggestion)} (plánovač lgscan: {describe_plan(plan)})")
+    if max_gap is None or max_bit_gap is None:
+        print("⚠️  Rozložení nelze vyjádřit jedním max_gap - blok přes nečitelnou adresu se po výjimce "
+              "rozpadne na jednotlivá čtení")
+
+    header = [f"Fragment registers.yaml z lgscan.py discover ({datetime.now().strftime('%Y-%m-%d %H:%M')}, "
+              f"{connection['host']}:{connection['port']})",
+              f"Vzorků: {args.samples} za {found['window']:.0f} s; jen adresy mimo konfiguraci"
+              + ("" if args.include_zero else ", které nejsou stále nulové"),
+              f"Optimální rozložení bloků ({requests}× Modbus dotaz): {', '.join(layout_lines) or '-'}"]
+    if suggestion:
+        header.append(f"Doporučení pro connection: {', '.join(suggestion)}")
+    fragment = yaml_fragment(entries, header)
+
+    if args.out:
+        args.out.write_text(fragment, encoding='utf-8')
+        print(f"💾 Fragment ({len(entries)} registrů): {args.out}")
+    else:
+        print()
+        print(fragment, end='')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
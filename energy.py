@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Integrace energie a sezónní COP
+
+Ze sledu vzorků (výsledky čtení registrů) průběžně počítá elektrickou
+a tepelnou energii v kWh lichoběžníkovou metodou přes skutečné časy
+vzorků. Součty se dělí podle provozního cyklu (topení / TUV / defrost /
+ostatní) a podle dne, měsíce a topné sezóny, z nich se počítá COP.
+Stav se průběžně ukládá do JSON souboru (atomicky přes os.replace),
+takže restart o součty nepřijde. Zpracování jednoho vzorku je O(1).
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# Registry pro výpočet výkonu
+FLOW_RATE_REG = 30009      # Průtok [l/min]
+OUTLET_TEMP_REG = 30004    # Výstupní teplota [°C]
+INLET_TEMP_REG = 30003     # Vstupní teplota [°C]
+POWER_REGS = (30018, 40018)  # Elektrický příkon [kW] - 30018 primární, 40018 záložní
+
+# Registry pro určení provozního cyklu
+COMPRESSOR_REG = 10004     # Compressor Status (1 = běží)
+DEFROST_REG = 10005        # Defrosting Status (1 = defrost)
+DHW_REG = 10006            # DHW Heating Status (1 = ohřev TUV)
+OPERATION_REG = 30002      # Operation Cycle (2 = Heating)
+
+WATER_CP = 4.18            # Měrná tepelná kapacita vody [kJ/(kg·K)]
+
+# Provozní cykly, do kterých se dělí součty
+CYCLES = ('heating', 'dhw', 'defrost', 'other')
+
+# Topná sezóna začíná 1. září (sezóna 2025/26 = 1. 9. 2025 - 31. 8. 2026)
+SEASON_START_MONTH = 9
+
+DEFAULT_MAX_GAP = 600            # Delší mezera mezi vzorky se neintegruje [s]
+DEFAULT_CHECKPOINT_INTERVAL = 60  # Jak často ukládat stav na disk [s]
+
+STATE_VERSION = 1
+
+
+def _value(results: Dict[int, Dict], reg: int) -> Optional[float]:
+    """Vrátí škálovanou hodnotu registru nebo None, pokud chybí / čtení selhalo."""
+    result = results.get(reg)
+    if result is None or not result['ok']:
+        return None
+    return result['scaled']
+
+
+def operation_cycle(results: Dict[int, Dict]) -> str:
+    """Určí provozní cyklus ze stavových registrů (10005, 10006, 30002)."""
+    if _value(results, DEFROST_REG) == 1:
+        return 'defrost'
+    if _value(results, DHW_REG) == 1:
+        return 'dhw'
+    if _value(results, OPERATION_REG) == 2:
+        return 'heating'
+    return 'other'
+
+
+def electrical_power(results: Dict[int, Dict]) -> Optional[float]:
+    """Elektrický příkon [kW] z prvního dostupného registru příkonu."""
+    for reg in POWER_REGS:
+        power = _value(results, reg)
+        if power is not None:
+            return max(0.0, power)
+    return None
+
+
+def thermal_power(results: Dict[int, Dict]) -> Optional[float]:
+    """
+    Tepelný výkon [kW] = ṁ × cp × ΔT.
+
+    Znaménko ΔT se zachovává - při defrostu se teplo z okruhu odebírá.
+    Když kompresor prokazatelně neběží, výkon je 0 (šum ΔT se nesčítá).
+    """
+    flow_rate = _value(results, FLOW_RATE_REG)
+    outlet_temp = _value(results, OUTLET_TEMP_REG)
+    inlet_temp = _value(results, INLET_TEMP_REG)
+    if flow_rate is None or outlet_temp is None or inlet_temp is None:
+        return None
+    if flow_rate <= 0 or _value(results, COMPRESSOR_REG) == 0:
+        return 0.0
+    return flow_rate / 60.0 * WATER_CP * (outlet_temp - inlet_temp)
+
+
+def season_key(moment: datetime) -> str:
+    """Klíč topné sezóny, např. '2025/26'."""
+    start_year = moment.year if moment.month >= SEASON_START_MONTH else moment.year - 1
+    return f"{start_year}/{(start_year + 1) % 100:02d}"
+
+
+def _empty_bucket() -> Dict[str, list]:
+    return {cycle: [0.0, 0.0] for cycle in CYCLES}
+
+
+class EnergyIntegrator:
+    """
+    Průběžné čítače elektrické a tepelné energie.
+
+    Každý interval mezi dvěma vzorky se připíše jako [elektrická kWh,
+    tepelná kWh]:
+      - cyklu (topení / TUV / defrost / ostatní) počátečního vzorku -
+        stav přečtený na začátku intervalu platí do dalšího čtení, takže
+        přechod mezi cykly se projeví až od intervalu, který jím začíná;
+      - dni, měsíci a sezóně koncového vzorku (stejně jako analyze.py).
+    Interval delší než max_gap (výpadek, restart) se přeskočí.
+    """
+
+    def __init__(self, state_file: Optional[Path] = None, max_gap: float = DEFAULT_MAX_GAP,
+                 checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        self.state_file = Path(state_file) if state_file else None
+        self.max_gap = max_gap
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint = time.monotonic()
+
+        self.buckets = {'day': {}, 'month': {}, 'season': {}, 'total': {}}
+        self.last = None  # Poslední vzorek: (epoch, el. kW, tepelný kW, cyklus)
+
+        if self.state_file and self.state_file.exists():
+            self.load()
+
+    def load(self) -> None:
+        """Načte uložený stav z disku."""
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"Nepodporovaná verze stavu energie: {state.get('version')}")
+        for period in self.buckets:
+            self.buckets[period] = state.get(period, {})
+        last = state.get('last')
+        self.last = tuple(last) if last else None
+
+    def checkpoint(self) -> None:
+        """Atomicky uloží stav na disk (zápis do .tmp a přejmenování)."""
+        if not self.state_file:
+            return
+        state = {'version': STATE_VERSION, 'last': list(self.last) if self.last else None}
+        state.update(self.buckets)
+        tmp_file = self.state_file.with_name(self.state_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.state_file)
+        self.last_checkpoint = time.monotonic()
+
+    def close(self) -> None:
+        """Uloží konečný stav."""
+        self.checkpoint()
+
+    def add_sample(self, results: Dict[int, Dict], timestamp: Optional[datetime] = None) -> None:
+        """
+        Zapracuje jeden snímek hodnot.
+
+        Args:
+            results: Poslední výsledky registrů {reg: result}
+            timestamp: Čas snímku (výchozí teď)
+        """
+        moment = timestamp or datetime.now()
+        epoch = moment.timestamp()
+        sample = (epoch, electrical_power(results), thermal_power(results), operation_cycle(results))
+
+        if self.last is not None:
+            dt = epoch - self.last[0]
+            if 0 < dt <= self.max_gap:
+                electrical = self._trapezoid(self.last[1], sample[1], dt)
+                thermal = self._trapezoid(self.last[2], sample[2], dt)
+                # Období podle koncového vzorku, cyklus podle počátečního
+                self._accumulate(moment, self.last[3], electrical, thermal)
+
+        self.last = sample
+
+        if (self.checkpoint_interval is not None
+                and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval):
+            self.checkpoint()
+
+    @staticmethod
+    def _trapezoid(start: Optional[float], end: Optional[float], dt: float) -> float:
+        """Energie [kWh] za interval dt [s]; chybějící krajní hodnota = 0."""
+        if start is None or end is None:
+            return 0.0
+        return (start + end) / 2.0 * dt / 3600.0
+
+    def _accumulate(self, moment: datetime, cycle: str, electrical: float, thermal: float) -> None:
+        keys = {
+            'day': moment.strftime('%Y-%m-%d'),
+            'month': moment.strftime('%Y-%m'),
+            'season': season_key(moment),
+            'total': 'total',
+        }
+        for period, key in keys.items():
+            bucket = self.buckets[period].get(key)
+            if bucket is None:
+                bucket = self.buckets[period][key] = _empty_bucket()
+            bucket[cycle][0] += electrical
+            bucket[cycle][1] += thermal
+
+    def totals(self, period: str, key: Optional[str] = None) -> Dict[str, list]:
+        """
+        Vrátí součty {cyklus: [el. kWh, tepelná kWh]} pro období.
+
+        Args:
+            period: 'day', 'month', 'season' nebo 'total'
+            key: Klíč období ('2025-11-20', '2025-11', '2025/26'); výchozí je aktuální
+        """
+        if key is None:
+            now = datetime.now()
+            key = {'day': now.strftime('%Y-%m-%d'), 'month': now.strftime('%Y-%m'),
+                   'season': season_key(now), 'total': 'total'}[period]
+        return self.buckets[period].get(key) or _empty_bucket()
+
+    def cop(self, period: str, key: Optional[str] = None) -> Optional[float]:
+        """COP za období = tepelná kWh / elektrická kWh (všechny cykly)."""
+        bucket = self.totals(period, key)
+        electrical = sum(values[0] for values in bucket.values())
+        thermal = sum(values[1] for values in bucket.values())
+        if electrical <= 0:
+            return None
+        return thermal / electrical
+
+    def summary_line(self) -> str:
+        """Krátký souhrn dne, měsíce a sezóny pro výpis (elektrická/tepelná kWh)."""
+        parts = []
+        for label, period in (("Dnes", 'day'), ("Měsíc", 'month'), ("Sezóna", 'season')):
+            bucket = self.totals(period)
+            electrical = sum(values[0] for values in bucket.values())
+            thermal = sum(values[1] for values in bucket.values())
+            cop = self.cop(period)
+            cop_str = f"{cop:.2f}" if cop is not None else "N/A"
+            parts.append(f"{label}: {electrical:.2f}/{thermal:.2f} kWh, COP {cop_str}")
+        return " | ".join(parts)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Záznam a přehrávání Modbus rámců (--record frames.bin, --replay frames.bin --speed 100x)
+
+--record uloží každou dvojici dotaz/odpověď, kterou lgscan pošle zařízení,
+s monotónními časy odeslání a příjmu. --replay místo zařízení odpovídá
+ze záznamu a data jdou normální cestou (dekódování bloků → COP → výpis,
+CSV, log, DB) - chyba z terénu se tak dá zopakovat u stolu a zpracování
+profilovat mnohem rychleji, než dovolí zařízení.
+
+Formát souboru (little-endian, záznamy s délkovým prefixem):
+    hlavička  b'LGFR', verze (u8), čas začátku záznamu (f64, Unix epoch)
+    záznam    délka těla (u32), tělo:
+              odesláno, přijato (f64, sekundy od začátku záznamu, monotónní hodiny)
+              druh (u8), unit (u8), délka PDU dotazu (u16), PDU dotazu, odpověď
+    Druh 0: odpověď je PDU odpovědi zařízení (i Modbus výjimka).
+    Druh 1: klient vrátil chybu bez odpovědi (timeout), 2: klient vyhodil
+    výjimku - odpověď je 'Třída:text' v UTF-8.
+
+Přehrávání běží na hodinách záznamu zrychlených --speed: na dotaz se
+odpoví posledním zaznamenaným rámcem se stejným PDU dotazu (stejná
+konfigurace → stejné rámce, včetně výjimek a timeoutů). Dotaz, který
+v záznamu není (jiné bloky po změně registers.yaml), se složí z obrazu
+všech dosud zaznamenaných slov; neznámá adresa dostane výjimku 02 jako
+na zařízení. Snímky dostanou čas záznamu (začátek záznamu + hodiny
+přehrávání), takže CSV, energie, rollupy, DB i metriky mají stejné časy
+jako při záznamu.
+"""
+
+import bisect
+import struct
+import time
+from datetime import datetime
+from pathlib import Path
+from pymodbus import exceptions
+from pymodbus.client import ModbusTcpClient
+from pymodbus.client.mixin import ModbusClientMixin
+from pymodbus.exceptions import ModbusException, ModbusIOException
+from pymodbus.factory import ClientDecoder
+
+MAGIC = b'LGFR'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sBd')
+LENGTH = struct.Struct('<I')
+RECORD_HEADER = struct.Struct('<ddBBH')
+
+KIND_RESPONSE = 0   # Odpověď zařízení (PDU)
+KIND_FAILED = 1     # Klient vrátil chybu bez odpovědi (timeout)
+KIND_RAISED = 2     # Klient vyhodil výjimku
+
+READ_REQUEST = struct.Struct('>BHH')   # Function code, adresa, počet
+BIT_FUNCTIONS = (1, 2)
+ILLEGAL_ADDRESS = 2
+
+
+class ReplayFinished(KeyboardInterrupt):
+    """
+    Záznam došel.
+
+    Dědí z KeyboardInterrupt, aby režimy skončily stejnou cestou jako
+    po Ctrl+C (zavřou CSV, log a databázi).
+    """
+
+
+def parse_speed(value: str) -> float:
+    """Rychlost přehrávání pro argparse: '100x', '100' nebo '0.5x'."""
+    import argparse
+    try:
+        speed = float(value.lower().rstrip('x×'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Neplatná rychlost: {value}")
+    if speed <= 0:
+        raise argparse.ArgumentTypeError(f"Rychlost musí být kladná: {value}")
+    return speed
+
+
+def request_pdu(request) -> bytes:
+    return bytes([request.function_code]) + request.encode()
+
+
+def response_pdu(response) -> bytes:
+    return bytes([response.function_code]) + response.encode()
+
+
+def describe_error(error) -> bytes:
+    text = error.string if isinstance(error, ModbusException) else str(error)
+    return f"{type(error).__name__}:{text}".encode('utf-8')
+
+
+def restore_error(payload: bytes, function_code: int) -> Exception:
+    """Zrekonstruuje chybu klienta ze záznamu (stejný typ i text jako při záznamu)."""
+    name, _, text = payload.decode('utf-8', 'replace').partition(':')
+    cls = getattr(exceptions, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, ModbusException)):
+        return ModbusException(f"{name}: {text}")
+    error = cls.__new__(cls)
+    ModbusException.__init__(error, text)  # Text už obsahuje prefix třídy ([Input/Output] ...)
+    if isinstance(error, ModbusIOException):
+        error.fcode = function_code
+    return error
+
+
+class FrameWriter:
+    """Zápis rámců do souboru (--record)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = open(self.path, 'wb')
+        self.origin = time.monotonic()
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time()))
+        self.frames = 0
+
+    def write(self, sent: float, received: float, kind: int, unit: int, request: bytes,
+              response: bytes) -> None:
+        body = RECORD_HEADER.pack(sent - self.origin, received - self.origin, kind, unit,
+                                  len(request)) + request + response
+        self.file.write(LENGTH.pack(len(body)) + body)
+        # Rámec jde na disk hned - záznam má zachytit i poslední dotazy před pádem
+        self.file.flush()
+        self.frames += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class RecordingModbusTcpClient(ModbusTcpClient):
+    """ModbusTcpClient, který každou dvojici dotaz/odpověď zapíše do FrameWriter."""
+
+    def __init__(self, frame_writer: FrameWriter, **kwargs):
+        super().__init__(**kwargs)
+        self.frame_writer = frame_writer
+
+    def execute(self, request=None):
+        pdu = request_pdu(request)
+        sent = time.monotonic()
+        try:
+            response = super().execute(request)
+        except Exception as e:
+            self.frame_writer.write(sent, time.monotonic(), KIND_RAISED, request.slave_id, pdu,
+                                    describe_error(e))
+            raise
+        received = time.monotonic()
+        if isinstance(response, ModbusException):
+            self.frame_writer.write(sent, received, KIND_FAILED, request.slave_id, pdu,
+                                    describe_error(response))
+        else:
+            self.frame_writer.write(sent, received, KIND_RESPONSE, request.slave_id, pdu,
+                                    response_pdu(response))
+        return response
+
+
+def read_frames(path: Path) -> tuple:
+    """
+    Načte záznam.
+
+    Returns:
+        (čas začátku záznamu jako Unix epoch, seznam rámců
+         (odesláno, přijato, druh, unit, PDU dotazu, odpověď))
+    """
+    data = Path(path).read_bytes()
+    if len(data) < FILE_HEADER.size:
+        raise ValueError("soubor je příliš krátký")
+    magic, version, started = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("není to záznam rámců lgscan")
+    if version != VERSION:
+        raise ValueError(f"nepodporovaná verze záznamu: {version}")
+
+    frames = []
+    offset = FILE_HEADER.size
+    while offset + LENGTH.size <= len(data):
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        if offset + length > len(data):
+            break  # Useknutý poslední rámec (pád během zápisu)
+        sent, received, kind, unit, request_length = RECORD_HEADER.unpack_from(data, offset)
+        body = data[offset + RECORD_HEADER.size:offset + length]
+        frames.append((sent, received, kind, unit, body[:request_length], body[request_length:]))
+        offset += length
+    return started, frames
+
+
+class ReplayClient(ModbusClientMixin):
+    """
+    Náhrada ModbusTcpClient odpovídající ze záznamu rámců (--replay).
+
+    Metody read_* pochází z ModbusClientMixin, takže lgscan čte stejně
+    jako ze zařízení. Hodiny přehrávání se spustí prvním dotazem.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0):
+        super().__init__()
+        self.path = Path(path)
+        self.speed = speed
+        self.started_at, self.frames = read_frames(self.path)
+        if not self.frames:
+            raise ValueError("záznam neobsahuje žádné rámce")
+        self.decoder = ClientDecoder()
+        self.origin = self.frames[0][0]
+        self.end = self.frames[-1][1]
+        self.clock_start = None
+        self.applied = 0
+
+        # (unit, PDU dotazu) → časy odeslání a indexy rámců (pro bisect)
+        self.by_request = {}
+        for index, (sent, _, _, unit, request, _) in enumerate(self.frames):
+            times, indices = self.by_request.setdefault((unit, request), ([], []))
+            times.append(sent)
+            indices.append(index)
+
+        # Obraz slov (unit, fc) → {adresa: hodnota}; předem první známé hodnoty,
+        # aby šly složit i dotazy na začátku přehrávání
+        self.image = {}
+        for frame in reversed(self.frames):
+            self._apply(frame)
+
+        self.requests = 0
+        self.synthesized = 0
+
+    def describe(self) -> str:
+        started = datetime.fromtimestamp(self.started_at).strftime('%Y-%m-%d %H:%M:%S')
+        return (f"{len(self.frames)} rámců, {self.end - self.origin:.0f} s záznamu z {started}, "
+                f"rychlost {self.speed:g}×")
+
+    def connect(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+    def now(self) -> float:
+        """Aktuální čas na hodinách záznamu."""
+        if self.clock_start is None:
+            self.clock_start = time.monotonic()
+        return self.origin + (time.monotonic() - self.clock_start) * self.speed
+
+    def recorded_time(self) -> datetime:
+        """Aktuální čas přehrávání jako čas záznamu (pro časy snímků)."""
+        return datetime.fromtimestamp(self.started_at + self.now())
+
+    def _apply(self, frame) -> None:
+        _, _, kind, unit, request, response = frame
+        if kind != KIND_RESPONSE or len(request) != READ_REQUEST.size or response[0] & 0x80:
+            return
+        function_code, address, count = READ_REQUEST.unpack(request)
+        decoded = self.decoder.decode(response)
+        if decoded is None:
+            return
+        values = decoded.bits[:count] if function_code in BIT_FUNCTIONS else decoded.registers
+        self.image.setdefault((unit, function_code), {}).update(zip(range(address, address + count), values))
+
+    def _synthesize(self, unit: int, request: bytes):
+        """Odpověď složená z obrazu slov (dotaz, který v záznamu není)."""
+        self.synthesized += 1
+        function_code, address, count = READ_REQUEST.unpack(request)
+        table = self.image.get((unit, function_code), {})
+        try:
+            values = [table[address + offset] for offset in range(count)]
+        except KeyError:
+            return self.decoder.decode(bytes([function_code | 0x80, ILLEGAL_ADDRESS]))
+        if function_code in BIT_FUNCTIONS:
+            packed = bytearray((count + 7) // 8)
+            for offset, bit in enumerate(values):
+                if bit:
+                    packed[offset // 8] |= 1 << (offset % 8)
+            return self.decoder.decode(bytes([function_code, len(packed)]) + bytes(packed))
+        return self.decoder.decode(struct.pack(f'>BB{count}H', function_code, 2 * count, *values))
+
+    def execute(self, request=None):
+        now = self.now()
+        if now > self.end:
+            raise ReplayFinished
+        while self.applied < len(self.frames) and self.frames[self.applied][0] <= now:
+            self._apply(self.frames[self.applied])
+            self.applied += 1
+        self.requests += 1
+
+        unit = request.slave_id
+        pdu = request_pdu(request)
+        recorded = self.by_request.get((unit, pdu))
+        if recorded is None:
+            if len(pdu) != READ_REQUEST.size:
+                return ModbusIOException("Dotaz v záznamu není", request.function_code)
+            return self._synthesize(unit, pdu)
+
+        # Poslední rámec se stejným dotazem do aktuálního času (před prvním výskytem ten první)
+        times, indices = recorded
+        position = max(0, bisect.bisect_right(times, now) - 1)
+        sent, received, kind, _, _, response = self.frames[indices[position]]
+        if self.speed and received > sent:
+            # Zaznamenaná latence odpovědi (zrychlená)
+            time.sleep((received - sent) / self.speed)
+        if kind == KIND_RAISED:
+            raise restore_error(response, request.function_code)
+        if kind == KIND_FAILED:
+            return restore_error(response, request.function_code)
+        return self.decoder.decode(response)
+
+    def stats_line(self) -> str:
+        return (f"přehráno {min(self.applied, len(self.frames))}/{len(self.frames)} rámců, "
+                f"dotazů {self.requests} (složeno z obrazu {self.synthesized})")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Cachující Modbus TCP brána (python lgscan.py serve)
+
+LG bridge špatně snáší více současných masterů (Home Assistant s dotazem
+na každý senzor, lgscan, ...). Brána čte zařízení jako jediný poller
+podle registers.yaml a na lokálním portu provozuje Modbus TCP server,
+který odpovídá z obrazu registrů v paměti obnovovaného každou iterací.
+Klientů může být libovolně mnoho a mohou se ptát libovolně často -
+zařízení vidí stále jen jeden dotazovací cyklus.
+
+Obraz má stejný adresní prostor jako zařízení (input / holding /
+discrete / coils, adresy 0-based) a pokrývá:
+    - registry z konfigurace,
+    - rozsahy --input / --holding / --discrete / --coils (výchozí rozsahy
+      pokrývají adresy z docs/HA_LG_ThermaV_Configuration.yaml),
+    - všechna slova uvnitř blokových dotazů, včetně mezer mezi registry
+      (zařízení je v bloku vrací, takže blokové čtení přes bránu projde).
+Dotaz mimo obraz, zápis (brána je jen pro čtení) nebo hodnota starší než
+--max-age skončí výjimkou Illegal Data Address. Server odpovídá na
+libovolné unit id.
+
+Použití:
+    python lgscan.py serve --yaml registers.yaml --port 5020
+    python lgscan.py serve --input 30001-30040 --holding 40001-40020
+    (Home Assistant: host brány, port 5020 místo 192.168.100.199:502)
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pymodbus.datastore import ModbusServerContext, ModbusSlaveContext, ModbusSparseDataBlock
+from pymodbus.server import ModbusTcpServer
+
+from discover import REG_BASE, parse_range
+
+DEFAULT_PORT = 5020
+WRITE_FUNCTION_CODES = (5, 6, 15, 16, 22, 23)
+
+# Tabulka registru (RegisterDescriptor.block_table) → datový blok pymodbus kontextu
+IMAGE_TABLES = {'discrete': 'd', 'coils': 'c', 'holding': 'h', 'input': 'i'}
+
+# Výchozí rozsahy obrazu (čísla registrů) - pokrývají adresy Home Assistant konfigurace
+DEFAULT_SPANS = {'discrete': (10001, 10014), 'input': (30001, 30024), 'holding': (40001, 40013)}
+
+
+class ReadOnlyContext(ModbusSlaveContext):
+    """Kontext obrazu registrů - zápisy odmítá a počítá obsloužené dotazy."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = 0
+
+    def validate(self, fc_as_hex, address, count=1):
+        self.requests += 1
+        if fc_as_hex in WRITE_FUNCTION_CODES:
+            return False
+        return super().validate(fc_as_hex, address, count)
+
+
+def image_descriptors(config: Dict, spans: Dict[str, tuple]) -> List:
+    """
+    Registry, které brána čte do obrazu: registry z konfigurace, doplněné
+    o adresy z rozsahů spans {tabulka: (první, poslední registr)} a o mezery
+    uvnitř bloků plánu. Doplněné registry mají měřítko 1 a název podle
+    tabulky a čísla registru.
+    """
+    from lgscan import RegisterDescriptor, build_read_plan
+
+    descriptors = list(config['descriptors'])
+    covered = {(desc.block_table, desc.address) for desc in descriptors}
+
+    def add(table: str, address: int) -> None:
+        if (table, address) in covered:
+            return
+        covered.add((table, address))
+        reg = REG_BASE[table] + address
+        descriptors.append(RegisterDescriptor(len(descriptors), {
+            'name': f"{table.capitalize()} {reg}", 'reg': reg, 'table': table, 'scale': 1}))
+
+    for table, (first, last) in spans.items():
+        for reg in range(first, last + 1):
+            add(table, reg - REG_BASE[table])
+
+    # Mezery bloků se čtou tak jako tak - plán se jejich doplněním nezmění
+    plan = build_read_plan({'connection': config['connection'], 'descriptors': descriptors})
+    for block in plan:
+        if not block['single']:
+            for address in range(block['address'], block['address'] + block['count']):
+                add(block['table'], address)
+    return descriptors
+
+
+class RegisterImage:
+    """
+    Obraz registrů zařízení v paměti (řídké datové bloky pymodbus).
+
+    Ukládají se 16bit slova tak, jak je vrací zařízení (záporné raw hodnoty
+    jako dvojkový doplněk), u bitových tabulek 0/1.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.blocks = {key: ModbusSparseDataBlock({}) for key in IMAGE_TABLES.values()}
+        self.store = ReadOnlyContext(di=self.blocks['d'], co=self.blocks['c'], hr=self.blocks['h'],
+                                     ir=self.blocks['i'], zero_mode=True)
+        self.context = ModbusServerContext(slaves=self.store, single=True)
+        self.updated = {}   # (blok, adresa) → time.monotonic() posledního úspěšného čtení
+
+    def update(self, descriptors, results: List[Dict], now: float) -> int:
+        """Zapracuje výsledky iterace (v pořadí descriptors). Vrací počet obnovených adres."""
+        refreshed = 0
+        for desc, result in zip(descriptors, results):
+            if not result['ok']:
+                continue  # Poslední úspěšná hodnota platí do vypršení max_age
+            key = IMAGE_TABLES[desc.block_table]
+            self.blocks[key].values[desc.address] = result['raw'] & 0xFFFF
+            self.updated[(key, desc.address)] = now
+            refreshed += 1
+        return refreshed
+
+    def expire(self, now: float) -> int:
+        """Odebere hodnoty starší než max_age (klient dostane výjimku). Vrací jejich počet."""
+        stale = [item for item, updated in self.updated.items() if now - updated > self.max_age]
+        for key, address in stale:
+            del self.blocks[key].values[address]
+            del self.updated[(key, address)]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self.updated)
+
+
+async def serve_loop(config: Dict, host: str, port: int, interval: float, max_age: float,
+                     spans: Optional[Dict[str, tuple]] = None) -> None:
+    """Dotazovací smyčka zařízení a Modbus TCP server v jedné asyncio smyčce."""
+    from lgscan import describe_plan, open_device, poll_device
+
+    descriptors = image_descriptors(config, spans if spans is not None else DEFAULT_SPANS)
+    device = open_device(dict(config, descriptors=descriptors), config['connection'])
+    image = RegisterImage(max_age)
+    added = len(descriptors) - len(config['descriptors'])
+    print(f"📡 Zařízení {device['name']} | 📦 {describe_plan(device['plan'])}")
+    print(f"🗺️ Obraz: {len(descriptors)} adres (konfigurace {len(config['descriptors'])}, "
+          f"rozsahy a mezery bloků {added})")
+
+    server = None
+    iteration = 0
+    requests_before = 0
+    try:
+        while True:
+            iteration += 1
+            started = time.monotonic()
+            results = await poll_device(device)
+            now = time.monotonic()
+            refreshed = image.update(descriptors, results, now)
+            expired = image.expire(now)
+
+            # Server se spustí až s prvním obrazem - klienti nikdy nedostanou prázdná data
+            if server is None and len(image):
+                server = ModbusTcpServer(context=image.context, address=(host, port))
+                if not await server.listen():
+                    server = None
+                    raise OSError("adresa je obsazená nebo nedostupná")
+                print(f"🔌 Brána naslouchá na {host or '0.0.0.0'}:{port}")
+
+            served = image.store.requests - requests_before
+            requests_before = image.store.requests
+            line = (f"🔄 Iterace {iteration}: {refreshed}/{len(results)} OK ({now - started:.2f}s) | "
+                    f"📤 klienti: {served} dotazů | 🚦 {device['pacer'].stats_line()}")
+            if expired:
+                line += f" | ⚠️ vypršelo {expired} hodnot"
+            print(line)
+
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        if server is not None:
+            await server.shutdown()
+        device['client'].close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Vstupní bod podpříkazu serve."""
+    from lgscan import handle_sigterm, load_config
+
+    parser = argparse.ArgumentParser(
+        prog="lgscan.py serve",
+        description="Modbus TCP brána - jediný poller zařízení, klienti čtou z obrazu v paměti"
+    )
+    parser.add_argument('--yaml', type=Path, default='registers.yaml',
+                        help='Konfigurace registrů a připojení k zařízení')
+    parser.add_argument('--listen', default='', metavar='HOST',
+                        help='Adresa, na které brána naslouchá (default: všechny)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port brány (default: {DEFAULT_PORT}; 502 vyžaduje root)')
+    parser.add_argument('--interval', type=float, default=10,
+                        help='Interval čtení zařízení v sekundách (default: 10)')
+    parser.add_argument('--max-age', type=float, default=None, metavar='SECONDS',
+                        help='Jak dlouho platí hodnota po chybě čtení (default: 3× interval)')
+    for table in IMAGE_TABLES:
+        default = DEFAULT_SPANS.get(table)
+        parser.add_argument(f'--{table}', type=parse_range(table), default=default, metavar='RANGE',
+                            help=f'Rozsah registrů {table} v obrazu navíc ke konfiguraci (default: '
+                                 f'{f"{default[0]}-{default[1]}" if default else "žádný"})')
+    parser.add_argument('--config-only', action='store_true',
+                        help='Obraz jen z registrů konfigurace a mezer bloků (bez rozsahů)')
+    args = parser.parse_args(argv)
+
+    if args.interval <= 0:
+        parser.error(f"Neplatný interval: {args.interval}")
+    max_age = args.max_age if args.max_age is not None else 3 * args.interval
+    spans = {} if args.config_only else {table: getattr(args, table) for table in IMAGE_TABLES
+                                         if getattr(args, table) is not None}
+
+    if not args.yaml.exists():
+        print(f"Konfigurační soubor neexistuje: {args.yaml}", file=sys.stderr)
+        return 1
+    config = load_config(args.yaml)
+    for key in ('connection', 'registers'):
+        if key not in config:
+            print(f"Chybí klíč v konfiguraci: {key}", file=sys.stderr)
+            return 1
+    for key in ('host', 'port', 'unit', 'timeout', 'delay_ms'):
+        if key not in config['connection']:
+            print(f"Chybí klíč v connection: {key}", file=sys.stderr)
+            return 1
+    if any(desc.table == 'auto' for desc in config['descriptors']):
+        print("Tabulka 'auto' není v režimu brány podporována", file=sys.stderr)
+        return 1
+
+    # Odmítnuté dotazy klientů (výjimky) pymodbus jinak vypisuje jako varování
+    logging.getLogger('pymodbus').setLevel(logging.ERROR)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    print(f"🛰️ Spouštím Modbus bránu (max. stáří hodnot {max_age:g}s)...")
+    try:
+        asyncio.run(serve_loop(config, args.listen, args.port, args.interval, max_age, spans))
+    except KeyboardInterrupt:
+        print("\n✅ Brána ukončena uživatelem!")
+    except OSError as e:
+        print(f"❌ Nelze spustit bránu na portu {args.port}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,8 +11,14 @@ __author__ = "reverendcz"
 __date__ = "2025-11-17"
 
 import argparse
+import asyncio
 import csv
+import importlib
 import os
+import re
+import shutil
+import signal
+import sqlite3
 import sys
 import time
 from datetime import datetime
@@ -20,9 +26,19 @@ from pathlib import Path
 from typing import Dict, List, Optional, Union
 
 import yaml
-from pymodbus.client import ModbusTcpClient
+from pymodbus.client import AsyncModbusTcpClient, ModbusTcpClient
 from pymodbus.exceptions import ModbusException
 
+from csvindex import INDEX_SUFFIX, CountingFile, IndexWriter
+from energy import (COMPRESSOR_REG, DEFROST_REG, FLOW_RATE_REG, INLET_TEMP_REG, OPERATION_REG,
+                    OUTLET_TEMP_REG, WATER_CP, EnergyIntegrator, electrical_power)
+from framelog import FrameWriter, RecordingModbusTcpClient, ReplayClient, parse_speed
+from metrics import MetricsServer
+from rollups import close_rollups, open_rollups
+from segments import SegmentPolicy, SegmentRoller, parse_roll
+from sqlite_sink import SqliteSink
+from trend import RegisterTrend, TrendEngine
+
 # Try to import colorama for Windows color support
 try:
     from colorama import init, Fore, Back, Style
@@ -36,6 +52,14 @@ except ImportError:
     class Style:
         BRIGHT = DIM = RESET_ALL = ""
 
+# NumPy je volitelný - vektorové dekódování blokových odpovědí
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
 
 # ANSI barevné kódy pro terminal output
 class Colors:
@@ -151,7 +175,7 @@ def read_register_value(client: ModbusTcpClient, register_config: Dict, unit: in
     name = register_config['name']
     table = register_config['table']
     scale = register_config['scale']
-    unit_str = register_config['unit']
+    unit_str = register_config.get('unit', '')
     
     address = convert_register_to_address(reg)
     
@@ -214,8 +238,8 @@ def read_register_value(client: ModbusTcpClient, register_config: Dict, unit: in
             
             raw_value = response.registers[0]
             
-            # Převod na signed int16 pokud je hodnota > 32767
-            if raw_value > 32767:
+            # Převod na signed int16 pokud je hodnota > 32767 (pokud registr není 'signed: false')
+            if raw_value > 32767 and register_config.get('signed', True):
                 raw_value = raw_value - 65536
         
         result['raw'] = raw_value
@@ -230,19 +254,769 @@ def read_register_value(client: ModbusTcpClient, register_config: Dict, unit: in
     return result
 
 
+# Tabulky, které lze číst blokově (16bit registry i bitová pole)
+BLOCK_READ_TABLES = {
+    'input': 'read_input_registers',
+    'holding': 'read_holding_registers',
+    'discrete': 'read_discrete_inputs',
+    'coils': 'read_coils',
+    'coil': 'read_coils',
+}
+
+# Bitové tabulky - odpověď obsahuje zabalené bity (response.bits)
+BIT_TABLES = ('discrete', 'coils', 'coil')
+
+# Výchozí limity plánovače blokového čtení
+DEFAULT_MAX_GAP = 4        # Max. počet nepoužitých registrů mezi dvěma čtenými
+DEFAULT_MAX_BLOCK = 32     # Max. počet registrů v jednom dotazu (Modbus limit je 125)
+DEFAULT_MAX_BIT_GAP = 16   # Bity jsou levné - mezera může být větší
+DEFAULT_MAX_BIT_BLOCK = 256  # Max. počet bitů v jednom dotazu (Modbus limit je 2000)
+
+# Tabulky povolené v konfiguraci registrů
+REGISTER_TABLES = ('input', 'holding', 'discrete', 'coils', 'coil', 'auto')
+
+# Modbus function code podle tabulky ('auto' zkouší holding i input)
+FUNCTION_CODES = {'coils': 1, 'coil': 1, 'discrete': 2, 'holding': 3, 'input': 4, 'auto': None}
+
+
+class RegisterDescriptor:
+    """
+    Předkompilovaný popis jednoho registru z YAML.
+
+    Vše, co se dřív v každé iteraci dopočítávalo z konfiguračního slovníku
+    (adresa, tabulka, druh hodnoty podle jednotky, formáty výpisu), se
+    spočítá jednou při načtení konfigurace. Smyčka čtení a výpisu pak
+    používá jen atributy. Původní slovník zůstává v .config.
+    """
+
+    __slots__ = ('index', 'reg', 'name', 'table', 'block_table', 'address', 'function_code',
+                 'scale', 'signed', 'unit', 'kind', 'period', 'reg_label', 'display_name',
+                 'delta_suffix', 'delta_format', 'config')
+
+    def __init__(self, index: int, register_config: Dict):
+        self.index = index
+        self.config = register_config
+
+        for key in ('name', 'reg', 'table', 'scale'):
+            if key not in register_config:
+                raise ValueError(f"Registr #{index + 1}: chybí klíč '{key}'")
+
+        try:
+            self.reg = int(register_config['reg'])
+            self.address = convert_register_to_address(self.reg)
+        except (TypeError, ValueError):
+            raise ValueError(f"Registr #{index + 1}: neplatné číslo registru {register_config['reg']!r}")
+
+        self.table = register_config['table']
+        if self.table not in REGISTER_TABLES:
+            raise ValueError(f"Registr {self.reg}: nepodporovaná tabulka {self.table!r}")
+        self.block_table = 'coils' if self.table == 'coil' else self.table
+        self.function_code = FUNCTION_CODES[self.table]
+
+        self.scale = register_config['scale']
+        if isinstance(self.scale, bool) or not isinstance(self.scale, (int, float)):
+            raise ValueError(f"Registr {self.reg}: neplatné měřítko {self.scale!r}")
+
+        self.period = register_config.get('period')
+        if self.period is not None and (isinstance(self.period, bool)
+                                        or not isinstance(self.period, (int, float))
+                                        or self.period <= 0):
+            raise ValueError(f"Neplatná perioda registru {self.reg}: {self.period}")
+
+        # 16bit slova jsou standardně se znaménkem (int16), 'signed: false' = uint16
+        self.signed = bool(register_config.get('signed', True))
+
+        self.name = str(register_config['name'])
+        self.unit = register_config.get('unit') or ''
+
+        # Druh hodnoty - řídí formát delta a barvy
+        if self.table in BIT_TABLES:
+            self.kind = 'binary'
+        elif "°C" in self.unit:
+            self.kind = 'temperature'
+        elif "kW" in self.unit or "W" in self.unit:
+            self.kind = 'power'
+        elif "l/min" in self.unit:
+            self.kind = 'flow'
+        else:
+            self.kind = 'generic'
+
+        if self.kind == 'temperature':
+            self.delta_format, self.delta_suffix = "{:+.1f}", "°C"
+        elif self.kind == 'power' and "kW" in self.unit:
+            self.delta_format, self.delta_suffix = "{:+.2f}", "kW"
+        elif self.kind == 'power':
+            self.delta_format, self.delta_suffix = "{:+.0f}", "W"
+        elif self.kind == 'flow':
+            self.delta_format, self.delta_suffix = "{:+.1f}", "l/min"
+        else:
+            self.delta_format, self.delta_suffix = "{:+.1f}", ""
+
+        # Popisky pro tabulku - coils (1,2,3) jako 00001, 00002, 00003
+        self.reg_label = f"{self.reg:05d}" if self.reg < 10 else str(self.reg)
+        display_name = self.name if len(self.name) <= 33 else self.name[:30] + "..."
+        self.display_name = f"{display_name:<33}"
+
+    def new_result(self) -> Dict:
+        """Vrátí prázdný výsledek čtení ve tvaru read_register_value()."""
+        return {
+            'name': self.name,
+            'reg': self.reg,
+            'address0': self.address,
+            'table': self.table,
+            'raw': None,
+            'scaled': None,
+            'unit': self.unit,
+            'ok': False,
+            'error': ''
+        }
+
+    def decode(self, word: int) -> int:
+        """Převede 16bit slovo na raw hodnotu podle znaménkovosti."""
+        if self.signed and word > 32767:
+            return word - 65536
+        return word
+
+    def format_delta(self, delta: float) -> str:
+        """Naformátuje změnu hodnoty s jednotkou podle druhu registru."""
+        return self.delta_format.format(delta) + self.delta_suffix
+
+
+def compile_registers(registers: List[Dict]) -> List[RegisterDescriptor]:
+    """
+    Zkompiluje sekci 'registers' na seznam RegisterDescriptor.
+
+    Raises:
+        ValueError: Chybná položka konfigurace (chybějící klíč, neznámá tabulka,
+                    neplatný registr, měřítko nebo perioda)
+    """
+    if not isinstance(registers, list):
+        raise ValueError("Sekce 'registers' musí být seznam")
+    descriptors = []
+    for index, register_config in enumerate(registers):
+        if not isinstance(register_config, dict):
+            raise ValueError(f"Registr #{index + 1}: položka musí být slovník")
+        descriptors.append(RegisterDescriptor(index, register_config))
+    return descriptors
+
+
+def format_trend_delta(desc: RegisterDescriptor, trend: RegisterTrend) -> str:
+    """
+    Společný formát poslední změny registru pro všechny režimy a výstupy.
+
+    Returns:
+        '0→1' u binárních hodnot, '+1.5°C' apod. u číselných, '' beze změny
+    """
+    if not trend.changed:
+        return ""
+    previous, last = trend.previous, trend.last
+    if desc.kind == 'binary' or (previous in (0, 1) and last in (0, 1)):
+        return f"{previous:.0f}→{last:.0f}"
+    return desc.format_delta(last - previous)
+
+
+def update_trends(trends: TrendEngine, descriptors: List[RegisterDescriptor],
+                  results: Dict[int, Dict]) -> None:
+    """
+    Zapracuje čerstvé výsledky do trend enginu a doplní do nich
+    'delta' a 'previous_value' (pro výpis, CSV i log).
+    """
+    trends.update(results)
+    for index, result in results.items():
+        result['delta'] = format_trend_delta(descriptors[index], trends.get(index)) if result['ok'] else ''
+
+
+def open_energy_integrator(energy_file: Optional[Path]) -> Optional[EnergyIntegrator]:
+    """Otevře čítače energie se stavem v energy_file (None = vypnuto)."""
+    if not energy_file:
+        return None
+    try:
+        return EnergyIntegrator(energy_file)
+    except (OSError, ValueError) as e:
+        print(f"Nelze načíst stav čítačů energie {energy_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def open_sqlite_sink(db_file: Optional[Path], descriptors: List[RegisterDescriptor],
+                     fsync: bool = False) -> Optional[SqliteSink]:
+    """Otevře SQLite výstup historie v db_file (None = vypnuto)."""
+    if not db_file:
+        return None
+    try:
+        return SqliteSink(db_file, descriptors, fsync)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Nelze otevřít databázi {db_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def open_metrics_server(port: Optional[int], descriptors: List[RegisterDescriptor]) -> Optional[MetricsServer]:
+    """Spustí OpenMetrics endpoint na portu port (None = vypnuto)."""
+    if port is None:
+        return None
+    try:
+        server = MetricsServer(port, descriptors)
+    except OSError as e:
+        print(f"Nelze spustit metriky na portu {port}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"📊 Metriky: http://localhost:{server.port}/metrics")
+    return server
+
+
+def open_frame_writer(record_file: Optional[Path]) -> Optional[FrameWriter]:
+    """Otevře záznam Modbus rámců do record_file (None = vypnuto)."""
+    if not record_file:
+        return None
+    try:
+        writer = FrameWriter(record_file)
+    except OSError as e:
+        print(f"Nelze otevřít záznam rámců {record_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"🎙️ Záznam rámců: {record_file}")
+    return writer
+
+
+def open_replay(replay_file: Path, speed: float) -> ReplayClient:
+    """Načte záznam rámců pro --replay (klient místo zařízení)."""
+    try:
+        replay = ReplayClient(replay_file, speed)
+    except (OSError, ValueError) as e:
+        print(f"Nelze načíst záznam rámců {replay_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"▶️ Přehrávám {replay_file}: {replay.describe()}")
+    return replay
+
+
+def open_modbus_client(connection: Dict, timeout: float, frames: Optional[FrameWriter] = None,
+                       replay: Optional[ReplayClient] = None):
+    """Modbus klient režimu: přehrávač záznamu (--replay), nahrávající (--record), nebo běžný."""
+    if replay is not None:
+        return replay
+    if frames is not None:
+        return RecordingModbusTcpClient(frames, host=connection['host'], port=connection['port'],
+                                        timeout=timeout)
+    return ModbusTcpClient(host=connection['host'], port=connection['port'], timeout=timeout)
+
+
+def snapshot_time(replay: Optional[ReplayClient] = None) -> datetime:
+    """Čas snímku iterace: při --replay čas záznamu, jinak aktuální čas."""
+    return replay.recorded_time() if replay is not None else datetime.now()
+
+
+def apply_replay_timing(config: Dict, interval: float, speed: float) -> float:
+    """
+    Přizpůsobí konfiguraci přehrávání: periody registrů a interval se zrychlí
+    stejně jako hodiny záznamu a pauzy mezi dotazy se vypnou (tempo zařízení
+    je už v časech rámců). Vrací zrychlený interval.
+    """
+    for desc in config['descriptors']:
+        if desc.period is not None:
+            desc.period = desc.period / speed
+    config['connection'].update(delay_ms=0, delay_min_ms=0, delay_max_ms=0)
+    return interval / speed
+
+
+def plan_reads(registers: List[RegisterDescriptor], max_gap: int = DEFAULT_MAX_GAP,
+               max_block: int = DEFAULT_MAX_BLOCK, max_bit_gap: int = DEFAULT_MAX_BIT_GAP,
+               max_bit_block: int = DEFAULT_MAX_BIT_BLOCK,
+               indices: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Sestaví plán čtení - sloučí sousední registry do blokových dotazů.
+
+    Registry se seskupí podle tabulky a adresy, které jsou od sebe vzdáleny
+    nejvýše max_gap nepoužitých registrů, se sloučí do jednoho dotazu
+    (nejvýše max_block registrů). Discrete inputs a coils se stejně slučují
+    do jednoho bitového dotazu na souvislý úsek (limity max_bit_gap/max_bit_block).
+    Registry, které blokově číst nelze (např. tabulka 'auto'), dostanou
+    vlastní jednoregistrový dotaz.
+
+    Args:
+        registers: Zkompilované registry (viz compile_registers())
+        max_gap: Tolerance mezery mezi adresami v jednom bloku
+        max_block: Maximální počet registrů v jednom dotazu
+        max_bit_gap: Tolerance mezery pro discrete inputs/coils
+        max_bit_block: Maximální počet bitů v jednom dotazu
+        indices: Volitelně jen podmnožina registrů (indexy v konfiguraci)
+
+    Returns:
+        Seznam bloků; každý blok obsahuje 'table', 'address', 'count'
+        a 'members' = [RegisterDescriptor]
+    """
+    blocks = []
+    by_table = {}
+    selected = set(indices) if indices is not None else None
+
+    for desc in registers:
+        if selected is not None and desc.index not in selected:
+            continue
+
+        if desc.table in BLOCK_READ_TABLES:
+            # 'coil' a 'coils' jsou stejná tabulka - patří do jednoho bloku
+            by_table.setdefault(desc.block_table, []).append(desc)
+        else:
+            blocks.append({
+                'table': desc.table,
+                'address': desc.address,
+                'count': 1,
+                'members': [desc],
+                'single': True,
+            })
+
+    for table, members in by_table.items():
+        members.sort(key=lambda desc: desc.address)
+        gap_limit, block_limit = ((max_bit_gap, max_bit_block) if table in BIT_TABLES
+                                  else (max_gap, max_block))
+        current = None
+
+        for desc in members:
+            address = desc.address
+            if (current is not None
+                    and address - (current['address'] + current['count']) <= gap_limit
+                    and address - current['address'] + 1 <= block_limit):
+                current['count'] = max(current['count'], address - current['address'] + 1)
+                current['members'].append(desc)
+            else:
+                current = {
+                    'table': table,
+                    'address': address,
+                    'count': 1,
+                    'members': [desc],
+                    'single': False,
+                }
+                blocks.append(current)
+
+    # Stabilní pořadí dotazů - podle první položky v konfiguraci
+    blocks.sort(key=lambda block: min(desc.index for desc in block['members']))
+    return blocks
+
+
+def describe_plan(plan: List[Dict]) -> str:
+    """Vrátí krátký popis plánu čtení pro výpis na konzoli."""
+    total = sum(len(block['members']) for block in plan)
+    return f"{total} registrů → {len(plan)} Modbus dotazů"
+
+
+def block_vectors(block: Dict) -> tuple:
+    """
+    Vrátí (a uloží do bloku) předpočítané vektory pro dekódování bloku.
+
+    Returns:
+        (offsety členů v bloku, měřítka, maska znaménkovosti) jako NumPy pole
+    """
+    vectors = block.get('vectors')
+    if vectors is None:
+        members = block['members']
+        vectors = (
+            np.array([desc.address - block['address'] for desc in members], dtype=np.intp),
+            np.array([desc.scale for desc in members], dtype=np.float64),
+            np.array([desc.signed for desc in members], dtype=bool),
+        )
+        block['vectors'] = vectors
+    return vectors
+
+
+def decode_words(block: Dict, words) -> tuple:
+    """
+    Vektorově dekóduje 16bit slova registrového bloku (NumPy).
+
+    Slova se zobrazí jako int16 (u registrů 'signed: false' jako uint16)
+    a vynásobí vektorem měřítek jednou operací. Funguje i pro 2D pole
+    (řádek = jedna odpověď bloku), např. při přehrávání nebo zpětném
+    zpracování uložených raw slov.
+
+    Args:
+        block: Registrový blok z plan_reads() (ne bitová tabulka)
+        words: Slova bloku - seznam nebo pole tvaru (count,) či (N, count)
+
+    Returns:
+        (raw, scaled) - pole tvaru (členy,) či (N, členy) v pořadí block['members']
+    """
+    offsets, scales, signed = block_vectors(block)
+    unsigned = np.asarray(words, dtype=np.uint16)[..., offsets]
+    raw = unsigned.view(np.int16)
+    if not signed.all():
+        raw = np.where(signed, raw, unsigned.astype(np.int32))
+    return raw, raw * scales
+
+
+def decode_block(block: Dict, registers: List[int]) -> List[tuple]:
+    """
+    Rozdělí slova z blokové odpovědi zpět na výsledky jednotlivých registrů.
+
+    Je-li k dispozici NumPy a odpověď je kompletní, slova se dekódují
+    vektorově (decode_words()), jinak po jednom.
+
+    Args:
+        block: Blok z plan_reads()
+        registers: Přečtená 16bit slova (response.registers),
+                   u bitových tabulek rozbalené bity (response.bits)
+
+    Returns:
+        Seznam (index v konfiguraci, result) ve stejném tvaru jako read_register_value()
+    """
+    decoded = []
+    start = block['address']
+    available = len(registers)
+    is_bits = block['table'] in BIT_TABLES
+
+    if NUMPY_AVAILABLE and not is_bits and available >= block['count']:
+        raw, scaled = decode_words(block, registers[:block['count']])
+        for desc, raw_value, scaled_value in zip(block['members'], raw.tolist(), scaled.tolist()):
+            result = desc.new_result()
+            result['raw'] = raw_value
+            # Celočíselné měřítko dává celé číslo stejně jako read_register_value()
+            result['scaled'] = raw_value * desc.scale if isinstance(desc.scale, int) else scaled_value
+            result['ok'] = True
+            decoded.append((desc.index, result))
+        return decoded
+
+    for desc in block['members']:
+        result = desc.new_result()
+
+        offset = desc.address - start
+        if offset >= available:
+            result['error'] = "Žádná data v odpovědi"
+            decoded.append((desc.index, result))
+            continue
+
+        if is_bits:
+            raw_value = 1 if registers[offset] else 0
+        else:
+            raw_value = desc.decode(registers[offset])
+
+        result['raw'] = raw_value
+        result['scaled'] = raw_value * desc.scale
+        result['ok'] = True
+
+        decoded.append((desc.index, result))
+
+    return decoded
+
+
+def read_block(client: ModbusTcpClient, block: Dict, unit: int) -> List[tuple]:
+    """
+    Přečte jeden blok z plánu jedním Modbus dotazem.
+
+    Pokud zařízení blok odmítne (Modbus exception - např. nečitelná adresa
+    v mezeře), blok se označí jako rozpadlý a jeho registry se dál čtou
+    jednotlivě. Při výpadku spojení se blok nerozpadá.
+
+    Returns:
+        Seznam (index v konfiguraci, result)
+    """
+    if block['single'] or block.get('fallback'):
+        return [(desc.index, read_register_value(client, desc.config, unit))
+                for desc in block['members']]
+
+    reader = getattr(client, BLOCK_READ_TABLES[block['table']])
+
+    try:
+        response = reader(block['address'], count=block['count'], slave=unit)
+    except Exception as e:
+        error = f"Modbus exception: {e}" if isinstance(e, ModbusException) else f"Chyba: {e}"
+        failed = []
+        for index, result in decode_block(block, []):
+            result['error'] = error
+            failed.append((index, result))
+        return failed
+
+    if response.isError():
+        block['fallback'] = True
+        return read_block(client, block, unit)
+
+    if block['table'] in BIT_TABLES:
+        return decode_block(block, getattr(response, 'bits', []))
+    return decode_block(block, getattr(response, 'registers', []))
+
+
+def is_transport_error(result: Dict) -> bool:
+    """
+    True, pokud čtení selhalo na komunikaci (timeout, výpadek spojení).
+
+    Modbus exception odpověď ('Modbus error: ...') znamená, že zařízení
+    odpovědělo - pro řízení tempa se nepočítá jako přetížení.
+    """
+    return not result['ok'] and not result['error'].startswith('Modbus error')
+
+
+class AdaptivePacer:
+    """
+    Adaptivní pauza mezi Modbus dotazy jednoho spojení.
+
+    Měří latenci odpovědí a podíl chyb (klouzavé průměry) a podle nich
+    upravuje pauzu v mezích [min_delay_ms, max_delay_ms]:
+    - timeout/výpadek → pauza se zdvojnásobí (rychlý ústup),
+    - latence výrazně nad dosavadním minimem → pauza mírně roste,
+    - zdravá odpověď → pauza pozvolna klesá (o 10 %).
+    """
+
+    ALPHA = 0.2                 # Váha nového vzorku v klouzavých průměrech
+    BACKOFF_FACTOR = 2.0        # Násobek pauzy po chybě
+    CONGESTION_FACTOR = 1.25    # Násobek pauzy při zvýšené latenci
+    RECOVERY_FACTOR = 0.9       # Násobek pauzy po zdravé odpovědi
+    CONGESTION_RATIO = 2.0      # Latence > 2× minimum = zahlcení
+    MIN_BACKOFF_MS = 50         # Minimální pauza po chybě
+
+    def __init__(self, delay_ms: float, min_delay_ms: float = 0, max_delay_ms: float = 2000):
+        if min_delay_ms > max_delay_ms:
+            raise ValueError(f"delay_min_ms ({min_delay_ms}) > delay_max_ms ({max_delay_ms})")
+
+        self.min_delay = min_delay_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+        self.delay = min(self.max_delay, max(self.min_delay, delay_ms / 1000.0))
+
+        self.latency = None         # Klouzavý průměr latence [s]
+        self.latency_floor = None   # Nejnižší pozorovaný průměr latence [s]
+        self.error_rate = 0.0       # Klouzavý podíl chyb (0-1)
+        self.requests = 0
+        self.errors = 0
+
+    @classmethod
+    def from_connection(cls, connection: Dict) -> 'AdaptivePacer':
+        """Vytvoří pacer z konfigurace spojení (delay_ms, delay_min_ms, delay_max_ms)."""
+        delay_ms = connection['delay_ms']
+        return cls(
+            delay_ms,
+            min_delay_ms=connection.get('delay_min_ms', 0),
+            max_delay_ms=connection.get('delay_max_ms', max(2000, delay_ms))
+        )
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Zaznamená výsledek jednoho dotazu a upraví pauzu."""
+        self.requests += 1
+        self.error_rate += self.ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+        if not ok:
+            self.errors += 1
+            self.delay = min(self.max_delay,
+                             max(self.delay * self.BACKOFF_FACTOR, self.min_delay,
+                                 self.MIN_BACKOFF_MS / 1000.0))
+            return
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.ALPHA * (latency - self.latency)
+        if self.latency_floor is None or self.latency < self.latency_floor:
+            self.latency_floor = self.latency
+
+        if latency > self.latency_floor * self.CONGESTION_RATIO and latency - self.latency_floor > 0.005:
+            self.delay = min(self.max_delay, self.delay * self.CONGESTION_FACTOR)
+        else:
+            self.delay = max(self.min_delay, self.delay * self.RECOVERY_FACTOR)
+
+    def pause(self) -> None:
+        """Počká aktuální pauzu před dalším dotazem."""
+        if self.delay > 0:
+            time.sleep(self.delay)
+
+    def stats_line(self) -> str:
+        """Krátký souhrn stavu pro výpis."""
+        latency_ms = self.latency * 1000 if self.latency is not None else 0.0
+        return (f"pauza {self.delay * 1000:.0f} ms | latence {latency_ms:.0f} ms | "
+                f"chybovost {self.error_rate * 100:.0f} %")
+
+
+def read_registers(client: ModbusTcpClient, plan: List[Dict], unit: int,
+                   delay_ms: int = 0, pacer: Optional[AdaptivePacer] = None) -> List[Dict]:
+    """
+    Provede všechny dotazy z plánu čtení.
+
+    Args:
+        client: Modbus client
+        plan: Plán z plan_reads()
+        unit: Unit ID
+        delay_ms: Pevná pauza mezi dotazy v milisekundách (bez pacer)
+        pacer: Adaptivní řízení pauzy (má přednost před delay_ms)
+
+    Returns:
+        Výsledky ve stejném pořadí jako registry v konfiguraci
+    """
+    indexed = read_registers_indexed(client, plan, unit, delay_ms, pacer)
+    return [indexed[index] for index in sorted(indexed)]
+
+
+def read_registers_indexed(client: ModbusTcpClient, plan: List[Dict], unit: int,
+                           delay_ms: int = 0, pacer: Optional[AdaptivePacer] = None) -> Dict[int, Dict]:
+    """Jako read_registers(), ale vrací slovník {index v konfiguraci: result}."""
+    indexed = {}
+
+    for i, block in enumerate(plan):
+        started = time.monotonic()
+        block_results = read_block(client, block, unit)
+
+        if pacer:
+            ok = not any(is_transport_error(result) for _, result in block_results)
+            pacer.record(time.monotonic() - started, ok)
+
+        for index, result in block_results:
+            indexed[index] = result
+
+        # Pauza mezi dotazy (kromě posledního)
+        if i < len(plan) - 1:
+            if pacer:
+                pacer.pause()
+            elif delay_ms:
+                time.sleep(delay_ms / 1000.0)
+
+    return indexed
+
+
+def build_read_plan(config: Dict, indices: Optional[List[int]] = None) -> List[Dict]:
+    """Sestaví plán čtení podle sekce 'connection' (max_gap, max_block, max_bit_gap, max_bit_block)."""
+    connection = config['connection']
+    return plan_reads(
+        config['descriptors'],
+        max_gap=connection.get('max_gap', DEFAULT_MAX_GAP),
+        max_block=connection.get('max_block', DEFAULT_MAX_BLOCK),
+        max_bit_gap=connection.get('max_bit_gap', DEFAULT_MAX_BIT_GAP),
+        max_bit_block=connection.get('max_bit_block', DEFAULT_MAX_BIT_BLOCK),
+        indices=indices
+    )
+
+
+class PollScheduler:
+    """
+    Plánovač čtení s pevnou periodou na monotónních hodinách.
+
+    Každý registr může mít v YAML vlastní 'period' (sekundy), ostatní
+    používají výchozí interval. Registry se stejnou periodou tvoří skupinu
+    s vlastním termínem (deadline). Termíny se posouvají o celou periodu
+    od původního termínu, ne od konce čtení, takže perioda neujíždí.
+    Pro každou kombinaci právě splatných skupin se jednou sestaví plán
+    blokového čtení a dál se používá z cache.
+    """
+
+    def __init__(self, config: Dict, default_period: float):
+        self.config = config
+        self.groups = []
+        self.plans = {}
+
+        by_period = {}
+        for desc in config['descriptors']:
+            period = float(desc.period if desc.period is not None else default_period)
+            by_period.setdefault(period, []).append(desc.index)
+
+        start = time.monotonic()
+        for period in sorted(by_period):
+            self.groups.append({'period': period, 'indices': by_period[period], 'deadline': start})
+
+        # Statistiky přesnosti
+        self.ticks = 0
+        self.missed = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.last_jitter = 0.0
+
+    def time_until_next(self) -> float:
+        """Vrátí počet sekund do nejbližšího termínu (0 pokud už nastal)."""
+        next_deadline = min(group['deadline'] for group in self.groups)
+        return max(0.0, next_deadline - time.monotonic())
+
+    def due(self) -> List[int]:
+        """
+        Vrátí indexy registrů, které jsou právě na řadě, a posune jejich termíny.
+
+        Pokud čtení nestihlo jednu nebo více period, termíny se přeskočí
+        a započítají jako zmeškané.
+        """
+        now = time.monotonic()
+        due_indices = []
+        jitter = 0.0
+
+        for group in self.groups:
+            if group['deadline'] > now:
+                continue
+
+            jitter = max(jitter, now - group['deadline'])
+            due_indices.extend(group['indices'])
+
+            period = group['period']
+            if period <= 0:
+                group['deadline'] = now
+                continue
+
+            group['deadline'] += period
+            if group['deadline'] <= now:
+                skipped = int((now - group['deadline']) // period) + 1
+                self.missed += skipped
+                group['deadline'] += skipped * period
+
+        if due_indices:
+            self.ticks += 1
+            self.last_jitter = jitter
+            self.jitter_sum += jitter
+            self.jitter_max = max(self.jitter_max, jitter)
+
+        return sorted(due_indices)
+
+    def wait(self) -> List[int]:
+        """Počká do nejbližšího termínu a vrátí indexy registrů na řadě."""
+        while True:
+            remaining = self.time_until_next()
+            if remaining > 0:
+                time.sleep(remaining)
+            due_indices = self.due()
+            if due_indices:
+                return due_indices
+
+    def plan_for(self, indices: List[int]) -> List[Dict]:
+        """Vrátí (a uloží do cache) plán blokového čtení pro dané registry."""
+        key = tuple(indices)
+        if key not in self.plans:
+            self.plans[key] = build_read_plan(self.config, indices)
+        return self.plans[key]
+
+    def stats_line(self) -> str:
+        """Krátký souhrn přesnosti plánovače pro výpis."""
+        mean_jitter = self.jitter_sum / self.ticks if self.ticks else 0.0
+        return (f"jitter {self.last_jitter * 1000:.0f} ms (průměr {mean_jitter * 1000:.0f} ms, "
+                f"max {self.jitter_max * 1000:.0f} ms) | zmeškáno: {self.missed}")
+
+    def describe(self) -> str:
+        """Popis skupin podle periody pro výpis při startu."""
+        return ", ".join(f"{len(group['indices'])}× {group['period']:g}s" for group in self.groups)
+
+
 def load_config(config_file: Path) -> Dict:
-    """Načte konfiguraci z YAML souboru."""
+    """
+    Načte konfiguraci z YAML souboru.
+
+    Sekce 'registers' se rovnou zkompiluje do config['descriptors'],
+    takže chyby v registrech se ohlásí při startu, ne až při čtení.
+    """
     try:
         with open(config_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+            config = yaml.safe_load(f)
     except Exception as e:
         print(f"Chyba při načítání konfigurace: {e}", file=sys.stderr)
         sys.exit(1)
 
+    if isinstance(config, dict) and config.get('registers') is not None:
+        try:
+            config['descriptors'] = compile_registers(config['registers'])
+        except ValueError as e:
+            print(f"Chyba v konfiguraci registrů: {e}", file=sys.stderr)
+            sys.exit(1)
 
-def calculate_cop(results: Dict[int, Dict]) -> Optional[float]:
+    return config
+
+
+# Důvody, proč COP (ne)lze spočítat - kód → popis pro výpis
+COP_REASONS = {
+    'ok': "Podmínky splněny",
+    'missing_values': "Chybí průtok, teploty nebo příkon",
+    'compressor_off': "Kompresor neběží",
+    'defrost': "Běží defrost",
+    'not_heating': "Není topný režim",
+    'no_flow_or_power': "Nulový průtok nebo příkon",
+    'low_delta': "Nedostatečný tepelný spád",
+    'out_of_range': "COP mimo rozumné meze (0.1 - 25)",
+}
+
+
+def evaluate_cop(results: Dict[int, Dict]) -> Dict:
     """
-    Vypočítá COP (Coefficient of Performance) na základě aktuálních hodnot.
+    Vyhodnotí COP (Coefficient of Performance) na základě aktuálních hodnot.
     
     COP = Tepelný výkon / Elektrický příkon
     
@@ -258,99 +1032,131 @@ def calculate_cop(results: Dict[int, Dict]) -> Optional[float]:
     - cp = specifické teplo vody ≈ 4.18 kJ/(kg·K)
     - ΔT = rozdíl teplot výstup - vstup [K]
     
+    Funkce nic nevypisuje - o zobrazení rozhoduje volající (viz describe_cop()),
+    takže ji lze volat i hromadně nad historickými snímky.
+    
     Args:
         results: Dictionary s výsledky čtení registrů (klíč = reg number)
     
     Returns:
-        COP hodnota nebo None pokud nelze vypočítat nebo podmínky nejsou splněny
+        Slovník: 'value' (COP nebo None), 'reason' (kód z COP_REASONS - první
+        nesplněná podmínka), 'failed' (všechny nesplněné podmínky),
+        'status_checked' (False = stavové registry nedostupné, bez kontroly stavu),
+        'thermal_power', 'electrical_power' [kW] a 'delta_temp' [K] pokud jsou známé
     """
-    try:
-        # Potřebné registry pro COP výpočet
-        flow_rate_reg = 30009      # Průtok [l/min]
-        outlet_temp_reg = 30004    # Výstupní teplota [°C]  
-        inlet_temp_reg = 30003     # Vstupní teplota [°C]
-        power_reg = 40018          # Elektrický příkon [kW]
-        
-        # Registry pro kontrolu stavu
-        compressor_reg = 10004     # Compressor Status (1 = běží)
-        defrost_reg = 10005        # Defrosting Status (0 = neběží defrost)
-        operation_reg = 30002      # Operation Cycle (2 = Heating)
-        
-        # Kontrola dostupnosti všech potřebných hodnot
-        required_regs = [flow_rate_reg, outlet_temp_reg, inlet_temp_reg, power_reg]
-        status_regs = [compressor_reg, defrost_reg, operation_reg]
-        
-        for reg in required_regs:
-            if reg not in results or not results[reg]['ok']:
-                return None
-                
-        # Kontrola stavových registrů (nemusí být všechny dostupné)
-        for reg in status_regs:
-            if reg not in results or not results[reg]['ok']:
-                print(f"⚠️ COP: Stavový registr {reg} nedostupný, počítám COP bez kontroly stavu")
-                break
-        else:
-            # Všechny stavové registry jsou dostupné - kontrolujeme podmínky
-            compressor_status = results[compressor_reg]['scaled'] if compressor_reg in results else 0
-            defrost_status = results[defrost_reg]['scaled'] if defrost_reg in results else 0
-            operation_status = results[operation_reg]['scaled'] if operation_reg in results else 2
-            
-            # COP má smysl počítat JEN když:
-            if compressor_status != 1:
-                print(f"🚫 COP: Kompresor neběží (status: {compressor_status})")
-                return None
-            if defrost_status != 0:
-                print(f"🚫 COP: Běží defrost (status: {defrost_status})")
-                return None
-            if operation_status != 2:
-                print(f"🚫 COP: Není topný režim (operation: {operation_status})")
-                return None
-            
-            print(f"✅ COP: Podmínky splněny - kompresor běží, defrost neběží, topí se")
-                
-        # Extrakce hodnot
-        flow_rate = results[flow_rate_reg]['scaled']      # l/min
-        outlet_temp = results[outlet_temp_reg]['scaled']  # °C
-        inlet_temp = results[inlet_temp_reg]['scaled']    # °C  
-        electrical_power = results[power_reg]['scaled']   # kW
-        
-        # Kontrola platnosti hodnot
-        if flow_rate <= 0 or electrical_power <= 0:
-            return None
-            
-        # Výpočet tepelného rozdílu
+    cop = {
+        'value': None,
+        'reason': 'ok',
+        'failed': [],
+        'status_checked': False,
+        'thermal_power': None,
+        'electrical_power': None,
+        'delta_temp': None,
+    }
+
+    def value_of(reg: int) -> Optional[float]:
+        result = results.get(reg)
+        return result['scaled'] if result is not None and result['ok'] else None
+
+    # Potřebné hodnoty pro COP výpočet (příkon z 30018, záložně 40018)
+    flow_rate = value_of(FLOW_RATE_REG)      # l/min
+    outlet_temp = value_of(OUTLET_TEMP_REG)  # °C
+    inlet_temp = value_of(INLET_TEMP_REG)    # °C
+    power = electrical_power(results)        # kW
+
+    if flow_rate is None or outlet_temp is None or inlet_temp is None or power is None:
+        cop['failed'].append('missing_values')
+
+    # Kontrola stavových registrů (nemusí být všechny dostupné)
+    compressor_status = value_of(COMPRESSOR_REG)
+    defrost_status = value_of(DEFROST_REG)
+    operation_status = value_of(OPERATION_REG)
+
+    if None not in (compressor_status, defrost_status, operation_status):
+        # COP má smysl počítat JEN když běží kompresor, neběží defrost a topí se
+        cop['status_checked'] = True
+        if compressor_status != 1:
+            cop['failed'].append('compressor_off')
+        if defrost_status != 0:
+            cop['failed'].append('defrost')
+        if operation_status != 2:
+            cop['failed'].append('not_heating')
+
+    if 'missing_values' not in cop['failed']:
         delta_temp = outlet_temp - inlet_temp  # K (Kelvin rozdíl = Celsius rozdíl)
-        
+        cop['delta_temp'] = delta_temp
+        cop['electrical_power'] = power
+
+        # Kontrola platnosti hodnot
+        if flow_rate <= 0 or power <= 0:
+            cop['failed'].append('no_flow_or_power')
         # Pokud není tepelný spád, COP není relevantní (sníženo z 0.1 na 0.05)
-        if abs(delta_temp) < 0.05:
-            return None
-            
-        # Konverze průtoku na kg/s (1 l/min = 1 kg/min při 20°C)
-        mass_flow = flow_rate / 60.0  # kg/s
-        
-        # Tepelný výkon [kW]
-        # Q = ṁ × cp × ΔT
-        # cp vody ≈ 4.18 kJ/(kg·K) = 4.18 kW·s/(kg·K)
-        thermal_power = mass_flow * 4.18 * abs(delta_temp)  # kW
-        
-        # COP výpočet
-        cop = thermal_power / electrical_power
-        
-        # Rozumné limity pro COP (0.1 - 25.0) 
-        if 0.1 <= cop <= 25.0:
-            return cop
+        elif abs(delta_temp) < 0.05:
+            cop['failed'].append('low_delta')
         else:
-            return None
-            
-    except Exception:
-        return None
+            # Konverze průtoku na kg/s (1 l/min = 1 kg/min při 20°C)
+            # Q = ṁ × cp × ΔT, cp vody ≈ 4.18 kJ/(kg·K) = 4.18 kW·s/(kg·K)
+            thermal_power = flow_rate / 60.0 * WATER_CP * abs(delta_temp)  # kW
+            cop['thermal_power'] = thermal_power
+
+            # Rozumné limity pro COP (0.1 - 25.0)
+            value = thermal_power / power
+            if not 0.1 <= value <= 25.0:
+                cop['failed'].append('out_of_range')
+            elif not cop['failed']:
+                cop['value'] = value
+
+    if cop['failed']:
+        cop['reason'] = cop['failed'][0]
+    return cop
+
+
+def describe_cop(cop: Dict) -> str:
+    """Vrátí popis výsledku evaluate_cop() pro výpis (hodnota nebo důvody)."""
+    if cop['value'] is not None:
+        suffix = "" if cop['status_checked'] else " (bez kontroly stavu)"
+        return f"{cop['value']:.2f}{suffix}"
+    return "N/A - " + ", ".join(COP_REASONS[reason] for reason in cop['failed'])
+
+
+def calculate_cop(results: Dict[int, Dict]) -> Optional[float]:
+    """
+    Vypočítá COP na základě aktuálních hodnot (viz evaluate_cop()).
+    
+    Returns:
+        COP hodnota nebo None pokud nelze vypočítat nebo podmínky nejsou splněny
+    """
+    return evaluate_cop(results)['value']
+
+
+# Sloupce CSV výstupu
+CSV_HEADER = ['ts', 'name', 'reg', 'address0', 'table', 'raw', 'scaled', 'unit', 'delta', 'previous_value', 'ok', 'error', 'cop']
+
+
+def csv_row(timestamp: str, result: Dict, cop_value: Optional[float] = None) -> List:
+    """Sestaví jeden řádek CSV z výsledku čtení."""
+    return [
+        timestamp,
+        result['name'],
+        result['reg'],
+        result['address0'],
+        result['table'],
+        result['raw'],
+        result['scaled'],
+        result['unit'],
+        result.get('delta', ''),
+        result.get('previous_value', ''),
+        result['ok'],
+        result['error'],
+        f"{cop_value:.2f}" if cop_value is not None else ""
+    ]
 
 
 def write_csv_header(csv_file: Path) -> None:
     """Zapíše hlavičku CSV souboru."""
     with open(csv_file, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
-        writer.writerow(['ts', 'name', 'reg', 'address0', 'table', 'raw', 'scaled', 'unit', 'delta', 'previous_value', 'ok', 'error', 'cop'])
+        writer.writerow(CSV_HEADER)
 
 
 def write_csv_row(csv_file: Path, result: Dict, cop_value: Optional[float] = None) -> None:
@@ -359,24 +1165,186 @@ def write_csv_row(csv_file: Path, result: Dict, cop_value: Optional[float] = Non
     
     with open(csv_file, 'a', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
-        writer.writerow([
-            timestamp,
-            result['name'],
-            result['reg'],
-            result['address0'],
-            result['table'],
-            result['raw'],
-            result['scaled'],
-            result['unit'],
-            result.get('delta', ''),
-            result.get('previous_value', ''),
-            result['ok'],
-            result['error'],
-            f"{cop_value:.2f}" if cop_value is not None else ""
-        ])
-
-
-def scan_registers(config: Dict, csv_file: Path, once: bool = False, interval: int = 60, log_file: Path = None) -> None:
+        writer.writerow(csv_row(timestamp, result, cop_value))
+
+
+def parse_flush_policy(value: str) -> Optional[float]:
+    """
+    Převede volbu --flush na interval v sekundách.
+
+    Args:
+        value: 'cycle' (po každé iteraci), 'exit' (jen při ukončení)
+               nebo počet sekund mezi flush
+
+    Returns:
+        0 pro 'cycle', None pro 'exit', jinak počet sekund
+    """
+    if value == 'cycle':
+        return 0
+    if value == 'exit':
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Neplatná flush politika: {value} (cycle, exit nebo sekundy)")
+    if seconds < 0:
+        raise argparse.ArgumentTypeError(f"Neplatná flush politika: {value} (cycle, exit nebo sekundy)")
+    return seconds
+
+
+def parse_roll_option(value: str):
+    """Převede volbu --roll (day nebo velikost segmentu, viz segments.parse_roll)."""
+    try:
+        return parse_roll(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+class CsvSink:
+    """
+    CSV výstup s jedním otevřeným souborem po celou dobu běhu.
+
+    Řádky jedné iterace se zapisují dávkou se společným časem snímku.
+    Kdy se data skutečně zapíší na disk, určuje flush politika
+    (flush_interval: 0 = každá iterace, N = nejvýše jednou za N sekund,
+    None = až při ukončení); fsync=True navíc vynutí zápis na médium.
+    Vedle CSV se udržuje časový index (scan.csv.idx, viz csvindex.py),
+    do kterého se zapisuje až po flush dat. S politikou segmentů se
+    soubor na hranici iterace rotuje (viz segments.py).
+    """
+
+    def __init__(self, csv_file: Path, flush_interval: Optional[float] = 0,
+                 fsync: bool = False, append: bool = True,
+                 segments: Optional[SegmentPolicy] = None):
+        self.csv_file = Path(csv_file)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.created = not self.csv_file.exists()
+        self.roller = SegmentRoller(self.csv_file, segments, (INDEX_SUFFIX,)) if segments else None
+        self.last_moment = None
+        self.open(append)
+
+    def open(self, append: bool = True) -> None:
+        """Otevře CSV soubor (hlavička se zapíše jen do nového / prázdného souboru)."""
+        write_header = not append or not self.csv_file.exists() or self.csv_file.stat().st_size == 0
+        self.file = open(self.csv_file, 'a' if append else 'w', newline='', encoding='utf-8',
+                         buffering=64 * 1024)
+        # Počítadlo bajtů pro offsety indexu (tell() textového souboru by vynutil flush)
+        self.output = CountingFile(self.file, self.csv_file.stat().st_size)
+        self.writer = csv.writer(self.output)
+        self.index = IndexWriter(self.csv_file, fsync=self.fsync)
+        self.last_flush = time.monotonic()
+
+        if write_header:
+            self.writer.writerow(CSV_HEADER)
+
+    def roll(self) -> None:
+        """Uzavře aktuální segment a začne nový soubor."""
+        self.flush()
+        self.file.close()
+        self.index.close()
+        self.roller.roll()
+        self.open(append=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_rows(self, results: List[Dict], cop_value: Optional[float] = None,
+                   timestamp: Optional[datetime] = None) -> None:
+        """Zapíše řádky do bufferu (bez uplatnění flush politiky)."""
+        moment = timestamp or datetime.now()
+        if moment != self.last_moment:
+            # Nová iterace - jen na její hranici se smí rotovat
+            if self.roller and self.roller.due(moment, self.output.position):
+                self.roll()
+            self.index.note(moment, self.output.position)
+            self.last_moment = moment
+            if self.roller:
+                self.roller.note_write(moment)
+        ts = moment.isoformat()
+        self.writer.writerows(csv_row(ts, result, cop_value) for result in results)
+
+    def end_cycle(self) -> None:
+        """Ukončí iteraci - podle politiky provede flush."""
+        if self.flush_interval is None:
+            return
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_cycle(self, results: List[Dict], cop_value: Optional[float] = None,
+                    timestamp: Optional[datetime] = None) -> None:
+        """Zapíše celou iteraci se společným časem snímku."""
+        self.write_rows(results, cop_value, timestamp)
+        self.end_cycle()
+
+    def flush(self) -> None:
+        """Vyprázdní buffer do souboru (a při fsync=True až na médium)."""
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.index.commit()
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Zapíše zbytek bufferu a uzavře soubor."""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+            self.index.close()
+        if self.roller:
+            self.roller.close()
+
+
+class LogSink:
+    """
+    Textový log s jedním otevřeným souborem po celou dobu běhu.
+
+    Řádky se zapisují hned (řádkový buffer) jako dřív při otevírání
+    souboru pro každý zápis. S politikou segmentů se log rotuje.
+    """
+
+    def __init__(self, log_file: Path, segments: Optional[SegmentPolicy] = None):
+        self.log_file = Path(log_file)
+        self.roller = SegmentRoller(self.log_file, segments) if segments else None
+        self.open()
+
+    def open(self) -> None:
+        self.file = open(self.log_file, 'a', encoding='utf-8', buffering=1)
+        self.size = self.log_file.stat().st_size
+
+    def write(self, text: str) -> None:
+        """Zapíše text (včetně konců řádků)."""
+        if self.roller:
+            now = datetime.now()
+            if self.roller.due(now, self.size):
+                self.file.close()
+                self.roller.roll()
+                self.open()
+            self.roller.note_write(now)
+        self.file.write(text)
+        self.size += len(text.encode('utf-8'))
+
+    def line(self, text: str) -> None:
+        """Zapíše řádek s časovým razítkem."""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.write(f"[{timestamp}] {text}\n")
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+        if self.roller:
+            self.roller.close()
+
+
+def scan_registers(config: Dict, csv_file: Path, once: bool = False, interval: int = 60, log_file: Path = None,
+                   flush_interval: Optional[float] = 0, fsync: bool = False,
+                   energy_file: Optional[Path] = None, segments: Optional[SegmentPolicy] = None,
+                   db_file: Optional[Path] = None, rollups: bool = False,
+                   metrics_port: Optional[int] = None, record_file: Optional[Path] = None,
+                   replay: Optional[ReplayClient] = None) -> None:
     """
     Hlavní funkce pro skenování registrů.
     
@@ -386,19 +1354,40 @@ def scan_registers(config: Dict, csv_file: Path, once: bool = False, interval: i
         once: Pokud True, provede pouze jeden průchod
         interval: Interval mezi iteracemi v sekundách
         log_file: Cesta k log souboru (volitelné)
+        flush_interval: Flush politika CSV (viz CsvSink)
+        fsync: Vynutí fsync CSV souboru při každém flush
+        energy_file: Soubor se stavem čítačů energie (volitelné)
+        segments: Rotace CSV a logu po segmentech (volitelné, viz segments.py)
+        db_file: SQLite databáze historie (volitelné, viz sqlite_sink.py)
+        rollups: Průběžné agregace 1 min / 15 min / 1 h vedle CSV a v databázi (viz rollups.py)
+        metrics_port: Port OpenMetrics endpointu (volitelné, viz metrics.py)
+        record_file: Záznam Modbus rámců (volitelné, viz framelog.py)
+        replay: Přehrávač záznamu rámců místo zařízení (volitelné, viz framelog.py)
     """
     connection = config['connection']
-    registers = config['registers']
+    descriptors = config['descriptors']
+    energy = open_energy_integrator(energy_file)
+    db = open_sqlite_sink(db_file, descriptors, fsync)
+    rollup = open_rollups(descriptors, csv_file, db) if rollups else None
+    metrics = open_metrics_server(metrics_port, descriptors)
     
-    # Dictionary pro sledování posledních hodnot (delta monitoring)
-    last_values = {}
+    # Společný engine změn a trendů (delta monitoring)
+    trends = TrendEngine.from_config(config)
     
-    # Připojení k Modbus
-    client = ModbusTcpClient(
-        host=connection['host'],
-        port=connection['port'],
-        timeout=connection['timeout']
-    )
+    # Poslední úspěšné hodnoty všech registrů (pro COP při různých periodách)
+    cop_results = {}
+    
+    # Plánovač s periodami registrů - plány blokového čtení se sestaví jednou
+    scheduler = PollScheduler(config, interval)
+    
+    # Adaptivní pauza mezi dotazy (místo pevného delay_ms)
+    pacer = AdaptivePacer.from_connection(connection)
+    
+    # Připojení k Modbus (se záznamem rámců, nebo přehrávač místo zařízení)
+    frames = open_frame_writer(record_file)
+    client = open_modbus_client(connection, connection['timeout'], frames, replay)
+    sink = None
+    log = None
     
     try:
         if not client.connect():
@@ -407,188 +1396,140 @@ def scan_registers(config: Dict, csv_file: Path, once: bool = False, interval: i
         
         connection_msg = f"Připojen k {connection['host']}:{connection['port']}"
         print(connection_msg)
+        print(f"📦 Plán čtení: {describe_plan(build_read_plan(config))}")
+        print(f"⏱️ Periody: {scheduler.describe()}")
         
         # Logování do souboru pokud je specifikováno
-        if log_file:
-            with open(log_file, 'a', encoding='utf-8') as lf:
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                lf.write(f"[{timestamp}] === LG THERMA V SCAN START ===\n")
-                lf.write(f"[{timestamp}] {connection_msg}\n")
+        log = LogSink(log_file, segments) if log_file else None
+        if log:
+            log.line("=== LG THERMA V SCAN START ===")
+            log.line(connection_msg)
         
-        # Zkontroluj, zda existuje CSV soubor a případně vytvoř hlavičku
-        if not csv_file.exists():
-            write_csv_header(csv_file)
+        # Otevři CSV soubor na celou dobu běhu (hlavička se zapíše jen do nového souboru)
+        sink = CsvSink(csv_file, flush_interval, fsync, segments=segments)
+        if sink.created:
             csv_msg = f"Vytvořen CSV soubor: {csv_file}"
             print(csv_msg)
             
             # Logování do souboru
-            if log_file:
-                with open(log_file, 'a', encoding='utf-8') as lf:
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    lf.write(f"[{timestamp}] {csv_msg}\n")
+            if log:
+                log.line(csv_msg)
         
         iteration = 0
         while True:
+            # Čekání na nejbližší termín plánovače (první iterace hned)
+            due_indices = scheduler.wait()
+            
             iteration += 1
-            iteration_header = f"\n--- Iterace {iteration} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---"
+            snapshot = snapshot_time(replay)
+            iteration_header = f"\n--- Iterace {iteration} - {snapshot.strftime('%Y-%m-%d %H:%M:%S')} ---"
             print(iteration_header)
             
             # Logování hlavičky iterace do souboru
-            if log_file:
-                with open(log_file, 'a', encoding='utf-8') as lf:
-                    lf.write(f"{iteration_header}\n")
+            if log:
+                log.write(f"{iteration_header}\n")
             
             # Dictionary pro ukládání všech výsledků iterace (pro COP výpočet)
             iteration_results = {}
+            error_rows = []
             
-            for i, register_config in enumerate(registers):
+            # Přečti registry, které jsou na řadě (blokové dotazy podle plánu)
+            cycle_results = read_registers_indexed(client, scheduler.plan_for(due_indices),
+                                                   connection['unit'], pacer=pacer)
+            update_trends(trends, descriptors, cycle_results)
+            
+            for index, result in sorted(cycle_results.items()):
+                desc = descriptors[index]
                 try:
-                    result = read_register_value(client, register_config, connection['unit'])
-                    
                     # Uložení výsledku pro COP výpočet
                     if result['ok']:
-                        iteration_results[result['reg']] = result
+                        iteration_results[desc.reg] = result
                     
-                    # Delta monitoring - výpočet změny oproti poslednímu stavu
-                    delta_str = ""
-                    delta_value = ""
-                    previous_val = ""
-                    reg_key = result['reg']
-                    
-                    if result['ok'] and reg_key in last_values:
-                        current_val = result['scaled']
-                        last_val = last_values[reg_key]
-                        previous_val = last_val
-                        
-                        if current_val != last_val:
-                            # Detekuj typ hodnoty podle jednotky a rozsahu
-                            is_binary = (current_val in [0.0, 1.0] and last_val in [0.0, 1.0])
-                            is_temperature = "°C" in result['unit']
-                            is_flow = "l/min" in result['unit'] 
-                            is_power = ("kW" in result['unit'] or "W" in result['unit'])
-                            
-                            if is_binary:
-                                # Binární hodnoty: 0→1 nebo 1→0
-                                delta_str = f" 📈({last_val:.0f}→{current_val:.0f})"
-                                delta_value = f"{last_val:.0f}→{current_val:.0f}"
-                            else:
-                                # Číselné hodnoty s delta a směr
-                                delta = current_val - last_val
-                        if abs(delta) >= 0.01:  # Snížený práh pro citlivější detekci změn
-                            if is_temperature:
-                                delta_str = f" ({delta:+.1f}°C)"
-                                delta_value = f"{delta:+.1f}°C"
-                            elif is_power:
-                                unit_suffix = "kW" if "kW" in result['unit'] else "W"
-                                format_str = "{:+.2f}" if "kW" in result['unit'] else "{:+.0f}"
-                                delta_str = f" ({format_str.format(delta)}{unit_suffix})"
-                                delta_value = f"{format_str.format(delta)}{unit_suffix}"
-                            elif is_flow:
-                                delta_str = f" ({delta:+.1f}l/min)"
-                                delta_value = f"{delta:+.1f}l/min"
-                            else:
-                                delta_str = f" ({delta:+.1f})"
-                                delta_value = f"{delta:+.1f}"                    # Přidání delta informací do result pro CSV a log
-                    result['delta'] = delta_value
-                    result['previous_value'] = previous_val
-                    
-                    # Uložení aktuální hodnoty pro příští iteraci
-                    if result['ok']:
-                        last_values[reg_key] = result['scaled']
+                    # Delta monitoring - změna oproti předchozímu čtení (z trend enginu)
+                    delta_value = result.get('delta', '')
+                    delta_str = f" ({delta_value})" if delta_value else ""
+                    is_binary = "→" in delta_value
                     
                     # Výpis na konzoli s delta informací
                     if result['ok']:
-                        # Detekuj typ hodnoty pro barevné zvýraznění
-                        is_binary = (result['scaled'] in [0.0, 1.0]) and delta_value and "→" in delta_value
-                        is_temperature = "°C" in result['unit']
-                        is_flow = "l/min" in result['unit']
-                        is_power = ("kW" in result['unit'] or "W" in result['unit'])
-                        
                         # Aplikuj barevné zvýraznění na delta_str
-                        colored_delta_str = colorize_delta(delta_str, is_binary, is_temperature, is_power, is_flow)
+                        colored_delta_str = colorize_delta(delta_str, is_binary, desc.kind == 'temperature',
+                                                           desc.kind == 'power', desc.kind == 'flow')
                         
-                        output_line = f"✓ [{result['reg']:05d}] {result['name']}: {result['scaled']:.2f} {result['unit']}{colored_delta_str} (raw: {result['raw']}, table: {result['table']})"
+                        output_line = f"✓ [{desc.reg:05d}] {desc.name}: {result['scaled']:.2f} {desc.unit}{colored_delta_str} (raw: {result['raw']}, table: {result['table']})"
                         print(output_line)
                         
                         # Pro log soubor používáme nebarevnou verzi
-                        log_line = f"✓ [{result['reg']:05d}] {result['name']}: {result['scaled']:.2f} {result['unit']}{delta_str} (raw: {result['raw']}, table: {result['table']})"
+                        log_line = f"✓ [{desc.reg:05d}] {desc.name}: {result['scaled']:.2f} {desc.unit}{delta_str} (raw: {result['raw']}, table: {result['table']})"
                     else:
-                        output_line = f"✗ [{result['reg']:05d}] {result['name']}: {result['error']}"
+                        output_line = f"✗ [{desc.reg:05d}] {desc.name}: {result['error']}"
                         log_line = output_line
                         print(output_line)
                     
                     # Logování do souboru pokud je specifikováno (bez barev)
-                    if log_file:
-                        with open(log_file, 'a', encoding='utf-8') as lf:
-                            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            lf.write(f"[{timestamp}] {log_line}\n")
+                    if log:
+                        log.line(log_line)
                     
-                    # Delay mezi dotazy (kromě posledního)
-                    if i < len(registers) - 1:
-                        time.sleep(connection['delay_ms'] / 1000.0)
-                        
                 except Exception as e:
-                    error_line = f"✗ [{register_config.get('reg', 0):05d}] Chyba při čtení {register_config.get('name', 'N/A')}: {e.__class__.__name__}: {e}"
+                    error_line = f"✗ [{desc.reg:05d}] Chyba při čtení {desc.name}: {e.__class__.__name__}: {e}"
                     print(error_line)
                     
                     # Logování chyby do souboru pokud je specifikováno
-                    if log_file:
-                        with open(log_file, 'a', encoding='utf-8') as lf:
-                            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            lf.write(f"[{timestamp}] {error_line}\n")
+                    if log:
+                        log.line(error_line)
                     
                     # Zapíš chybový záznam do CSV
-                    error_result = {
-                        'name': register_config.get('name', 'N/A'),
-                        'reg': register_config.get('reg', 0),
-                        'address0': 0,
-                        'table': register_config.get('table', 'unknown'),
-                        'raw': None,
-                        'scaled': None,
-                        'unit': register_config.get('unit', ''),
-                        'delta': '',
-                        'previous_value': '',
-                        'ok': False,
-                        'error': str(e)
-                    }
-                    write_csv_row(csv_file, error_result)
+                    error_result = desc.new_result()
+                    error_result.update({'delta': '', 'previous_value': '', 'error': str(e)})
+                    error_rows.append(error_result)
             
-            # COP výpočet na konci iterace
-            cop_value = calculate_cop(iteration_results)
+            # COP výpočet na konci iterace (z posledních hodnot všech registrů)
+            cop_results.update(iteration_results)
+            cop = evaluate_cop(cop_results)
+            cop_value = cop['value']
             
-            # Výpis COP informací
+            # Výpis COP informací (hodnota nebo důvod, proč ji nelze spočítat)
             if cop_value is not None:
-                cop_output = f"🔥 COP (Coefficient of Performance): {cop_value:.2f}"
-                print(cop_output)
-                
-                # Logování COP do souboru
-                if log_file:
-                    with open(log_file, 'a', encoding='utf-8') as lf:
-                        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        lf.write(f"[{timestamp}] {cop_output}\n")
+                cop_output = f"🔥 COP (Coefficient of Performance): {describe_cop(cop)}"
             else:
-                cop_info = "ℹ️  COP: Nedostatečný tepelný spád nebo chybné hodnoty"
-                print(cop_info)
+                cop_output = f"ℹ️  COP: {describe_cop(cop)}"
+            print(cop_output)
+            
+            # Logování COP do souboru
+            if log:
+                log.line(cop_output)
+            
+            # Integrace energie (kWh) z posledních hodnot všech registrů
+            if energy:
+                energy.add_sample(cop_results, snapshot)
+                energy_output = f"⚡ Energie: {energy.summary_line()}"
+                print(energy_output)
                 
-                if log_file:
-                    with open(log_file, 'a', encoding='utf-8') as lf:
-                        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        lf.write(f"[{timestamp}] {cop_info}\n")
-            
-            # Zápis všech výsledků do CSV s COP hodnotou
-            for result in iteration_results.values():
-                write_csv_row(csv_file, result, cop_value)
+                if log:
+                    log.line(energy_output)
+            
+            # Zápis všech výsledků do CSV s COP hodnotou (jedna dávka se společným časem)
+            sink.write_rows(error_rows, None, snapshot)
+            sink.write_rows(list(iteration_results.values()), cop_value, snapshot)
+            sink.end_cycle()
+            if db:
+                db.write_cycle(list(iteration_results.values()), snapshot)
+            if rollup:
+                rollup.add(list(iteration_results.values()), snapshot.timestamp())
+            if metrics:
+                metrics.publish_cycle(list(cycle_results.values()) + error_rows, cop_value, snapshot.timestamp(),
+                                      trends)
             
             if once:
                 break
             
             # Dokončení iterace
-            print(f"Dokončena iterace {iteration}")
+            print(f"Dokončena iterace {iteration} | ⏱️ {scheduler.stats_line()} | 🚦 {pacer.stats_line()}")
             
             # Čekání do další iterace
-            if interval > 0:
-                print(f"Čekám {interval} sekund do další iterace...")
-                time.sleep(interval)
+            remaining = scheduler.time_until_next()
+            if remaining > 0:
+                print(f"Čekám {remaining:.1f} sekund do další iterace...")
             
     except KeyboardInterrupt:
         print("\nUkončuji na požádání uživatele...")
@@ -596,7 +1537,20 @@ def scan_registers(config: Dict, csv_file: Path, once: bool = False, interval: i
         print(f"Kritická chyba: {e}", file=sys.stderr)
         sys.exit(2)
     finally:
+        if sink:
+            sink.close()
+        if log:
+            log.close()
+        close_rollups(rollup)
+        if db:
+            db.close()
+        if metrics:
+            metrics.close()
+        if energy:
+            energy.close()
         client.close()
+        if frames:
+            frames.close()
         print("Odpojeno od Modbus serveru")
 
 
@@ -611,11 +1565,14 @@ def clear_screen():
 
 def get_color_for_value(register_data: Dict, value: Union[int, float, str]) -> tuple:
     """Vrátí barvu podle hodnoty a typu registru"""
+    return get_color_for_unit(register_data.get('unit', ''), value)
+
+
+def get_color_for_unit(unit: str, value: Union[int, float, str]) -> tuple:
+    """Vrátí barvu podle hodnoty a jednotky registru"""
     if not COLORAMA_AVAILABLE:
         return "", ""
     
-    unit = register_data.get('unit', '')
-    
     if unit == "°C":
         if isinstance(value, (int, float)):
             if value > 25:
@@ -646,80 +1603,57 @@ def get_color_for_value(register_data: Dict, value: Union[int, float, str]) -> t
 
 
 
-def draw_table_header(title: str, iteration: int):
-    """Vykreslí hlavičku tabulky"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def format_table_header(title: str, iteration: int, moment: Optional[datetime] = None) -> List[str]:
+    """Sestaví řádky hlavičky tabulky (moment = čas snímku, výchozí aktuální čas)"""
+    timestamp = (moment or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
     full_title = f"🏠 {title} - Iteration {iteration}"
     subtitle = f"📅 {timestamp} | 🖥️ Smooth Table Mode"
-    
-    print(f"{Fore.CYAN}{Style.BRIGHT}{'═' * 108}{Style.RESET_ALL}")
-    print(f"{Fore.CYAN}{Style.BRIGHT}{full_title.center(108)}{Style.RESET_ALL}")
-    print(f"{Fore.MAGENTA}{subtitle.center(108)}{Style.RESET_ALL}")
-    print(f"{Fore.CYAN}{Style.BRIGHT}{'═' * 108}{Style.RESET_ALL}")
-    
     header = f"{Fore.WHITE}{Style.BRIGHT}"
-    print(f"{header}┌────────┬─────────────────────────────────────┬──────────┬────────┬──────┬──────────────────────┬────────────┐{Style.RESET_ALL}")
-    print(f"{header}│Register│ Parameter                           │ Value    │ Unit   │ Raw  │ Delta Changes        │ Status     │{Style.RESET_ALL}")
-    print(f"{header}├────────┼─────────────────────────────────────┼──────────┼────────┼──────┼──────────────────────┼────────────┤{Style.RESET_ALL}")
+    
+    return [
+        f"{Fore.CYAN}{Style.BRIGHT}{'═' * 108}{Style.RESET_ALL}",
+        f"{Fore.CYAN}{Style.BRIGHT}{full_title.center(108)}{Style.RESET_ALL}",
+        f"{Fore.MAGENTA}{subtitle.center(108)}{Style.RESET_ALL}",
+        f"{Fore.CYAN}{Style.BRIGHT}{'═' * 108}{Style.RESET_ALL}",
+        f"{header}┌────────┬─────────────────────────────────────┬──────────┬────────┬──────┬──────────────────────┬────────────┐{Style.RESET_ALL}",
+        f"{header}│Register│ Parameter                           │ Value    │ Unit   │ Raw  │ Delta Changes        │ Status     │{Style.RESET_ALL}",
+        f"{header}├────────┼─────────────────────────────────────┼──────────┼────────┼──────┼──────────────────────┼────────────┤{Style.RESET_ALL}",
+    ]
+
+
+def draw_table_header(title: str, iteration: int):
+    """Vykreslí hlavičku tabulky"""
+    for line in format_table_header(title, iteration):
+        print(line)
 
 
-def draw_table_row(register_data: Dict, result: Dict, last_values: Dict = None):
+def draw_table_row(desc: RegisterDescriptor, result: Dict):
     """Vykreslí jeden řádek tabulky s ultra-precízním zarovnáním a delta tracking"""
-    reg_num = register_data.get('reg', 'N/A')
-    name = register_data.get('name', 'Unknown')
-    
-    # Formátování registru - přidáme leading zeros pro coils
-    if isinstance(reg_num, int):
-        if reg_num < 10:  # Pro coils (1,2,3) zobrazit jako 00001, 00002, 00003
-            reg_str = f"{reg_num:05d}"
-        else:
-            reg_str = str(reg_num)
-    else:
-        reg_str = str(reg_num)
-    
-    # Zkrátit jméno pokud je příliš dlouhé - JEDNODUCHÉ bez emoji
-    display_name = name
-    if len(display_name) > 33:
-        display_name = display_name[:30] + "..."
-    
-    # Padding na presne 33 znakov
-    display_name = f"{display_name:<33}"
-    
-    # Delta calculation
-    delta_str = ""
-    if result['ok'] and last_values is not None and reg_num in last_values:
-        current_val = result['scaled']
-        last_val = last_values[reg_num]
-        
-        if current_val != last_val:
-            # Detekuj typ hodnoty podle jednotky a rozsahu
-            is_binary = (current_val in [0.0, 1.0] and last_val in [0.0, 1.0])
-            is_temperature = "°C" in register_data.get('unit', '')
-            is_flow = "l/min" in register_data.get('unit', '') 
-            is_power = ("kW" in register_data.get('unit', '') or "W" in register_data.get('unit', ''))
-            
-            if is_binary:
-                delta_str = f"{last_val:.0f}→{current_val:.0f}"
-            else:
-                delta = current_val - last_val
-                if abs(delta) >= 0.01:
-                    if is_temperature:
-                        delta_str = f"{delta:+.1f}°C"
-                    elif is_power:
-                        unit_suffix = "kW" if "kW" in register_data.get('unit', '') else "W"
-                        format_str = "{:+.2f}" if "kW" in register_data.get('unit', '') else "{:+.0f}"
-                        delta_str = f"{format_str.format(delta)}{unit_suffix}"
-                    elif is_flow:
-                        delta_str = f"{delta:+.1f}l/min"
-                    else:
-                        delta_str = f"{delta:+.1f}"
+    print(join_table_cells(format_table_row(desc, result)))
+
+
+def join_table_cells(cells: List[str]) -> str:
+    """Spojí buňky řádku tabulky oddělovači"""
+    return "│" + "│".join(cells) + "│"
+
+
+def format_table_row(desc: RegisterDescriptor, result: Dict) -> List[str]:
+    """
+    Sestaví buňky jednoho řádku tabulky s ultra-precízním zarovnáním a delta tracking.
+
+    Delta je poslední změna registru z trend enginu (result['delta'], viz update_trends()).
+    """
+    # Popisky registru a jména jsou předpočítané v deskriptoru (leading zeros pro coils, šířka 33)
+    reg_str = desc.reg_label
+    display_name = desc.display_name
+    delta_str = result.get('delta', '') if result['ok'] else ''
     
     if result['ok']:
         scaled_value = result['scaled']
-        unit = register_data.get('unit', '')
+        unit = desc.unit
         raw_value = result['raw']
         
-        color, style = get_color_for_value(register_data, scaled_value)
+        color, style = get_color_for_unit(unit, scaled_value)
         
         # ULTRA-PRESNÉ formátovanie s delta sloupcem
         reg_part = f"{reg_str:>8}"                        # Presne 8 znakov
@@ -753,7 +1687,8 @@ def draw_table_row(register_data: Dict, result: Dict, last_values: Dict = None):
             # Delta s farbami - FIXNÍ ŠÍŘKA 20 ZNAKŮ
             if delta_str:
                 # Aplikuj barvy na samotný delta text
-                colored_delta = colorize_delta(delta_str, is_binary=(scaled_value in [0.0, 1.0]), is_temperature=('°C' in unit))
+                colored_delta = colorize_delta(delta_str, is_binary=("→" in delta_str),
+                                               is_temperature=(desc.kind == 'temperature'))
                 # Fixní padding - 20 mezer po colored textu
                 spaces_needed = max(0, 20 - len(delta_str))
                 delta_colored = f" {colored_delta}{' ' * spaces_needed}"
@@ -771,8 +1706,7 @@ def draw_table_row(register_data: Dict, result: Dict, last_values: Dict = None):
             status_colored = status_part
         
         # Fixed layout - každá časť má pevnú pozíciu
-        line = f"│{reg_colored}│{name_colored}│{value_colored}│{unit_colored}│{raw_colored} │{delta_colored}│{status_colored}│"
-        print(line)
+        return [reg_colored, name_colored, value_colored, unit_colored, f"{raw_colored} ", delta_colored, status_colored]
         
     else:
         error_msg = result.get('error', 'Unknown error')[:10]
@@ -804,14 +1738,11 @@ def draw_table_row(register_data: Dict, result: Dict, last_values: Dict = None):
             status_colored = status_part
         
         # Error line s delta sloupcem
-        line = f"│{reg_colored}│{name_colored}│{value_colored}│{unit_colored}│{raw_colored} │{delta_colored}│{status_colored}│"
-        print(line)
+        return [reg_colored, name_colored, value_colored, unit_colored, f"{raw_colored} ", delta_colored, status_colored]
 
 
-def draw_table_footer(cop_value: Optional[float], total_registers: int, successful: int):
-    """Vykreslí patičku tabulky se statistikami"""
-    print(f"{Fore.WHITE}{Style.BRIGHT}└────────┴─────────────────────────────────────┴──────────┴────────┴──────┴──────────────────────┴────────────┘{Style.RESET_ALL}")
-    
+def format_table_footer(cop_value: Optional[float], total_registers: int, successful: int) -> List[str]:
+    """Sestaví řádky patičky tabulky se statistikami"""
     # Statistiky
     success_rate = (successful / total_registers * 100) if total_registers > 0 else 0
     cop_str = f"{cop_value:.2f}" if cop_value else "N/A"
@@ -819,53 +1750,158 @@ def draw_table_footer(cop_value: Optional[float], total_registers: int, successf
     stats1 = f"🔥 COP: {cop_str} | 📊 Success: {successful}/{total_registers} ({success_rate:.1f}%)"
     stats2 = f"🎛️ Controls: Ctrl+C to quit | Auto refresh every few seconds"
     
-    print(f"{Fore.GREEN}{Style.BRIGHT}{'─' * 108}{Style.RESET_ALL}")
-    print(f"{Fore.GREEN}{stats1.center(108)}{Style.RESET_ALL}")
-    print(f"{Fore.YELLOW}{stats2.center(108)}{Style.RESET_ALL}")
-    print(f"{Fore.GREEN}{Style.BRIGHT}{'─' * 108}{Style.RESET_ALL}")
+    lines = [
+        f"{Fore.WHITE}{Style.BRIGHT}└────────┴─────────────────────────────────────┴──────────┴────────┴──────┴──────────────────────┴────────────┘{Style.RESET_ALL}",
+        f"{Fore.GREEN}{Style.BRIGHT}{'─' * 108}{Style.RESET_ALL}",
+        f"{Fore.GREEN}{stats1.center(108)}{Style.RESET_ALL}",
+        f"{Fore.YELLOW}{stats2.center(108)}{Style.RESET_ALL}",
+        f"{Fore.GREEN}{Style.BRIGHT}{'─' * 108}{Style.RESET_ALL}",
+    ]
     
     if not COLORAMA_AVAILABLE:
-        print(f"\n{Fore.YELLOW}💡 Tip: Pro barvy nainstalujte colorama: pip install colorama{Style.RESET_ALL}")
+        lines.append("")
+        lines.append(f"{Fore.YELLOW}💡 Tip: Pro barvy nainstalujte colorama: pip install colorama{Style.RESET_ALL}")
+    
+    return lines
+
+
+def draw_table_footer(cop_value: Optional[float], total_registers: int, successful: int):
+    """Vykreslí patičku tabulky se statistikami"""
+    for line in format_table_footer(cop_value, total_registers, successful):
+        print(line)
+
+
+# ANSI escape sekvence (barvy, pohyb kurzoru) - pro výpočet viditelné šířky
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+
+
+def visible_width(text: str) -> int:
+    """Vrátí počet viditelných znaků textu (bez ANSI sekvencí)."""
+    return len(ANSI_ESCAPE_RE.sub('', text))
+
+
+class FrameRenderer:
+    """
+    Diff renderer pro smooth režim.
+
+    Snímek (frame) je seznam řádků; řádek je buď text, nebo seznam buněk
+    tabulky. Renderer si pamatuje předchozí snímek a na terminál pošle jen
+    pohyby kurzoru a text změněných buněk/řádků - vše jedním
+    sys.stdout.write. Po změně velikosti terminálu překreslí vše.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.previous = None
+        self.terminal_size = None
+
+    @staticmethod
+    def _line(row) -> str:
+        return row if isinstance(row, str) else join_table_cells(row)
+
+    def invalidate(self) -> None:
+        """Vynutí úplné překreslení při příštím snímku."""
+        self.previous = None
+
+    def render(self, frame: List) -> None:
+        """Vykreslí snímek - jen rozdíly oproti předchozímu."""
+        size = shutil.get_terminal_size()
+        # Snímek delší než terminál by rolovat a rozbil absolutní pozice
+        frame = frame[:max(1, size.lines - 1)]
+        out = []
+
+        if self.previous is None or size != self.terminal_size:
+            out.append("\033[H\033[2J")
+            for row_number, row in enumerate(frame, 1):
+                out.append(f"\033[{row_number};1H{self._line(row)}\033[K")
+        else:
+            for row_number, row in enumerate(frame, 1):
+                old = self.previous[row_number - 1] if row_number <= len(self.previous) else None
+                if row == old:
+                    continue
+
+                if isinstance(row, list) and isinstance(old, list) and len(row) == len(old):
+                    column = 2  # Za úvodním oddělovačem │
+                    for cell, old_cell in zip(row, old):
+                        if cell != old_cell:
+                            if visible_width(cell) != visible_width(old_cell):
+                                # Jiná šířka buňky posune zbytek řádku - překresli řádek
+                                out.append(f"\033[{row_number};1H{self._line(row)}\033[K")
+                                break
+                            out.append(f"\033[{row_number};{column}H{cell}")
+                        column += visible_width(cell) + 1
+                else:
+                    out.append(f"\033[{row_number};1H{self._line(row)}\033[K")
+
+            if len(frame) < len(self.previous):
+                out.append(f"\033[{len(frame) + 1};1H\033[J")
+
+        # Kurzor pod snímek (pro progress řádek)
+        out.append(f"\033[{len(frame) + 1};1H")
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+        self.previous = frame
+        self.terminal_size = size
 
 
 def simple_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None, 
-                  log_file: Optional[Path] = None):
+                  log_file: Optional[Path] = None, flush_interval: Optional[float] = 0,
+                  fsync: bool = False, energy_file: Optional[Path] = None,
+                  segments: Optional[SegmentPolicy] = None, db_file: Optional[Path] = None,
+                  rollups: bool = False, metrics_port: Optional[int] = None,
+                  record_file: Optional[Path] = None, replay: Optional[ReplayClient] = None):
     """
     Jednoduchý monitoring režim - čistý textový výpis všech registrů najednou.
     """
     print("🖥️ Spouštím Simple Monitor...")
     print(f"📡 Připojuji k {config['connection']['host']}:{config['connection']['port']}")
     
-    # Připojení k Modbus s delším timeout
-    client = ModbusTcpClient(
-        host=config['connection']['host'],
-        port=config['connection']['port'],
-        timeout=10  # Zvýšený timeout na 10 sekund
-    )
+    # Připojení k Modbus s delším timeout (zvýšený na 10 sekund)
+    frames = open_frame_writer(record_file)
+    client = open_modbus_client(config['connection'], 10, frames, replay)
     
     if not client.connect():
         print("❌ Připojení selhalo!")
+        if frames:
+            frames.close()
         return
     
     print("✅ Připojen k Modbus serveru")
     print(f"📊 Celkem {len(config['registers'])} registrů")
+    
+    # Plánovač s periodami registrů - plány blokového čtení se sestaví jednou
+    scheduler = PollScheduler(config, interval)
+    pacer = AdaptivePacer.from_connection(config['connection'])
+    print(f"📦 Plán čtení: {describe_plan(build_read_plan(config))}")
+    print(f"⏱️ Periody: {scheduler.describe()}")
     print("💡 Stiskněte Ctrl+C pro ukončení\n")
     
     # Vyčištění obrazovky jen jednou na začátku
     clear_screen()
     
     iteration = 0
-    previous_values = {}  # Sledování předchozích hodnot pro delta
+    trends = TrendEngine.from_config(config)  # Sledování změn pro delta
+    latest = {}  # Poslední výsledek každého registru (index v konfiguraci → result)
+    descriptors = config['descriptors']
+    energy = open_energy_integrator(energy_file)
+    sink = CsvSink(csv_file, flush_interval, fsync, append=False, segments=segments) if csv_file else None
+    log = LogSink(log_file, segments) if log_file else None
+    db = open_sqlite_sink(db_file, descriptors, fsync)
+    rollup = open_rollups(descriptors, csv_file, db) if rollups else None
+    metrics = open_metrics_server(metrics_port, descriptors)
     
     try:
         while True:
+            due_indices = scheduler.wait()
             iteration += 1
             
             # ANSI pozicionování kurzoru na začátek (kromě první iterace)
             if iteration > 1:
                 print("\033[2J\033[H", end="")  # Vymaž celou obrazovku + kurzor na pozíciu 0,0
             
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            snapshot = snapshot_time(replay)
+            timestamp = snapshot.strftime("%Y-%m-%d %H:%M:%S")
             print("🖥️ LG Therma V Simple Monitor")
             print("=" * 70)
             print(f"📅 {timestamp} | Iterace #{iteration}")
@@ -877,40 +1913,35 @@ def simple_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None,
             successful = 0
             iteration_results = {}
             
-            for register_data in config['registers']:
-                result = read_register_value(client, register_data, config['connection']['unit'])
-                results.append((register_data, result))
+            cycle_results = read_registers_indexed(client, scheduler.plan_for(due_indices),
+                                                   config['connection']['unit'], pacer=pacer)
+            update_trends(trends, descriptors, cycle_results)
+            latest.update(cycle_results)
+            
+            for index in sorted(latest):
+                desc = descriptors[index]
+                result = latest[index]
+                results.append((desc, result))
                 
                 if result['ok']:
                     successful += 1
-                    reg_num = register_data.get('reg')
-                    iteration_results[reg_num] = result
+                    iteration_results[desc.reg] = result
             
             # COP výpočet
-            cop_value = calculate_cop(iteration_results)
+            cop = evaluate_cop(iteration_results)
+            cop_value = cop['value']
             
             # Výpis všech registrů najednou
-            for register_data, result in results:
-                reg_num = register_data.get('reg')
-                name = register_data.get('name', 'Unknown')
-                unit = register_data.get('unit', '')
+            for desc, result in results:
+                reg_num = desc.reg
+                name = desc.name
+                unit = desc.unit
                 
                 if result['ok']:
                     value = result['scaled']
                     
-                    # Výpočet delta
-                    delta_str = ""
-                    if iteration > 1 and reg_num in previous_values:
-                        prev_val = previous_values[reg_num]
-                        if isinstance(value, (int, float)) and isinstance(prev_val, (int, float)):
-                            delta = value - prev_val
-                            if abs(delta) >= 0.1:
-                                if delta > 0:
-                                    delta_str = f" (+{delta:.1f})"
-                                else:
-                                    delta_str = f" ({delta:.1f})"
-                        elif value != prev_val:
-                            delta_str = " (změna)"
+                    # Delta z trend enginu (stejný formát jako ostatní režimy)
+                    delta_str = f" ({result['delta']})" if result.get('delta') else ""
                     
                     # Formátování hodnoty
                     if isinstance(value, float):
@@ -923,9 +1954,6 @@ def simple_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None,
                         print(f"  {reg_num:>5}: {name:<40} {value_str:>10} {unit:<8}{delta_str}")
                     else:
                         print(f"  {reg_num:>5}: {name:<40} {value_str:>10}{delta_str}")
-                    
-                    # Uložit hodnotu pro příští iteraci
-                    previous_values[reg_num] = value
                 else:
                     print(f"  {reg_num:>5}: {name:<40} ERROR")
             
@@ -934,28 +1962,36 @@ def simple_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None,
             success_rate = (successful / len(config['registers']) * 100) if len(config['registers']) > 0 else 0
             print(f"📊 Úspěšnost: {successful}/{len(config['registers'])} ({success_rate:.1f}%)")
             
-            if cop_value:
-                print(f"🔥 COP: {cop_value:.2f}")
-            else:
-                print("🔥 COP: N/A")
-            
-            # CSV zápis
-            if csv_file:
-                if iteration == 1:
-                    write_csv_header(csv_file)
-                for register_data, result in results:
-                    write_csv_row(csv_file, result, cop_value)
+            print(f"🔥 COP: {describe_cop(cop)}")
+            if energy:
+                energy.add_sample(iteration_results, snapshot)
+                print(f"⚡ Energie: {energy.summary_line()}")
+            print(f"⏱️ Plánovač: {scheduler.stats_line()}")
+            print(f"🚦 Tempo: {pacer.stats_line()}")
+            
+            # CSV zápis (jen právě přečtené registry)
+            cycle_rows = [cycle_results[index] for index in sorted(cycle_results)]
+            if sink:
+                sink.write_cycle(cycle_rows, cop_value, snapshot)
+            if db:
+                db.write_cycle(cycle_rows, snapshot)
+            if rollup:
+                rollup.add(cycle_rows, snapshot.timestamp())
+            if metrics:
+                metrics.publish_cycle(cycle_rows, cop_value, snapshot.timestamp(), trends)
             
             # Log zápis
-            if log_file:
-                write_results_to_log(results, log_file, iteration, cop_value)
+            if log:
+                write_results_to_log(results, log, iteration, cop_value)
             
-            print(f"\n⏰ Další aktualizace za {interval}s | Ctrl+C pro ukončení")
+            remaining = scheduler.time_until_next()
+            print(f"\n⏰ Další aktualizace za {remaining:.0f}s | Ctrl+C pro ukončení")
             
-            # Jednoduchý countdown
-            for i in range(interval, 0, -1):
-                print(f"\r⏳ Čekám {i}s...     ", end="", flush=True)
-                time.sleep(1)
+            # Jednoduchý countdown do termínu plánovače
+            while remaining > 0:
+                print(f"\r⏳ Čekám {remaining:.0f}s...     ", end="", flush=True)
+                time.sleep(min(1.0, remaining))
+                remaining = scheduler.time_until_next()
             print("\r" + " " * 20 + "\r", end="")  # Vymaž countdown
             
     except KeyboardInterrupt:
@@ -963,7 +1999,20 @@ def simple_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None,
     except Exception as e:
         print(f"\n❌ Chyba: {e}")
     finally:
+        if sink:
+            sink.close()
+        if log:
+            log.close()
+        close_rollups(rollup)
+        if db:
+            db.close()
+        if metrics:
+            metrics.close()
+        if energy:
+            energy.close()
         client.close()
+        if frames:
+            frames.close()
         print("👋 Odpojeno od Modbus serveru")
 
 
@@ -1310,26 +2359,26 @@ def simple_monitor_old(config: Dict, interval: int, csv_file: Optional[Path] = N
             client.close()
 
 
-def write_results_to_log(results: List[tuple], log_file: Path, iteration: int, cop_value: Optional[float]):
-    """Zapíše výsledky do log souboru"""
-    with open(log_file, 'a', encoding='utf-8') as f:
-        f.write(f"\n--- Table Monitor Iteration {iteration} - {datetime.now().isoformat()} ---\n")
-        if cop_value:
-            f.write(f"COP: {cop_value:.2f}\n")
-        
-        for register_data, result in results:
-            reg_num = register_data.get('reg', 'N/A')
-            name = register_data.get('name', 'Unknown')
-            if result['ok']:
-                scaled_value = result['scaled']
-                unit = register_data.get('unit', '')
-                f.write(f"✓ [{reg_num}] {name}: {scaled_value} {unit}\n")
-            else:
-                f.write(f"✗ [{reg_num}] {name}: ERROR - {result.get('error', 'Unknown')}\n")
+def write_results_to_log(results: List[tuple], log: LogSink, iteration: int, cop_value: Optional[float]):
+    """Zapíše výsledky (dvojice RegisterDescriptor, result) do logu jedním zápisem"""
+    lines = [f"\n--- Table Monitor Iteration {iteration} - {datetime.now().isoformat()} ---\n"]
+    if cop_value:
+        lines.append(f"COP: {cop_value:.2f}\n")
+    
+    for desc, result in results:
+        if result['ok']:
+            lines.append(f"✓ [{desc.reg}] {desc.name}: {result['scaled']} {desc.unit}\n")
+        else:
+            lines.append(f"✗ [{desc.reg}] {desc.name}: ERROR - {result['error'] or 'Unknown'}\n")
+    log.write("".join(lines))
 
 
 def smooth_table_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None, 
-                        log_file: Optional[Path] = None):
+                        log_file: Optional[Path] = None, flush_interval: Optional[float] = 0,
+                        fsync: bool = False, energy_file: Optional[Path] = None,
+                        segments: Optional[SegmentPolicy] = None, db_file: Optional[Path] = None,
+                        rollups: bool = False, metrics_port: Optional[int] = None,
+                        record_file: Optional[Path] = None, replay: Optional[ReplayClient] = None):
     """
     Monitoring v režimu plynulé tabulky bez blikání.
     Používá buffer rendering pro okamžité zobrazení.
@@ -1343,17 +2392,22 @@ def smooth_table_monitor(config: Dict, interval: int, csv_file: Optional[Path] =
         print(f"{Fore.YELLOW}⚠️  Colorama není dostupná - bez barev{Style.RESET_ALL}")
 
     # Připojení k Modbus
-    client = ModbusTcpClient(
-        host=config['connection']['host'],
-        port=config['connection']['port'],
-        timeout=config['connection']['timeout']
-    )
+    frames = open_frame_writer(record_file)
+    client = open_modbus_client(config['connection'], config['connection']['timeout'], frames, replay)
     
     if not client.connect():
         print(f"{Fore.RED}❌ Připojení selhalo!{Style.RESET_ALL}")
+        if frames:
+            frames.close()
         return
     
     print(f"{Fore.GREEN}✅ Připojen k Modbus serveru{Style.RESET_ALL}")
+    
+    # Plánovač s periodami registrů - plány blokového čtení se sestaví jednou
+    scheduler = PollScheduler(config, interval)
+    pacer = AdaptivePacer.from_connection(config['connection'])
+    print(f"{Fore.CYAN}📦 Plán čtení: {describe_plan(build_read_plan(config))}{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}⏱️ Periody: {scheduler.describe()}{Style.RESET_ALL}")
     print(f"\n{Fore.CYAN}🚀 Spouštím plynulý monitoring...{Style.RESET_ALL}")
     print(f"{Fore.BLUE}💡 Stiskněte Ctrl+C pro ukončení{Style.RESET_ALL}")
     # Odebráno time.sleep(2) pro rychlejší start
@@ -1363,81 +2417,101 @@ def smooth_table_monitor(config: Dict, interval: int, csv_file: Optional[Path] =
     os.system('cls' if os.name == 'nt' else 'clear')
     
     iteration = 0
-    first_run = True
-    last_values = {}  # Delta tracking pro smooth mode
+    trends = TrendEngine.from_config(config)  # Delta tracking pro smooth mode
+    latest = {}  # Poslední výsledek každého registru (index v konfiguraci → result)
+    descriptors = config['descriptors']
+    row_cache = {}  # Naformátované buňky řádků (index → (klíč, buňky))
+    renderer = FrameRenderer()
+    energy = open_energy_integrator(energy_file)
+    sink = CsvSink(csv_file, flush_interval, fsync, append=False, segments=segments) if csv_file else None
+    log = LogSink(log_file, segments) if log_file else None
+    db = open_sqlite_sink(db_file, descriptors, fsync)
+    rollup = open_rollups(descriptors, csv_file, db) if rollups else None
+    metrics = open_metrics_server(metrics_port, descriptors)
     
     try:
         while True:
+            due_indices = scheduler.wait()
             iteration += 1
             
-            # ANSI pozicionování kurzoru - optimalizované pro snížení blikání
-            if not first_run:
-                # Vymaž pouze progress řádek a přeskoč na začátek
-                print("\r\033[K", end="")  # Vymaže aktuální řádek
-                print("\033[H", end="")    # Kurzor na pozici 0,0
-            
             # Načti všetky data najprv (bez vykreslovanja)
             results = []
             successful = 0
             iteration_results = {}
             
-            # Načítaj všetky registre do pamäte
-            for register_data in config['registers']:
-                result = read_register_value(client, register_data, config['connection']['unit'])
-                results.append((register_data, result))
+            # Načítaj všetky registre do pamäte (blokové dotazy podle plánu)
+            snapshot = snapshot_time(replay)
+            cycle_results = read_registers_indexed(client, scheduler.plan_for(due_indices),
+                                                   config['connection']['unit'], pacer=pacer)
+            update_trends(trends, descriptors, cycle_results)
+            latest.update(cycle_results)
+            for index in sorted(latest):
+                desc = descriptors[index]
+                result = latest[index]
+                results.append((desc, result))
                 
                 if result['ok']:
                     successful += 1
-                    reg_num = register_data.get('reg')
-                    iteration_results[reg_num] = result
+                    iteration_results[desc.reg] = result
             
             # COP výpočet
-            cop_value = calculate_cop(iteration_results)
+            cop = evaluate_cop(iteration_results)
+            cop_value = cop['value']
             
-            # Teraz vykresli kompletnu tabulku naraz
+            # Teraz zostav kompletný snímok tabulky - renderer pošle len zmeny
             # Header
-            draw_table_header("LG Therma V Smooth Monitor", iteration)
-            
-            # Všetky data riadky naraz s delta tracking
-            for register_data, result in results:
-                draw_table_row(register_data, result, last_values)
+            frame = format_table_header("LG Therma V Smooth Monitor", iteration, snapshot)
+            
+            # Všetky data riadky s delta tracking (nezmenené riadky z cache)
+            for index in sorted(latest):
+                desc = descriptors[index]
+                result = latest[index]
+                key = (result['ok'], result['raw'], result['error'], result.get('delta'))
+                cached = row_cache.get(index)
+                if cached is None or cached[0] != key:
+                    cached = (key, format_table_row(desc, result))
+                    row_cache[index] = cached
+                frame.append(cached[1])
             
             # Footer
-            draw_table_footer(cop_value, len(config['registers']), successful)
+            frame.extend(format_table_footer(cop_value, len(config['registers']), successful))
             
             # Status řádek
             status_color = Fore.GREEN if cop_value else Fore.YELLOW
-            cop_text = f"{cop_value:.2f}" if cop_value else "N/A"
-            print(f"{status_color}🔥 COP: {cop_text} | 📊 Úspěšnost: {successful}/{len(config['registers'])} | ⏰ Iteration: {iteration}{Style.RESET_ALL}")
-            
-            # CSV zápis
-            if csv_file:
-                if iteration == 1:
-                    write_csv_header(csv_file)
-                for register_data, result in results:
-                    write_csv_row(csv_file, result, cop_value)
+            cop_text = describe_cop(cop)
+            frame.append(f"{status_color}🔥 COP: {cop_text} | 📊 Úspěšnost: {successful}/{len(config['registers'])} | ⏰ Iteration: {iteration}{Style.RESET_ALL}")
+            frame.append(f"{Fore.BLUE}⏱️ Plánovač: {scheduler.stats_line()} | 🚦 {pacer.stats_line()}{Style.RESET_ALL}")
+            if energy:
+                energy.add_sample(iteration_results, snapshot)
+                frame.append(f"{Fore.YELLOW}⚡ Energie: {energy.summary_line()}{Style.RESET_ALL}")
+            
+            renderer.render(frame)
+            
+            # CSV zápis (jen právě přečtené registry)
+            cycle_rows = [cycle_results[index] for index in sorted(cycle_results)]
+            if sink:
+                sink.write_cycle(cycle_rows, cop_value, snapshot)
+            if db:
+                db.write_cycle(cycle_rows, snapshot)
+            if rollup:
+                rollup.add(cycle_rows, snapshot.timestamp())
+            if metrics:
+                metrics.publish_cycle(cycle_rows, cop_value, snapshot.timestamp(), trends)
             
             # Log zápis
-            if log_file:
-                write_results_to_log(results, log_file, iteration, cop_value)
-            
-            # Update last_values pro delta tracking
-            for register_data, result in results:
-                if result['ok']:
-                    reg_num = register_data.get('reg')
-                    last_values[reg_num] = result['scaled']
-            
-            first_run = False
-            
-            # Čekání s optimalizovaným progress indikátorem
-            for i in range(0, interval, 2):  # Progress co 2 sekundy
-                remaining = interval - i
-                if remaining > 0:
-                    progress_filled = min(interval - remaining, interval)
-                    progress_empty = max(0, interval - progress_filled)
-                    progress = "⏳ Aktualizace za " + "█" * progress_filled + "░" * progress_empty + f" {remaining}s"
-                    print(f'\r{Fore.BLUE}{progress}{Style.RESET_ALL}', end='', flush=True)
-                    time.sleep(min(2, remaining))  # Čekej max 2 sekundy
+            if log:
+                write_results_to_log(results, log, iteration, cop_value)
+            
+            # Čekání s optimalizovaným progress indikátorem (do termínu plánovače)
+            total = scheduler.time_until_next()
+            remaining = total
+            while remaining > 0:  # Progress co 2 sekundy
+                progress_filled = int(total - remaining)
+                progress_empty = max(0, int(total) - progress_filled)
+                progress = "⏳ Aktualizace za " + "█" * progress_filled + "░" * progress_empty + f" {remaining:.0f}s"
+                print(f'\r{Fore.BLUE}{progress}{Style.RESET_ALL}', end='', flush=True)
+                time.sleep(min(2, remaining))  # Čekej max 2 sekundy
+                remaining = scheduler.time_until_next()
             
             # Vymaž progress řádek - optimalizované
             print(f'\r{" " * 80}\r', end='', flush=True)
@@ -1448,12 +2522,285 @@ def smooth_table_monitor(config: Dict, interval: int, csv_file: Optional[Path] =
     except Exception as e:
         print(f"\n{Fore.RED}❌ Chyba: {e}{Style.RESET_ALL}")
     finally:
+        if sink:
+            sink.close()
+        if log:
+            log.close()
+        close_rollups(rollup)
+        if db:
+            db.close()
+        if metrics:
+            metrics.close()
+        if energy:
+            energy.close()
         client.close()
+        if frames:
+            frames.close()
         print(f"{Fore.BLUE}👋 Odpojeno od Modbus serveru{Style.RESET_ALL}")
 
 
+async def read_block_async(client: AsyncModbusTcpClient, block: Dict, unit: int) -> List[tuple]:
+    """
+    Asynchronní obdoba read_block() pro fleet režim.
+
+    Jednoregistrové a rozpadlé bloky se čtou po jednotlivých adresách
+    stejnou cestou jako bloky (decode_block), takže tvar výsledků je shodný.
+
+    Returns:
+        Seznam (index v konfiguraci, result)
+    """
+    if block['single'] or block.get('fallback'):
+        decoded = []
+        for desc in block['members']:
+            single = {
+                'table': desc.block_table,
+                'address': desc.address,
+                'count': 1,
+                'members': [desc],
+                'single': False,
+            }
+            decoded.extend(await read_block_async(client, single, unit))
+        return decoded
+
+    reader = getattr(client, BLOCK_READ_TABLES[block['table']])
+
+    try:
+        response = await reader(block['address'], count=block['count'], slave=unit)
+    except Exception as e:
+        error = f"Modbus exception: {e}" if isinstance(e, ModbusException) else f"Chyba: {e}"
+        failed = []
+        for index, result in decode_block(block, []):
+            result['error'] = error
+            failed.append((index, result))
+        return failed
+
+    if response.isError():
+        if len(block['members']) == 1 and block['count'] == 1:
+            failed = []
+            for index, result in decode_block(block, []):
+                result['error'] = f"Modbus error: {response}"
+                failed.append((index, result))
+            return failed
+        block['fallback'] = True
+        return await read_block_async(client, block, unit)
+
+    if block['table'] in BIT_TABLES:
+        return decode_block(block, getattr(response, 'bits', []))
+    return decode_block(block, getattr(response, 'registers', []))
+
+
+async def poll_device(device: Dict) -> List[Dict]:
+    """
+    Přečte všechny bloky z plánu jednoho zařízení.
+
+    Souběh dotazů na zařízení omezuje device['semaphore'] (volba 'concurrency'),
+    po každém dotazu následuje adaptivní pauza daného zařízení (device['pacer']).
+    Výsledky se zapracují do trend enginu zařízení (device['trends']).
+
+    Returns:
+        Výsledky ve stejném pořadí jako registry v konfiguraci
+    """
+    connection = device['connection']
+    client = device['client']
+    indexed = {}
+
+    if not client.connected:
+        await client.connect()
+        if not client.connected:
+            device['pacer'].record(0.0, False)
+            error = f"Nelze se připojit k {connection['host']}:{connection['port']}"
+            for block in device['plan']:
+                for desc in block['members']:
+                    indexed[desc.index] = desc.new_result()
+                    indexed[desc.index]['error'] = error
+            return [indexed[index] for index in sorted(indexed)]
+
+    pacer = device['pacer']
+
+    async def run_block(block: Dict):
+        async with device['semaphore']:
+            started = time.monotonic()
+            block_results = await read_block_async(client, block, connection['unit'])
+            pacer.record(time.monotonic() - started,
+                         not any(is_transport_error(result) for _, result in block_results))
+            for index, result in block_results:
+                indexed[index] = result
+            if pacer.delay > 0:
+                await asyncio.sleep(pacer.delay)
+
+    await asyncio.gather(*(run_block(block) for block in device['plan']))
+    update_trends(device['trends'], device['descriptors'], indexed)
+    return [indexed[index] for index in sorted(indexed)]
+
+
+def open_device(config: Dict, connection: Dict) -> Dict:
+    """
+    Připraví zařízení pro poll_device(): plán čtení, pacer, trendy a asyncio klienta.
+
+    Používá fleet režim (jedno zařízení na blok sekce 'fleet') i brána (lgscan.py serve).
+    """
+    name = connection.get('name', f"{connection['host']}:{connection['port']}")
+    device_config = {'connection': connection, 'registers': config['registers'],
+                     'descriptors': config['descriptors']}
+    return {
+        'name': name,
+        'connection': connection,
+        'plan': build_read_plan(device_config),
+        'semaphore': asyncio.Semaphore(connection.get('concurrency', 1)),
+        'pacer': AdaptivePacer.from_connection(connection),
+        'descriptors': config['descriptors'],
+        'trends': TrendEngine.from_config(config),
+        'client': AsyncModbusTcpClient(
+            host=connection['host'],
+            port=connection['port'],
+            timeout=connection['timeout']
+        ),
+    }
+
+
+def device_csv_file(csv_file: Path, name: str) -> Path:
+    """Vrátí cestu k souboru konkrétního zařízení (scan.csv → scan_<name>.csv, také pro --energy)."""
+    slug = "".join(c if c.isalnum() else "_" for c in name).strip("_") or "device"
+    return csv_file.with_name(f"{csv_file.stem}_{slug}{csv_file.suffix}")
+
+
+async def fleet_loop(config: Dict, interval: int, csv_file: Optional[Path], once: bool,
+                     flush_interval: Optional[float] = 0, fsync: bool = False,
+                     energy_file: Optional[Path] = None,
+                     segments: Optional[SegmentPolicy] = None,
+                     db_file: Optional[Path] = None, rollups: bool = False,
+                     metrics_port: Optional[int] = None) -> None:
+    """Hlavní asyncio smyčka fleet režimu - všechna zařízení se čtou souběžně."""
+    devices = []
+    metrics = open_metrics_server(metrics_port, config['descriptors'])
+
+    for connection in config['fleet']:
+        device = open_device(config, connection)
+        name = device['name']
+        device.update({
+            'sink': (CsvSink(device_csv_file(csv_file, name), flush_interval, fsync, segments=segments)
+                     if csv_file else None),
+            'energy': open_energy_integrator(device_csv_file(energy_file, name) if energy_file else None),
+            'db': open_sqlite_sink(device_csv_file(db_file, name) if db_file else None,
+                                   config['descriptors'], fsync),
+        })
+        if rollups:
+            device['rollup'] = open_rollups(config['descriptors'],
+                                            device_csv_file(csv_file, name) if csv_file else None, device['db'])
+        devices.append(device)
+        print(f"📡 {name}: {connection['host']}:{connection['port']} | 📦 {describe_plan(device['plan'])}")
+
+    iteration = 0
+    try:
+        while True:
+            iteration += 1
+            started = time.monotonic()
+            snapshot = datetime.now()
+            device_results = await asyncio.gather(*(poll_device(device) for device in devices))
+            cycle_time = time.monotonic() - started
+
+            print(f"\n--- Fleet iterace {iteration} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} "
+                  f"({cycle_time:.2f}s) ---")
+
+            for device, results in zip(devices, device_results):
+                iteration_results = {result['reg']: result for result in results if result['ok']}
+                cop = evaluate_cop(iteration_results)
+                cop_value = cop['value']
+                successful = sum(1 for result in results if result['ok'])
+                cop_str = describe_cop(cop)
+                print(f"🏠 {device['name']}: {successful}/{len(results)} OK | 🔥 COP: {cop_str} | "
+                      f"🚦 {device['pacer'].stats_line()}")
+
+                if device['energy']:
+                    device['energy'].add_sample(iteration_results, snapshot)
+                    print(f"   ⚡ {device['energy'].summary_line()}")
+
+                if device['sink']:
+                    device['sink'].write_cycle(results, cop_value, snapshot)
+                if device['db']:
+                    device['db'].write_cycle(results, snapshot)
+                if device.get('rollup'):
+                    device['rollup'].add(results, snapshot.timestamp())
+                if metrics:
+                    metrics.exporter.update(results, cop_value, snapshot.timestamp(), device['name'],
+                                            device['trends'])
+
+            if metrics:
+                metrics.exporter.publish()
+
+            if once:
+                break
+
+            # Čekání do další iterace - doba čtení se odečítá od intervalu
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        for device in devices:
+            device['client'].close()
+            if device['sink']:
+                device['sink'].close()
+            if device['energy']:
+                device['energy'].close()
+            close_rollups(device.get('rollup'))
+            if device['db']:
+                device['db'].close()
+        if metrics:
+            metrics.close()
+
+
+def fleet_monitor(config: Dict, interval: int, csv_file: Optional[Path] = None, once: bool = False,
+                  flush_interval: Optional[float] = 0, fsync: bool = False,
+                  energy_file: Optional[Path] = None, segments: Optional[SegmentPolicy] = None,
+                  db_file: Optional[Path] = None, rollups: bool = False,
+                  metrics_port: Optional[int] = None) -> None:
+    """
+    Fleet režim - souběžné čtení více tepelných čerpadel z jednoho procesu.
+
+    Zařízení se berou ze sekce 'fleet' (seznam bloků ve tvaru 'connection',
+    navíc volitelně 'name' a 'concurrency'). Všechna zařízení sdílejí sekci
+    'registers'; doba iterace je daná nejpomalejším zařízením. Čítače energie
+    (energy_file), databáze (db_file) i agregace (rollups) se stejně jako CSV vedou
+    zvlášť pro každé zařízení; metriky (metrics_port) sdílí jeden endpoint se štítkem device.
+    """
+    print(f"🚚 Spouštím Fleet Monitor ({len(config['fleet'])} zařízení)...")
+
+    try:
+        asyncio.run(fleet_loop(config, interval, csv_file, once, flush_interval, fsync, energy_file, segments,
+                               db_file, rollups, metrics_port))
+    except KeyboardInterrupt:
+        print("\n✅ Fleet Monitor ukončen uživatelem!")
+    print("👋 Odpojeno od Modbus serverů")
+
+# Podpříkazy (python lgscan.py <příkaz> ...) - modul se načte až při použití
+SUBCOMMANDS = {
+    'analyze': 'analyze',    # Offline přepočet COP/energie z CSV (vyžaduje NumPy)
+    'discover': 'discover',  # Rychlé objevování registrů (blokové čtení s půlením)
+    'query': 'csvindex',     # Výběr časového rozsahu z CSV přes index
+    'rollup': 'rollups',     # Přestavba agregací 1 min / 15 min / 1 h z historie
+    'serve': 'gateway',      # Cachující Modbus TCP brána (jediný poller zařízení)
+    'simulate': 'simulator', # Lokální simulátor tepelného čerpadla (vývoj, zátěžové testy)
+}
+
+
+def run_subcommand(name: str, argv: List[str]) -> int:
+    """Spustí podpříkaz z modulu SUBCOMMANDS[name] (funkce main(argv))."""
+    try:
+        module = importlib.import_module(SUBCOMMANDS[name])
+    except ImportError as e:
+        print(f"Podpříkaz '{name}' nelze spustit - chybí závislost: {e.name or e}", file=sys.stderr)
+        return 1
+    return module.main(argv)
+
+
+def handle_sigterm(signum, frame):
+    """SIGTERM (např. systemd stop) ukončí běh stejně čistě jako Ctrl+C."""
+    raise KeyboardInterrupt
+
+
 def main():
     """Hlavní funkce programu."""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(run_subcommand(sys.argv[1], sys.argv[2:]))
+    
     parser = argparse.ArgumentParser(
         description="LG Therma V Modbus Scanner",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -1461,6 +2808,16 @@ def main():
 Příklady použití:
   python lgscan.py --once --yaml registers.yaml --out scan.csv
   python lgscan.py --interval 10 --yaml registers.yaml --out scan.csv
+  python lgscan.py analyze scan.csv --by hour --out hourly.csv
+  python lgscan.py query scan.csv --from "2025-11-18 06:00" --to "2025-11-18 09:00"
+  python lgscan.py --interval 10 --out scan.csv --db history.sqlite --rollups
+  python lgscan.py rollup scan.csv --db history.sqlite
+  python lgscan.py --interval 10 --metrics-port 9108
+  python lgscan.py serve --yaml registers.yaml --port 5020
+  python lgscan.py simulate --port 5020 --latency 40 --jitter 15 --drop 0.01
+  python lgscan.py --interval 10 --record frames.bin
+  python lgscan.py --smooth --replay frames.bin --speed 100x
+  python lgscan.py discover --yaml registers.yaml --out discovered.yaml
         """
     )
     
@@ -1480,9 +2837,53 @@ Příklady použití:
                        help='Výstupní CSV soubor')
     parser.add_argument('--log', type=Path, default=None,
                        help='Výstupní log soubor (volitelné)')
+    parser.add_argument('--flush', type=parse_flush_policy, default='cycle', metavar='POLICY',
+                       help='Kdy zapisovat CSV na disk: cycle (default), exit, nebo počet sekund')
+    parser.add_argument('--fsync', action='store_true',
+                       help='Při každém flush vynutí zápis CSV až na médium (fsync)')
+    parser.add_argument('--fleet', action='store_true',
+                       help='Souběžně čte všechna zařízení ze sekce fleet (CSV zvlášť pro každé zařízení)')
+    parser.add_argument('--energy', type=Path, default=None, metavar='STATE',
+                       help='Počítá kWh (el./teplo) a denní/měsíční/sezónní COP, stav ukládá do STATE (např. energy.json)')
+    parser.add_argument('--db', type=Path, default=None, metavar='SQLITE',
+                       help='Ukládá historii (raw hodnoty) do SQLite databáze, např. history.sqlite')
+    parser.add_argument('--rollups', action='store_true',
+                       help='Průběžně agreguje registry po 1 min / 15 min / 1 h (vedle --out a v --db)')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                       help='OpenMetrics (Prometheus) endpoint http://...:PORT/metrics s posledním snímkem')
+    parser.add_argument('--roll', type=parse_roll_option, default=None, metavar='POLICY',
+                       help='Rotace --out a --log po segmentech: day (denně) nebo velikost (např. 50M)')
+    parser.add_argument('--retain', type=int, default=None, metavar='N',
+                       help='S --roll ponechá jen N posledních uzavřených segmentů')
+    parser.add_argument('--no-compress', action='store_true',
+                       help='S --roll uzavřené segmenty nekomprimuje (jinak gzip na pozadí)')
+    parser.add_argument('--record', type=Path, default=None, metavar='FRAMES',
+                       help='Zaznamená všechny Modbus dotazy a odpovědi do FRAMES (např. frames.bin)')
+    parser.add_argument('--replay', type=Path, default=None, metavar='FRAMES',
+                       help='Místo zařízení přehraje záznam FRAMES (dekódování, COP, výpis i CSV jako naživo)')
+    parser.add_argument('--speed', type=parse_speed, default=None, metavar='FACTOR',
+                       help='S --replay zrychlení přehrávání, např. 100x (default: 1x)')
     
     args = parser.parse_args()
     
+    if args.record and args.replay:
+        parser.error("--record a --replay nelze kombinovat")
+    if args.speed is not None and not args.replay:
+        parser.error("--speed vyžaduje --replay")
+    if args.fleet and (args.record or args.replay):
+        parser.error("--record a --replay nejsou ve fleet režimu podporovány")
+    
+    # Rotace výstupů po segmentech
+    segments = None
+    if args.roll:
+        try:
+            segments = SegmentPolicy(args.roll, args.retain, not args.no_compress)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"🗄️ Segmenty: {segments.describe()}")
+    elif args.retain is not None or args.no_compress:
+        parser.error("--retain a --no-compress vyžadují --roll")
+    
     # Kontrola existence konfiguračního souboru
     if not args.yaml.exists():
         print(f"Konfigurační soubor neexistuje: {args.yaml}", file=sys.stderr)
@@ -1492,39 +2893,73 @@ Příklady použití:
     config = load_config(args.yaml)
 
     # Validace konfigurace
-    required_keys = ['connection', 'registers']
+    required_keys = ['fleet' if args.fleet else 'connection', 'registers']
     for key in required_keys:
         if key not in config:
             print(f"Chybí klíč v konfiguraci: {key}", file=sys.stderr)
             sys.exit(1)
     
     required_conn_keys = ['host', 'port', 'unit', 'timeout', 'delay_ms']
-    for key in required_conn_keys:
-        if key not in config['connection']:
-            print(f"Chybí klíč v connection: {key}", file=sys.stderr)
-            sys.exit(1)
+    connections = config['fleet'] if args.fleet else [config['connection']]
+    for connection in connections:
+        for key in required_conn_keys:
+            if key not in connection:
+                print(f"Chybí klíč v connection: {key}", file=sys.stderr)
+                sys.exit(1)
     
     if not config['registers']:
         print("Žádné registry k načtení", file=sys.stderr)
         sys.exit(1)
     
+    if args.fleet and any(desc.table == 'auto' for desc in config['descriptors']):
+        print("Tabulka 'auto' není ve fleet režimu podporována", file=sys.stderr)
+        sys.exit(1)
+    
+    # Přehrávání záznamu - zrychlené periody, odpovědi ze souboru místo zařízení
+    interval = args.interval
+    replay = None
+    if args.replay:
+        speed = args.speed or 1.0
+        replay = open_replay(args.replay, speed)
+        interval = apply_replay_timing(config, args.interval, speed)
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
     # Spusť skenování
-    if args.smooth:
+    if args.fleet:
+        print("Režim: Fleet (více zařízení souběžně)")
+        fleet_monitor(config, args.interval, args.out, once=args.once,
+                      flush_interval=args.flush, fsync=args.fsync, energy_file=args.energy,
+                      segments=segments, db_file=args.db, rollups=args.rollups,
+                      metrics_port=args.metrics_port)
+    elif args.smooth:
         print("Režim: Plynulá tabulka (bez blikání)")
         if args.once:
             print("⚠️ --once je ignorován v smooth režimu")
-        smooth_table_monitor(config, args.interval, args.out, args.log)
+        smooth_table_monitor(config, interval, args.out, args.log, args.flush, args.fsync, args.energy,
+                             segments, args.db, args.rollups, args.metrics_port,
+                             record_file=args.record, replay=replay)
     elif args.simple:
         print("Režim: Jednoduché zobrazení")
         if args.once:
             print("⚠️ --once je ignorován v simple režimu")
-        simple_monitor(config, args.interval, args.out, args.log)
+        simple_monitor(config, interval, args.out, args.log, args.flush, args.fsync, args.energy, segments,
+                       args.db, args.rollups, args.metrics_port, record_file=args.record, replay=replay)
     elif args.once:
         print("Režim: Jeden průchod")
-        scan_registers(config, args.out, once=True, log_file=args.log)
+        scan_registers(config, args.out, once=True, log_file=args.log,
+                       flush_interval=args.flush, fsync=args.fsync, energy_file=args.energy,
+                       segments=segments, db_file=args.db, rollups=args.rollups,
+                       metrics_port=args.metrics_port, record_file=args.record, replay=replay)
     else:
         print(f"Režim: Kontinuální s intervalem {args.interval}s")
-        scan_registers(config, args.out, once=False, interval=args.interval, log_file=args.log)
+        scan_registers(config, args.out, once=False, interval=interval, log_file=args.log,
+                       flush_interval=args.flush, fsync=args.fsync, energy_file=args.energy,
+                       segments=segments, db_file=args.db, rollups=args.rollups,
+                       metrics_port=args.metrics_port, record_file=args.record, replay=replay)
+    
+    if replay:
+        print(f"⏹️ Přehrávání: {replay.stats_line()}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+OpenMetrics (Prometheus) endpoint s posledním snímkem (--metrics-port 9108)
+
+HTTP server ze standardní knihovny běží ve vlákně na pozadí a odpovídá
+na GET /metrics. Dotaz nikdy nečte z Modbusu - tělo odpovědi se vyrenderuje
+jednou za iteraci z posledního dokončeného snímku a scrape je jen kopie
+bufferu, takže další scrapery nepřidají zařízení žádnou zátěž.
+
+Metriky:
+    lgscan_register_value{reg,name,unit}         - poslední škálovaná hodnota registru
+    lgscan_register_ema{reg,name,unit}           - EMA hodnoty z trend enginu (trend: ema_alpha)
+    lgscan_register_window_min/max/mean{...}     - klouzavé min/max/průměr za okno (trend: window)
+    lgscan_register_rate_per_minute{...}         - rychlost změny za minutu přes okno
+    lgscan_cop                                   - COP poslední iterace (chybí, nelze-li spočítat)
+    lgscan_register_reads_total{reg,name,result} - počet úspěšných (ok) a chybných (error) čtení
+    lgscan_last_cycle_timestamp_seconds          - čas posledního snímku (pro detekci výpadku)
+
+Ve fleet režimu mají všechny série navíc štítek device.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Statistiky trend enginu (trend.RegisterTrend) → metrika
+TREND_METRICS = (
+    ('ema', 'lgscan_register_ema', 'EMA škálované hodnoty registru (trend: ema_alpha)'),
+    ('minimum', 'lgscan_register_window_min', 'Minimum za okno trendu (trend: window)'),
+    ('maximum', 'lgscan_register_window_max', 'Maximum za okno trendu (trend: window)'),
+    ('mean', 'lgscan_register_window_mean', 'Průměr za okno trendu (trend: window)'),
+    ('rate_per_minute', 'lgscan_register_rate_per_minute', 'Rychlost změny za minutu přes okno trendu'),
+)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+METRICS_PATHS = ('/metrics', '/')
+
+
+def _escape(value) -> str:
+    """Escapování hodnoty štítku (zpětné lomítko, uvozovky, nový řádek)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value) -> str:
+    """Hodnota vzorku bez šumu násobení měřítkem (21.200000000000003 → 21.2)."""
+    return repr(round(float(value), 6))
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class DeviceMetrics:
+    """Stav metrik jednoho zařízení: poslední hodnoty, COP a čítače čtení."""
+
+    __slots__ = ('values', 'reads_ok', 'reads_error', 'cop', 'timestamp', 'trends')
+
+    def __init__(self):
+        # Klíč (reg, name) - registers.yaml může mít jeden registr pod více názvy
+        self.values = {}        # (reg, name) → poslední úspěšná škálovaná hodnota
+        self.reads_ok = {}      # (reg, name) → počet úspěšných čtení
+        self.reads_error = {}   # (reg, name) → počet chybných čtení
+        self.cop = None
+        self.timestamp = None
+        self.trends = None      # TrendEngine zařízení (statistiky podle indexu registru)
+
+    def update(self, results: List[Dict], cop_value: Optional[float], timestamp: float,
+               trends=None) -> None:
+        for result in results:
+            key = (result['reg'], result['name'])
+            if result['ok']:
+                self.values[key] = result['scaled']
+                self.reads_ok[key] = self.reads_ok.get(key, 0) + 1
+            else:
+                self.reads_error[key] = self.reads_error.get(key, 0) + 1
+        self.cop = cop_value
+        self.timestamp = timestamp
+        if trends is not None:
+            self.trends = trends
+
+
+class MetricsExporter:
+    """
+    Předrenderované tělo odpovědi z posledních snímků zařízení.
+
+    update() zapracuje iteraci, publish() vyrenderuje nové tělo; HTTP vlákna
+    čtou jen hotový bytes objekt (výměna reference je atomická).
+    """
+
+    def __init__(self, descriptors):
+        self.descriptors = list(descriptors)
+        self.devices = {}   # Název zařízení (None = jediné zařízení) → DeviceMetrics
+        self.body = b'# EOF\n'
+
+    def update(self, results: List[Dict], cop_value: Optional[float], timestamp: float,
+               device: Optional[str] = None, trends=None) -> None:
+        """
+        Zapracuje výsledky jedné iterace (timestamp = epoch snímku).
+
+        trends: TrendEngine zařízení - jeho statistiky se vyrenderují při publish()
+        """
+        state = self.devices.get(device)
+        if state is None:
+            state = self.devices[device] = DeviceMetrics()
+        state.update(results, cop_value, timestamp, trends)
+
+    def publish(self) -> None:
+        """Vyrenderuje tělo odpovědi z aktuálního stavu (jednou za iteraci)."""
+        self.body = self.render().encode('utf-8')
+
+    def render(self) -> str:
+        values = ['# TYPE lgscan_register_value gauge',
+                  '# HELP lgscan_register_value Poslední škálovaná hodnota registru z registers.yaml']
+        trend_lines = {attribute: [f'# TYPE {metric} gauge', f'# HELP {metric} {help_text}']
+                       for attribute, metric, help_text in TREND_METRICS}
+        cop = ['# TYPE lgscan_cop gauge',
+               '# HELP lgscan_cop COP poslední iterace']
+        reads = ['# TYPE lgscan_register_reads counter',
+                 '# HELP lgscan_register_reads Počet čtení registru podle výsledku']
+        cycle = ['# TYPE lgscan_last_cycle_timestamp_seconds gauge',
+                 '# UNIT lgscan_last_cycle_timestamp_seconds seconds',
+                 '# HELP lgscan_last_cycle_timestamp_seconds Čas posledního dokončeného snímku']
+
+        for device, state in self.devices.items():
+            extra = {'device': device} if device is not None else {}
+            for desc in self.descriptors:
+                value = state.values.get((desc.reg, desc.name))
+                if value is not None:
+                    labels = _labels(**extra, reg=desc.reg, name=desc.name, unit=desc.unit)
+                    values.append(f"lgscan_register_value{labels} {_number(value)}")
+                trend = state.trends.get(desc.index) if state.trends is not None else None
+                if trend is not None and trend.count:
+                    labels = _labels(**extra, reg=desc.reg, name=desc.name, unit=desc.unit)
+                    for attribute, metric, _ in TREND_METRICS:
+                        stat = getattr(trend, attribute)
+                        if stat is not None:
+                            trend_lines[attribute].append(f"{metric}{labels} {_number(stat)}")
+            if state.cop is not None:
+                cop.append(f"lgscan_cop{_labels(**extra) if extra else ''} {_number(state.cop)}")
+            for reg, name in sorted(set(state.reads_ok) | set(state.reads_error)):
+                for result, counts in (('ok', state.reads_ok), ('error', state.reads_error)):
+                    labels = _labels(**extra, reg=reg, name=name, result=result)
+                    reads.append(f"lgscan_register_reads_total{labels} {counts.get((reg, name), 0)}")
+            if state.timestamp is not None:
+                cycle.append(f"lgscan_last_cycle_timestamp_seconds{_labels(**extra) if extra else ''} "
+                             f"{state.timestamp:.3f}")
+
+        trends = [line for lines in trend_lines.values() for line in lines]
+        return '\n'.join(values + trends + cop + reads + cycle + ['# EOF', ''])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server_version = 'lgscan-metrics'
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def _respond(self, with_body: bool):
+        if self.path.split('?', 1)[0] not in METRICS_PATHS:
+            self.send_error(404)
+            return
+        body = self.server.exporter.body
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrape každých pár sekund by zahltil konzoli
+
+
+class MetricsServer:
+    """HTTP server metrik ve vlákně na pozadí."""
+
+    def __init__(self, port: int, descriptors, host: str = ''):
+        self.exporter = MetricsExporter(descriptors)
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.exporter = self.exporter
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True)
+        self.thread.start()
+
+    def publish_cycle(self, results: List[Dict], cop_value: Optional[float], timestamp: float,
+                      trends=None) -> None:
+        """Zapracuje iteraci jediného zařízení a rovnou vyrenderuje odpověď."""
+        self.exporter.update(results, cop_value, timestamp, trends=trends)
+        self.exporter.publish()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 """
 Jednoduché čtení Modbus TCP registrů - čistý TCP socket bez závislostí
-Použití: python modbus_tcp.py <IP> <registr> [interval] [timeout]
+Použití: python modbus_tcp.py <IP[:port]> <registr[,registr...]> [interval] [timeout]
 
 Příklady:
     python modbus_tcp.py 192.168.100.199 30004        # Jednorázové čtení
     python modbus_tcp.py 192.168.100.199 30003 5      # Každých 5s
     python modbus_tcp.py 192.168.100.199 40018 2 1000 # Každé 2s s timeoutem 1s
+    python modbus_tcp.py 192.168.100.199 30003,30004,30009 5  # Více registrů najednou
+    python modbus_tcp.py 127.0.0.1:5020 30004          # Lokální simulátor (lgscan.py simulate)
+
+Spojení zůstává otevřené mezi iteracemi, více registrů se čte pipeliningem.
 """
 
 import sys
@@ -33,62 +37,131 @@ REGISTRY = {
     40018: {"func": 4, "addr": 17,  "scale": 0.00479, "unit": "kW",   "name": "Electrical Power"},
 }
 
-def read_modbus_register(ip, reg_info, timeout_sec=1.0):
+class ModbusConnection:
+    """
+    Dlouhodobé Modbus TCP spojení s pipeliningem dotazů.
+
+    Socket zůstává otevřený mezi čteními, znovu se připojuje jen po chybě.
+    Více dotazů se odešle najednou s rostoucím transaction id a odpovědi
+    se párují podle transaction id (ne podle pořadí příchodu).
+    """
+
+    def __init__(self, ip, port=502, timeout_sec=1.0, unit_id=1):
+        self.ip = ip
+        self.port = port
+        self.timeout_sec = timeout_sec
+        self.unit_id = unit_id
+        self.sock = None
+        self.transaction_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self):
+        """Otevře TCP spojení, pokud ještě není otevřené."""
+        if self.sock is None:
+            sock = socket.create_connection((self.ip, self.port), timeout=self.timeout_sec)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+
+    def close(self):
+        """Uzavře spojení (další čtení se znovu připojí)."""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _next_transaction_id(self):
+        self.transaction_id = (self.transaction_id + 1) & 0xFFFF
+        return self.transaction_id
+
+    def _recv_exact(self, size):
+        """Přečte přesně size bajtů (TCP může odpověď rozdělit)."""
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Spojení uzavřeno protistranou")
+            data += chunk
+        return data
+
+    def read_registers(self, reg_infos):
+        """
+        Přečte více registrů jedním pipelinovaným průchodem
+
+        Args:
+            reg_infos: Seznam informací o registrech (func, addr, scale, unit, name)
+
+        Returns:
+            list: [(raw_value, scaled_value, success), ...] ve stejném pořadí
+        """
+        results = [(None, None, False)] * len(reg_infos)
+
+        try:
+            self.connect()
+
+            # Sestavení všech dotazů (big endian)
+            # Transaction ID (2B) + Protocol ID (2B) + Length (2B) + Unit ID (1B) + Function (1B) + Address (2B) + Count (2B)
+            pending = {}
+            queries = []
+            for index, reg_info in enumerate(reg_infos):
+                transaction_id = self._next_transaction_id()
+                pending[transaction_id] = index
+                queries.append(struct.pack(">HHHBBHH",
+                                           transaction_id, 0, 6,
+                                           self.unit_id, reg_info["func"], reg_info["addr"], 1))
+
+            # Odeslání všech dotazů najednou
+            self.sock.sendall(b"".join(queries))
+
+            # Čtení odpovědí - párování podle transaction id
+            while pending:
+                transaction_id, _, length = struct.unpack(">HHH", self._recv_exact(6))
+                body = self._recv_exact(length)
+                index = pending.pop(transaction_id, None)
+                if index is None:
+                    continue  # Opožděná odpověď na starší dotaz
+
+                # Body: unit (1) + function (1) + byte count (1) + data
+                function = body[1]
+                if function & 0x80 or len(body) < 5:
+                    continue  # Modbus exception response
+
+                raw_value = struct.unpack(">H", body[3:5])[0]  # big endian uint16
+
+                # Zpracování signed hodnot
+                if raw_value > 32767:
+                    raw_value = raw_value - 65536
+
+                results[index] = (raw_value, raw_value * reg_infos[index]["scale"], True)
+
+        except (OSError, ConnectionError, struct.error):
+            # Chyba spojení - při dalším čtení se připojíme znovu
+            self.close()
+
+        return results
+
+
+def read_modbus_register(ip, reg_info, timeout_sec=1.0, port=502):
     """
-    Přečte registr přes čistý TCP socket
+    Přečte registr přes čistý TCP socket (jednorázové spojení)
     
     Args:
         ip: IP adresa Modbus serveru
         reg_info: Informace o registru (func, addr, scale, unit, name)
         timeout_sec: Timeout v sekundách
+        port: TCP port Modbus serveru
     
     Returns:
         tuple: (raw_value, scaled_value, success)
     """
-    try:
-        # TCP připojení
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout_sec)
-        sock.connect((ip, 502))
-        
-        # Modbus TCP frame
-        # Transaction ID (2B) + Protocol ID (2B) + Length (2B) + Unit ID (1B) + Function (1B) + Address (2B) + Count (2B)
-        transaction_id = 1
-        protocol_id = 0
-        length = 6
-        unit_id = 1
-        function = reg_info["func"]
-        address = reg_info["addr"]
-        count = 1
-        
-        # Sestavení dotazu (big endian)
-        query = struct.pack(">HHHBBHH", 
-                           transaction_id, protocol_id, length, 
-                           unit_id, function, address, count)
-        
-        # Odeslání
-        sock.send(query)
-        
-        # Čtení odpovědi
-        response = sock.recv(256)
-        sock.close()
-        
-        # Dekódování odpovědi (Modbus TCP response format)
-        if len(response) >= 9:
-            # Skip header (6 bytes) + unit (1) + function (1) + byte count (1) = 9 bytes
-            raw_value = struct.unpack(">H", response[9:11])[0]  # big endian uint16
-            
-            # Zpracování signed hodnot
-            if raw_value > 32767:
-                raw_value = raw_value - 65536
-                
-            scaled_value = raw_value * reg_info["scale"]
-            return raw_value, scaled_value, True
-        else:
-            return None, None, False
-            
-    except Exception as e:
-        return None, None, False
+    with ModbusConnection(ip, port=port, timeout_sec=timeout_sec) as connection:
+        return connection.read_registers([reg_info])[0]
 
 def main():
     if len(sys.argv) < 3:
@@ -101,8 +174,9 @@ def main():
     
     # Parsování argumentů
     try:
-        ip = sys.argv[1]
-        register = int(sys.argv[2])
+        ip, _, port = sys.argv[1].partition(":")
+        port = int(port) if port else 502
+        registers = [int(reg) for reg in sys.argv[2].split(",")]
         interval = int(sys.argv[3]) if len(sys.argv) > 3 else 1
         timeout_ms = int(sys.argv[4]) if len(sys.argv) > 4 else 1000
         timeout_sec = timeout_ms / 1000.0
@@ -110,31 +184,39 @@ def main():
         print("Chyba: Neplatné parametry")
         sys.exit(1)
     
-    # Kontrola registru
-    if register not in REGISTRY:
-        print(f"❌ Neznámý registr {register}")
-        print("Dostupné registry:")
-        for reg in sorted(REGISTRY.keys()):
-            info = REGISTRY[reg]
-            print(f"  {reg:5d} - {info['name']}")
-        sys.exit(1)
+    # Kontrola registrů
+    for register in registers:
+        if register not in REGISTRY:
+            print(f"❌ Neznámý registr {register}")
+            print("Dostupné registry:")
+            for reg in sorted(REGISTRY.keys()):
+                info = REGISTRY[reg]
+                print(f"  {reg:5d} - {info['name']}")
+            sys.exit(1)
     
-    reg_info = REGISTRY[register]
+    reg_infos = [REGISTRY[register] for register in registers]
     
-    print(f"🔄 Čtu registr {register} ({reg_info['name']}) z {ip}")
+    if len(registers) == 1:
+        print(f"🔄 Čtu registr {registers[0]} ({reg_infos[0]['name']}) z {ip}")
+    else:
+        print(f"🔄 Čtu {len(registers)} registrů z {ip}: {', '.join(str(reg) for reg in registers)}")
     print(f"⏱️  Interval: {interval}s, Timeout: {timeout_ms}ms")
     print(f"⏹️  Zastavení: Ctrl+C\n")
     
+    connection = ModbusConnection(ip, port=port, timeout_sec=timeout_sec)
+    
     # Hlavní smyčka
     try:
         while True:
             timestamp = datetime.now().strftime("%H:%M:%S")
-            raw, value, success = read_modbus_register(ip, reg_info, timeout_sec)
+            results = connection.read_registers(reg_infos)
             
-            if success:
-                print(f"{timestamp}  raw={raw:4d}  value={value:.3f}{reg_info['unit']}")
-            else:
-                print(f"{timestamp}  ❌ CHYBA: Čtení selhalo")
+            for register, reg_info, (raw, value, success) in zip(registers, reg_infos, results):
+                prefix = timestamp if len(registers) == 1 else f"{timestamp}  {register}"
+                if success:
+                    print(f"{prefix}  raw={raw:4d}  value={value:.3f}{reg_info['unit']}")
+                else:
+                    print(f"{prefix}  ❌ CHYBA: Čtení selhalo")
             
             if interval <= 0:  # Jednorázové čtení
                 break
@@ -145,6 +227,8 @@ def main():
         print("\n✅ Ukončeno uživatelem")
     except Exception as e:
         print(f"\n❌ Neočekávaná chyba: {e}")
+    finally:
+        connection.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
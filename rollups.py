@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Průběžné agregace registrů (rollup úrovně 1 min / 15 min / 1 h)
+
+Dashboardy a reporty potřebují jen souhrny, ne raw vzorky po 10 s.
+RollupEngine udržuje pro každý registr otevřený kbelík každé úrovně:
+počet, min, max, průměr, poslední hodnotu a u binárních statusů podíl
+času v zapnutém stavu. Vzorek se přičte jen do nejkratší úrovně (O(1)),
+uzavřený kbelík se sloučí do další úrovně - delší úrovně vznikají
+z kratších, ne z raw dat.
+
+Agregace se počítají z raw celých čísel a škálují až při výstupu.
+Uzavřené kbelíky se ukládají vedle raw dat: do CSV souborů vedle --out
+(scan.rollup-1m.csv, ...) a do tabulky rollups v --db. Při ukončení se
+zapíší i rozpracované kbelíky; po restartu se stejný kbelík doplní
+(SQLite jej sloučí, v CSV se objeví dvakrát a iter_rollups je sloučí).
+
+Přestavba z existující historie:
+    python lgscan.py rollup scan.csv
+    python lgscan.py rollup --db history.sqlite
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Úrovně agregace [s] - každá musí být násobkem předchozí
+TIERS = (60, 900, 3600)
+TIER_LABELS = {60: '1m', 900: '15m', 3600: '1h'}
+
+ROLLUP_HEADER = ['bucket', 'reg', 'name', 'count', 'min', 'max', 'mean', 'last', 'on_fraction']
+
+
+class Bucket:
+    """Agregace jednoho registru za jeden časový kbelík (raw hodnoty)."""
+
+    __slots__ = ('start', 'count', 'raw_sum', 'raw_min', 'raw_max', 'raw_last', 'last_ts', 'on_count')
+
+    def __init__(self, start: float, binary: bool):
+        self.start = start
+        self.count = 0
+        self.raw_sum = 0
+        self.raw_min = None
+        self.raw_max = None
+        self.raw_last = None
+        self.last_ts = None
+        self.on_count = 0 if binary else None
+
+    def add(self, raw: int, timestamp: float) -> None:
+        """Přičte jeden vzorek."""
+        self.count += 1
+        self.raw_sum += raw
+        if self.raw_min is None or raw < self.raw_min:
+            self.raw_min = raw
+        if self.raw_max is None or raw > self.raw_max:
+            self.raw_max = raw
+        self.raw_last = raw
+        self.last_ts = timestamp
+        if self.on_count is not None and raw:
+            self.on_count += 1
+
+    def merge(self, other: 'Bucket') -> None:
+        """Sloučí kratší (nebo rozpracovaný) kbelík do tohoto."""
+        if not other.count:
+            return
+        self.count += other.count
+        self.raw_sum += other.raw_sum
+        self.raw_min = other.raw_min if self.raw_min is None else min(self.raw_min, other.raw_min)
+        self.raw_max = other.raw_max if self.raw_max is None else max(self.raw_max, other.raw_max)
+        if self.last_ts is None or other.last_ts >= self.last_ts:
+            self.raw_last = other.raw_last
+            self.last_ts = other.last_ts
+        if self.on_count is not None and other.on_count is not None:
+            self.on_count += other.on_count
+
+
+class RollupEngine:
+    """
+    Rollup úrovně pro všechny registry konfigurace.
+
+    Uzavřené kbelíky se posílají výstupům (write_rollups(tier, [(reg, Bucket)]))
+    jednou za iteraci, tedy nejvýše jednou za minutu reálně něco zapíší.
+    """
+
+    def __init__(self, descriptors, outputs=(), tiers=TIERS):
+        for shorter, longer in zip(tiers, tiers[1:]):
+            if longer % shorter:
+                raise ValueError(f"Úroveň {longer} s není násobkem {shorter} s")
+        self.tiers = tuple(tiers)
+        self.outputs = list(outputs)
+        self.binary = {}
+        for desc in descriptors:
+            self.binary.setdefault(desc.reg, desc.kind == 'binary')
+        self.current = [{} for _ in self.tiers]   # Úroveň → {reg: otevřený Bucket}
+        self.closed = [[] for _ in self.tiers]    # Úroveň → [(reg, Bucket)] k zápisu
+
+    def add(self, results: List[Dict], timestamp: float) -> None:
+        """
+        Zapracuje úspěšná čtení jedné iterace (timestamp = epoch snímku).
+
+        Registr pod více názvy (40001, 40002 v registers.yaml) je jedno čtení -
+        do kbelíku se započte jednou, jako jeden řádek v SqliteSink.
+        """
+        tier = self.tiers[0]
+        start = timestamp - timestamp % tier
+        current = self.current[0]
+        seen = set()
+        for result in results:
+            if not result['ok'] or result['reg'] in seen:
+                continue
+            reg = result['reg']
+            seen.add(reg)
+            bucket = current.get(reg)
+            if bucket is None or bucket.start != start:
+                if bucket is not None:
+                    self._close(0, reg, bucket)
+                binary = self.binary.get(reg)
+                if binary is None:
+                    continue  # Registr mimo konfiguraci
+                bucket = current[reg] = Bucket(start, binary)
+            bucket.add(result['raw'], timestamp)
+        self.flush()
+
+    def _close(self, level: int, reg: int, bucket: Bucket) -> None:
+        """Uzavře kbelík a sloučí jej do další úrovně."""
+        self.closed[level].append((reg, bucket))
+        if level + 1 >= len(self.tiers):
+            return
+        tier = self.tiers[level + 1]
+        start = bucket.start - bucket.start % tier
+        longer = self.current[level + 1].get(reg)
+        if longer is None or longer.start != start:
+            if longer is not None:
+                self._close(level + 1, reg, longer)
+            longer = self.current[level + 1][reg] = Bucket(start, bucket.on_count is not None)
+        longer.merge(bucket)
+
+    def flush(self) -> None:
+        """Předá uzavřené kbelíky výstupům."""
+        for level, tier in enumerate(self.tiers):
+            if self.closed[level]:
+                for output in self.outputs:
+                    output.write_rollups(tier, self.closed[level])
+                self.closed[level] = []
+
+    def close(self) -> None:
+        """Zapíše i rozpracované kbelíky všech úrovní (při ukončení)."""
+        for level in range(len(self.tiers)):
+            current = self.current[level]
+            self.current[level] = {}
+            for reg, bucket in current.items():
+                self._close(level, reg, bucket)
+        self.flush()
+
+
+def rollup_path(csv_file: Path, tier: int) -> Path:
+    """Soubor úrovně vedle CSV (scan.csv → scan.rollup-1m.csv)."""
+    csv_file = Path(csv_file)
+    label = TIER_LABELS.get(tier, f"{tier}s")
+    return csv_file.with_name(f"{csv_file.stem}.rollup-{label}{csv_file.suffix}")
+
+
+class RollupCsvWriter:
+    """Výstup úrovní do CSV souborů vedle --out (škálované hodnoty)."""
+
+    def __init__(self, csv_file: Path, descriptors, tiers=TIERS, append: bool = True):
+        self.descriptors = {}
+        for desc in descriptors:
+            self.descriptors.setdefault(desc.reg, desc)
+        self.files = {}
+        self.writers = {}
+        for tier in tiers:
+            path = rollup_path(csv_file, tier)
+            write_header = not append or not path.exists() or path.stat().st_size == 0
+            self.files[tier] = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+            self.writers[tier] = csv.writer(self.files[tier])
+            if write_header:
+                self.writers[tier].writerow(ROLLUP_HEADER)
+
+    def write_rollups(self, tier: int, buckets: List[tuple]) -> None:
+        writer = self.writers[tier]
+        for reg, bucket in buckets:
+            desc = self.descriptors[reg]
+            scale = desc.scale
+            writer.writerow([
+                datetime.fromtimestamp(bucket.start).isoformat(),
+                reg,
+                desc.name,
+                bucket.count,
+                f"{bucket.raw_min * scale:g}",
+                f"{bucket.raw_max * scale:g}",
+                f"{bucket.raw_sum * scale / bucket.count:g}",
+                f"{bucket.raw_last * scale:g}",
+                f"{bucket.on_count / bucket.count:.3f}" if bucket.on_count is not None else "",
+            ])
+        self.files[tier].flush()
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+
+
+def iter_rollups(path: Path) -> Iterator[Dict]:
+    """
+    Řádky CSV úrovně jako slovníky; kbelík zapsaný dvakrát (restart) se sloučí.
+
+    Hodnoty 'min'/'max'/'last'/'mean' jsou škálované, 'on_fraction' je None u nebinárních.
+    """
+    pending = {}
+    current_bucket = None
+
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            # Kbelíky jsou v souboru neklesající - s novějším je předchozí hotový
+            if current_bucket is None or row['bucket'] > current_bucket:
+                yield from pending.values()
+                pending = {}
+                current_bucket = row['bucket']
+            count = int(row['count'])
+            on_fraction = float(row['on_fraction']) if row['on_fraction'] else None
+            values = {
+                'bucket': row['bucket'], 'reg': int(row['reg']), 'name': row['name'], 'count': count,
+                'min': float(row['min']), 'max': float(row['max']), 'mean': float(row['mean']),
+                'last': float(row['last']), 'on_fraction': on_fraction,
+            }
+            key = (row['bucket'], values['reg'])
+            previous = pending.get(key)
+            if previous is None:
+                pending[key] = values
+                continue
+            total = previous['count'] + count
+            previous['mean'] = (previous['mean'] * previous['count'] + values['mean'] * count) / total
+            if on_fraction is not None:
+                previous['on_fraction'] = (previous['on_fraction'] * previous['count'] + on_fraction * count) / total
+            previous['min'] = min(previous['min'], values['min'])
+            previous['max'] = max(previous['max'], values['max'])
+            previous['last'] = values['last']
+            previous['count'] = total
+    yield from pending.values()
+
+
+def open_rollups(descriptors, csv_file: Optional[Path] = None, db=None) -> RollupEngine:
+    """Rollup engine zapisující vedle CSV a/nebo do SQLite (SqliteSink)."""
+    outputs = []
+    if csv_file:
+        outputs.append(RollupCsvWriter(csv_file, descriptors))
+    if db:
+        outputs.append(db)
+    return RollupEngine(descriptors, outputs)
+
+
+def close_rollups(engine: Optional[RollupEngine]) -> None:
+    """Zapíše rozpracované kbelíky a zavře CSV výstupy (SQLite zavírá vlastník)."""
+    if engine is None:
+        return
+    engine.close()
+    for output in engine.outputs:
+        if isinstance(output, RollupCsvWriter):
+            output.close()
+
+
+def rebuild_from_csv(csv_file: Path, descriptors) -> int:
+    """Přestaví CSV úrovně z historie CSV (přes všechny segmenty). Vrací počet iterací."""
+    from csvstream import iter_snapshots
+
+    writer = RollupCsvWriter(csv_file, descriptors, append=False)
+    engine = RollupEngine(descriptors, [writer])
+    cycles = 0
+    for snapshot in iter_snapshots(csv_file, columns=('raw',), ok_only=True):
+        engine.add([{'reg': reg, 'raw': row['raw'], 'ok': True} for reg, row in snapshot.rows.items()],
+                   snapshot.epoch)
+        cycles += 1
+    engine.close()
+    writer.close()
+    return cycles
+
+
+def rebuild_from_db(db_file: Path, descriptors) -> int:
+    """Přestaví tabulku rollups z tabulky samples. Vrací počet iterací."""
+    from sqlite_sink import SqliteSink
+
+    sink = SqliteSink(db_file, descriptors)
+    try:
+        with sink.connection:
+            sink.connection.execute("DELETE FROM rollups")
+        engine = RollupEngine(descriptors, [sink])
+        reader = sqlite3.connect(db_file)
+        cycles = 0
+        results, current_ts = [], None
+        for ts, reg, raw in reader.execute("SELECT ts, reg, raw FROM samples ORDER BY ts"):
+            if ts != current_ts:
+                if results:
+                    engine.add(results, current_ts)
+                    cycles += 1
+                results, current_ts = [], ts
+            results.append({'reg': reg, 'raw': raw, 'ok': True})
+        if results:
+            engine.add(results, current_ts)
+            cycles += 1
+        reader.close()
+        engine.close()
+        return cycles
+    finally:
+        sink.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Vstupní bod podpříkazu rollup (přestavba úrovní z existující historie)."""
+    from lgscan import load_config
+
+    parser = argparse.ArgumentParser(
+        prog="lgscan.py rollup",
+        description="Přestaví rollup úrovně (1 min / 15 min / 1 h) z existující historie"
+    )
+    parser.add_argument('csv', type=Path, nargs='?', default=None, help='CSV z lgscan (--out)')
+    parser.add_argument('--db', type=Path, default=None, help='SQLite databáze z lgscan (--db)')
+    parser.add_argument('--yaml', type=Path, default='registers.yaml',
+                        help='Konfigurace registrů (měřítka, binární statusy)')
+    args = parser.parse_args(argv)
+
+    if not args.csv and not args.db:
+        parser.error("Zadejte CSV nebo --db")
+    if not args.yaml.exists():
+        print(f"Konfigurační soubor neexistuje: {args.yaml}", file=sys.stderr)
+        return 1
+    descriptors = load_config(args.yaml)['descriptors']
+
+    if args.csv:
+        if not args.csv.exists():
+            print(f"CSV soubor neexistuje: {args.csv}", file=sys.stderr)
+            return 1
+        cycles = rebuild_from_csv(args.csv, descriptors)
+        print(f"📈 {cycles} iterací → {', '.join(str(rollup_path(args.csv, tier)) for tier in TIERS)}")
+    if args.db:
+        if not args.db.exists():
+            print(f"Databáze neexistuje: {args.db}", file=sys.stderr)
+            return 1
+        cycles = rebuild_from_db(args.db, descriptors)
+        print(f"📈 {cycles} iterací → {args.db} (tabulka rollups)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Rotace výstupních souborů po segmentech
+
+--out i --log se místo jednoho rostoucího souboru rozdělí na segmenty:
+aktivní soubor (scan.csv) se při překročení velikosti nebo se změnou dne
+uzavře a přejmenuje na scan.20261016T235956.csv (čas posledního zápisu),
+uzavřený segment se na pozadí zkomprimuje (gzip ze standardní knihovny)
+a nejstarší segmenty nad limit se smažou.
+
+Komprese je odolná proti pádu: zapisuje se do .gz.tmp, po fsync se
+atomicky přejmenuje a teprve pak se smaže původní soubor. Nedokončenou
+práci dokončí další start.
+
+Čtení přes segmenty (segment_files, open_segment) je průhledné - prostý
+i komprimovaný segment se čte stejně, v chronologickém pořadí.
+"""
+
+import gzip
+import math
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+ROLL_DAY = 'day'
+COMPRESSED_SUFFIX = '.gz'
+STAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+MIN_SEGMENT_SIZE = 1024   # Nejmenší povolená velikost segmentu [B]
+
+# Násobky pro velikost segmentu (--roll 50M)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_roll(value: str) -> Union[str, int]:
+    """
+    Převede volbu --roll: 'day' (denní segmenty) nebo velikost (500K, 50M, 1G).
+
+    Returns:
+        ROLL_DAY nebo velikost segmentu v bajtech
+    """
+    if value == ROLL_DAY:
+        return ROLL_DAY
+    match = re.fullmatch(r'(\d+)([KMG]?)B?', value.strip().upper())
+    if not match:
+        raise ValueError(f"Neplatná rotace: {value} (day nebo velikost, např. 50M)")
+    size = int(match.group(1)) * SIZE_UNITS[match.group(2)]
+    if size < MIN_SEGMENT_SIZE:
+        raise ValueError(f"Segment musí mít alespoň {MIN_SEGMENT_SIZE} B: {value}")
+    return size
+
+
+class SegmentPolicy:
+    """Pravidla rotace sdílená výstupy CSV a log."""
+
+    __slots__ = ('roll', 'retain', 'compress')
+
+    def __init__(self, roll: Union[str, int], retain: Optional[int] = None, compress: bool = True):
+        if retain is not None and retain < 1:
+            raise ValueError(f"Počet ponechaných segmentů musí být alespoň 1: {retain}")
+        self.roll = roll          # ROLL_DAY nebo max. velikost segmentu [B]
+        self.retain = retain      # Počet ponechaných uzavřených segmentů (None = všechny)
+        self.compress = compress
+
+    def describe(self) -> str:
+        if self.roll == ROLL_DAY:
+            roll = "denně"
+        elif self.roll >= SIZE_UNITS['M']:
+            roll = f"po {self.roll / SIZE_UNITS['M']:.1f} MB"
+        else:
+            roll = f"po {self.roll / SIZE_UNITS['K']:.0f} kB"
+        retain = f", ponechat {self.retain}" if self.retain else ""
+        compress = ", gzip" if self.compress else ""
+        return f"rotace {roll}{retain}{compress}"
+
+
+def _segment_pattern(path: Path):
+    return re.compile(re.escape(path.stem) + r'\.(\d{8}T\d{6})(?:-(\d+))?'
+                      + re.escape(path.suffix) + r'(' + re.escape(COMPRESSED_SUFFIX) + r')?$')
+
+
+def _closed_segments(path: Path) -> List[tuple]:
+    """Uzavřené segmenty jako (razítko, pořadí, soubor) seřazené chronologicky."""
+    path = Path(path)
+    pattern = _segment_pattern(path)
+    found = {}
+    directory = path.parent if str(path.parent) else Path('.')
+    if not directory.exists():
+        return []
+    for entry in directory.iterdir():
+        match = pattern.match(entry.name)
+        if not match:
+            continue
+        key = (match.group(1), int(match.group(2) or 0))
+        # Existuje-li prostý i komprimovaný soubor (pád před smazáním), platí komprimovaný
+        if key not in found or match.group(3):
+            found[key] = entry
+    return [(stamp, sequence, found[(stamp, sequence)]) for stamp, sequence in sorted(found)]
+
+
+def segment_files(path: Path, start: Optional[float] = None, end: Optional[float] = None) -> List[Path]:
+    """
+    Soubory všech segmentů v chronologickém pořadí (uzavřené, pak aktivní).
+
+    Args:
+        path: Cesta k aktivnímu souboru (scan.csv)
+        start, end: Volitelný rozsah v epoch sekundách - vynechají se
+                    segmenty, které celé leží mimo něj
+    """
+    path = Path(path)
+    files = []
+    previous_end = None
+    for stamp, _, segment in _closed_segments(path):
+        segment_epoch = datetime.strptime(stamp, STAMP_FORMAT).timestamp()
+        if end is not None and previous_end is not None and previous_end >= end:
+            return files
+        previous_end = segment_epoch
+        if start is not None and segment_epoch < start:
+            continue
+        files.append(segment)
+    if path.exists() and not (end is not None and previous_end is not None and previous_end >= end):
+        files.append(path)
+    return files
+
+
+def is_compressed(path: Path) -> bool:
+    return Path(path).name.endswith(COMPRESSED_SUFFIX)
+
+
+def open_segment(path: Path):
+    """Otevře segment pro čtení textu (prostý i gzip) - jako open(..., newline='')."""
+    if is_compressed(path):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    return open(path, 'r', newline='', encoding='utf-8')
+
+
+def compress_segment(segment: Path, sidecars: Sequence[str] = ()) -> Path:
+    """
+    Zkomprimuje uzavřený segment (.gz přes .gz.tmp + fsync + os.replace).
+
+    Postranní soubory (např. index .idx) po kompresi ztrácí smysl a smažou se.
+    """
+    segment = Path(segment)
+    target = segment.with_name(segment.name + COMPRESSED_SUFFIX)
+    tmp_file = target.with_name(target.name + '.tmp')
+    with open(segment, 'rb') as src, open(tmp_file, 'wb') as raw:
+        with gzip.GzipFile(filename=segment.name, mode='wb', fileobj=raw, compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_file, target)
+    segment.unlink()
+    for suffix in sidecars:
+        sidecar = segment.with_name(segment.name + suffix)
+        if sidecar.exists():
+            sidecar.unlink()
+    return target
+
+
+class SegmentRoller:
+    """
+    Rotace jednoho výstupního souboru (používají CsvSink a LogSink).
+
+    Vlastník souboru se ptá due() před zápisem nové iterace; při True
+    soubor zavře, zavolá roll() a otevře nový.
+    """
+
+    def __init__(self, path: Path, policy: SegmentPolicy, sidecars: Sequence[str] = ()):
+        self.path = Path(path)
+        self.policy = policy
+        self.sidecars = tuple(sidecars)
+        self.workers = []
+        self.last_write = (datetime.fromtimestamp(self.path.stat().st_mtime)
+                           if self.path.exists() else None)
+        self.recover()
+
+    def recover(self) -> None:
+        """Dokončí práci přerušenou pádem (nedokončená komprese, smazání)."""
+        pattern = _segment_pattern(self.path)
+        directory = self.path.parent if str(self.path.parent) else Path('.')
+        for entry in directory.glob(f"{self.path.stem}.*{self.path.suffix}{COMPRESSED_SUFFIX}.tmp"):
+            entry.unlink()
+        for _, _, segment in _closed_segments(self.path):
+            if is_compressed(segment):
+                plain = segment.with_name(segment.name[:-len(COMPRESSED_SUFFIX)])
+                if plain.exists() and pattern.match(plain.name):
+                    plain.unlink()
+            elif self.policy.compress:
+                self._compress_later(segment)
+        self.enforce_retention()
+
+    def note_write(self, moment: datetime) -> None:
+        """Zaznamená čas zápisu (pro denní rotaci a název segmentu)."""
+        self.last_write = moment
+
+    def due(self, moment: datetime, size: int) -> bool:
+        """True, pokud je před zápisem v čase moment potřeba začít nový segment."""
+        if self.policy.roll == ROLL_DAY:
+            return self.last_write is not None and moment.date() != self.last_write.date()
+        return size >= self.policy.roll
+
+    def roll(self) -> Optional[Path]:
+        """
+        Uzavře aktivní soubor (musí být zavřený vlastníkem) jako segment.
+
+        Returns:
+            Cesta k uzavřenému segmentu (před kompresí)
+        """
+        if not self.path.exists():
+            return None
+        moment = self.last_write or datetime.now()
+        # Razítko = čas posledního zápisu zaokrouhlený nahoru (segment obsahuje data do něj)
+        stamp = datetime.fromtimestamp(math.ceil(moment.timestamp())).strftime(STAMP_FORMAT)
+        segment = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        sequence = 0
+        while segment.exists() or segment.with_name(segment.name + COMPRESSED_SUFFIX).exists():
+            sequence += 1
+            segment = self.path.with_name(f"{self.path.stem}.{stamp}-{sequence}{self.path.suffix}")
+
+        for suffix in self.sidecars:
+            sidecar = self.path.with_name(self.path.name + suffix)
+            if sidecar.exists():
+                os.replace(sidecar, segment.with_name(segment.name + suffix))
+        os.replace(self.path, segment)
+
+        if self.policy.compress:
+            self._compress_later(segment)
+        self.enforce_retention()
+        return segment
+
+    def _compress_later(self, segment: Path) -> None:
+        """Spustí kompresi segmentu na pozadí."""
+        def work():
+            try:
+                compress_segment(segment, self.sidecars)
+            except FileNotFoundError:
+                pass  # Segment mezitím smazala retence
+
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        worker = threading.Thread(target=work, name=f"compress-{segment.name}", daemon=True)
+        worker.start()
+        self.workers.append(worker)
+
+    def enforce_retention(self) -> None:
+        """Smaže nejstarší uzavřené segmenty nad limit policy.retain."""
+        if not self.policy.retain:
+            return
+        closed = _closed_segments(self.path)
+        for _, _, segment in closed[:max(0, len(closed) - self.policy.retain)]:
+            base = segment.with_name(segment.name[:-len(COMPRESSED_SUFFIX)]) if is_compressed(segment) else segment
+            for candidate in [base, base.with_name(base.name + COMPRESSED_SUFFIX)] + [
+                    base.with_name(base.name + suffix) for suffix in self.sidecars]:
+                try:
+                    candidate.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def close(self) -> None:
+        """Počká na dokončení komprese na pozadí."""
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Simulátor LG Therma V pro vývoj a zátěžové testy (python lgscan.py simulate)
+
+Lokální Modbus TCP server s mapou registrů z registers.yaml a
+modbus_tcp.REGISTRY, za kterou běží jednoduchý fyzikální model
+tepelného čerpadla: teplota vody v okruhu se ohřívá výkonem kompresoru
+a ztrácí teplo do místnosti, kompresor cykluje podle hystereze
+výstupní teploty (10004), frekvence invertoru (30025) se rozbíhá
+a dobíhá rampou, při mrazu probíhá periodicky defrost (10005).
+Průtok, příkon a teploty jsou konzistentní, takže COP i energie
+z lgscan dávají smysl.
+
+Chování brány je nastavitelné: latence a rozptyl odezvy, podíl
+zahozených dotazů (klient dostane timeout) a max. počet spojení.
+Zařízení zpracovává jeden dotaz po druhém (jako RS485 za bránou).
+Náhodnost (šum, rozptyl, zahazování) řídí --seed, takže běhy jsou
+opakovatelné; --speed zrychlí čas modelu (cykly kompresoru za minuty).
+
+Kolize adres: registers.yaml má přednost před modbus_tcp.REGISTRY
+a první položka konfigurace před dalšími se stejnou adresou (např.
+40004 'table: input' čte stejné slovo jako 30004) - stejně jako na
+zařízení, kde jde o totéž slovo.
+
+Použití:
+    python lgscan.py simulate --port 5020 --latency 40 --jitter 15 --drop 0.01
+    python lgscan.py --yaml sim.yaml        (connection: host 127.0.0.1, port 5020)
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import signal
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_PORT = 5020
+
+# Function code → velikost tabulky (počet adres, na které simulátor odpovídá;
+# neznámé adresy v rozsahu vrací 0 jako zařízení, mimo rozsah výjimku 02)
+TABLE_SIZES = {1: 32, 2: 64, 3: 64, 4: 120}
+
+# Tabulka z registers.yaml → function code
+TABLE_FUNCTIONS = {'coils': 1, 'coil': 1, 'discrete': 2, 'holding': 3, 'input': 4}
+
+MAX_REGISTERS = 125   # Modbus limit počtu registrů v jednom dotazu
+MAX_BITS = 2000       # Modbus limit počtu bitů v jednom dotazu
+
+# Modbus exception kódy
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+ILLEGAL_VALUE = 3
+
+WATER_CP = 4.18           # Měrná tepelná kapacita vody [kJ/(kg·K)]
+LOOP_CAPACITY = 400.0     # Tepelná kapacita okruhu (~100 l vody) [kJ/K]
+LOOP_LOSS = 0.3           # Tepelná ztráta okruhu do místnosti [kW/K]
+
+
+class ThermaModel:
+    """
+    Fyzikální model tepelného čerpadla v simulovaném čase (sekundy).
+
+    step(dt) integruje stav, values() vrací fyzikální hodnoty podle
+    čísel registrů (°C, l/min, kW, Hz, stavy 0/1).
+    """
+
+    MIN_RUN = 600         # Min. doba běhu kompresoru [s]
+    MIN_OFF = 300         # Min. doba stání kompresoru [s]
+    DEFROST_AFTER = 2700  # Defrost po této době běhu při venkovní teplotě pod 5 °C [s]
+    DEFROST_TIME = 300    # Délka defrostu [s]
+    PUMP_OVERRUN = 60     # Doběh oběhového čerpadla po vypnutí kompresoru [s]
+
+    def __init__(self, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.t = 0.0
+        self.outdoor = 2.0
+        self.room = 21.0
+        self.target = 35.0
+        self.dhw_target = 48.0
+        self.dhw_tank = 46.0
+        self.water = 30.0         # Střední teplota vody v okruhu
+        self.compressor = False
+        self.defrost = False
+        self.switched = -self.MIN_OFF   # Čas poslední změny kompresoru
+        self.defrost_started = 0.0
+        self.run_since_defrost = 0.0
+        self.frequency = 0.0
+        self.pump_until = 0.0
+        self.flow = 0.0
+        self.heat = 0.0           # Tepelný výkon do vody [kW]
+        self.power = 0.05         # Elektrický příkon [kW]
+
+    @property
+    def pump(self) -> bool:
+        return self.compressor or self.t < self.pump_until
+
+    @property
+    def delta(self) -> float:
+        """Teplotní spád výstup - vstup [K]."""
+        if self.flow <= 0:
+            return 0.0
+        return self.heat / (self.flow / 60.0 * WATER_CP)
+
+    def step(self, dt: float) -> None:
+        self.t += dt
+        rng = self.rng
+
+        # Venkovní teplota - denní sinusovka kolem 2 °C
+        self.outdoor = 2.0 + 4.0 * math.sin(2 * math.pi * (self.t / 86400.0 - 0.25))
+        outlet = self.water + self.delta / 2
+
+        # Termostat s hysterezí a minimálními časy běhu/stání
+        running_for = self.t - self.switched
+        if self.compressor and not self.defrost:
+            if outlet > self.target + 2.0 and running_for >= self.MIN_RUN:
+                self.compressor = False
+                self.switched = self.t
+                self.pump_until = self.t + self.PUMP_OVERRUN
+        elif not self.compressor:
+            if outlet < self.target - 3.0 and running_for >= self.MIN_OFF:
+                self.compressor = True
+                self.switched = self.t
+
+        # Defrost po delším běhu v mrazu
+        if self.compressor:
+            self.run_since_defrost += dt
+            if self.defrost and self.t - self.defrost_started >= self.DEFROST_TIME:
+                self.defrost = False
+                self.run_since_defrost = 0.0
+            elif (not self.defrost and self.outdoor < 5.0
+                  and self.run_since_defrost >= self.DEFROST_AFTER):
+                self.defrost = True
+                self.defrost_started = self.t
+
+        # Frekvence invertoru - rampa k cíli podle potřeby výkonu
+        if self.compressor:
+            wanted = 60.0 if self.defrost else min(90.0, max(30.0, 30.0 + (self.target - self.outdoor) * 1.2))
+            if self.frequency < wanted:
+                self.frequency = min(wanted, self.frequency + 1.0 * dt)
+            else:
+                self.frequency = max(wanted, self.frequency - 1.0 * dt)
+        else:
+            self.frequency = max(0.0, self.frequency - 3.0 * dt)
+
+        self.flow = 20.0 + rng.gauss(0.0, 0.2) if self.pump else 0.0
+        if self.frequency > 0:
+            # Defrost odebírá teplo z vody, jinak výkon úměrný frekvenci
+            self.heat = -2.0 if self.defrost else self.frequency * 0.09 * (1.0 + (self.outdoor - 2.0) * 0.02)
+            self.power = 0.15 + self.frequency * 0.022
+        else:
+            self.heat = 0.0
+            self.power = 0.05 if not self.pump else 0.12
+
+        self.water += (self.heat - LOOP_LOSS * (self.water - self.room)) * dt / LOOP_CAPACITY
+        self.dhw_tank += -0.0002 * (self.dhw_tank - self.room) * dt / 60.0
+
+    def advance(self, seconds: float, max_step: float = 1.0) -> None:
+        """Posune model o seconds (integrace po krocích nejvýše max_step)."""
+        while seconds > 0:
+            dt = min(max_step, seconds)
+            self.step(dt)
+            seconds -= dt
+
+    def values(self) -> Dict[int, float]:
+        """Fyzikální hodnoty podle čísel registrů."""
+        rng = self.rng
+        outlet = self.water + self.delta / 2 + rng.gauss(0.0, 0.05)
+        inlet = self.water - self.delta / 2 + rng.gauss(0.0, 0.05)
+        heating = self.compressor and not self.defrost
+        return {
+            30001: 0,
+            30002: 2 if heating else 0,
+            30003: inlet,
+            30004: outlet,
+            30005: outlet,
+            30006: self.dhw_tank,
+            30008: self.room + rng.gauss(0.0, 0.05),
+            30009: self.flow,
+            30013: self.outdoor,
+            30017: outlet - 0.5,
+            30018: self.power,
+            30019: self.outdoor - (6.0 if self.frequency else 0.0),
+            30020: self.outdoor + self.frequency * 0.8,
+            30021: self.outdoor - (8.0 if self.frequency else 0.0),
+            30022: 5 + round(self.frequency * 0.05),
+            30023: 1800 + round(self.frequency * 300),
+            30024: 600 + round(self.frequency * 40),
+            30025: round(self.frequency),
+            40001: 4,
+            40003: self.target,
+            40005: 0.0,
+            40009: self.dhw_target,
+            40013: 1.8,
+            40018: self.power,
+            10001: int(self.flow > 0),
+            10002: int(self.pump),
+            10004: int(self.compressor),
+            10005: int(self.defrost),
+        }
+
+
+class RegisterMap:
+    """
+    Mapa (function code, adresa) → (registr, měřítko) pro simulátor.
+
+    Z descriptors (registers.yaml) a slovníku ve tvaru modbus_tcp.REGISTRY;
+    první mapování adresy vyhrává, kolize se zaznamenají do aliases.
+    """
+
+    def __init__(self, descriptors=(), registry: Optional[Dict] = None):
+        self.entries = {}   # (fc, adresa) → (reg, scale)
+        self.aliases = []   # (reg, reg s přednostní adresou, fc, adresa)
+        for desc in descriptors:
+            function = TABLE_FUNCTIONS.get(desc.table)
+            if function is not None:
+                self._add(function, desc.address, desc.reg, desc.scale)
+        for reg, info in sorted((registry or {}).items()):
+            self._add(info['func'], info['addr'], reg, info['scale'])
+        self.sizes = dict(TABLE_SIZES)
+        for function, address in self.entries:
+            self.sizes[function] = max(self.sizes[function], address + 1)
+
+    def _add(self, function: int, address: int, reg: int, scale: float) -> None:
+        key = (function, address)
+        existing = self.entries.get(key)
+        if existing is None:
+            self.entries[key] = (reg, scale)
+        elif existing[0] != reg:
+            self.aliases.append((reg, existing[0], function, address))
+
+    def words(self, values: Dict[int, float], function: int, address: int, count: int) -> List[int]:
+        """Slova (nebo bity) rozsahu z fyzikálních hodnot modelu."""
+        words = []
+        for offset in range(address, address + count):
+            entry = self.entries.get((function, offset))
+            if entry is None:
+                words.append(0)
+                continue
+            reg, scale = entry
+            value = values.get(reg, 0)
+            if function in (1, 2):
+                words.append(1 if value else 0)
+            else:
+                words.append(int(round(value / scale)) & 0xFFFF)
+        return words
+
+
+def _pack_bits(bits: List[int]) -> bytes:
+    """Bity odpovědi fc 1/2 - LSB první, doplněno na celé bajty."""
+    packed = bytearray((len(bits) + 7) // 8)
+    for index, bit in enumerate(bits):
+        if bit:
+            packed[index // 8] |= 1 << (index % 8)
+    return bytes(packed)
+
+
+class DeviceSimulator:
+    """
+    Modbus TCP server simulátoru (asyncio, bez závislosti na pymodbus serveru).
+
+    stats: počty dotazů, zahozených dotazů, odmítnutých spojení a přenesených bajtů.
+    """
+
+    def __init__(self, register_map: RegisterMap, latency: float = 0.0, jitter: float = 0.0,
+                 drop_rate: float = 0.0, max_connections: Optional[int] = None,
+                 seed: int = 1, speed: float = 1.0):
+        if latency < 0 or jitter < 0:
+            raise ValueError("Latence a rozptyl nesmí být záporné")
+        if not 0.0 <= drop_rate < 1.0:
+            raise ValueError(f"Podíl zahozených dotazů musí být v rozsahu 0-1: {drop_rate}")
+        if max_connections is not None and max_connections < 1:
+            raise ValueError(f"Neplatný počet spojení: {max_connections}")
+        if speed <= 0:
+            raise ValueError(f"Neplatné zrychlení času: {speed}")
+        self.map = register_map
+        self.latency = latency          # [s]
+        self.jitter = jitter            # [s], rovnoměrně ±jitter
+        self.drop_rate = drop_rate
+        self.max_connections = max_connections
+        self.speed = speed
+        self.model = ThermaModel(seed)
+        self.rng = random.Random(seed + 1)
+        self.started = None
+        self.connections = 0
+        self.clients = {}               # Otevřená spojení: writer → obsluha (ukončí je stop())
+        self.lock = None
+        self.server = None
+        self.stats = {'requests': 0, 'dropped': 0, 'exceptions': 0, 'rejected': 0,
+                      'bytes_in': 0, 'bytes_out': 0}
+
+    def _sync_model(self) -> None:
+        """Dožene model na aktuální (zrychlený) čas."""
+        target = (time.monotonic() - self.started) * self.speed
+        if target > self.model.t:
+            self.model.advance(target - self.model.t)
+
+    def respond(self, pdu: bytes) -> bytes:
+        """Zpracuje PDU dotazu (function code + data) a vrátí PDU odpovědi."""
+        function = pdu[0]
+        if function not in TABLE_SIZES:
+            self.stats['exceptions'] += 1
+            return bytes((function | 0x80, ILLEGAL_FUNCTION))
+        if len(pdu) < 5:
+            self.stats['exceptions'] += 1
+            return bytes((function | 0x80, ILLEGAL_VALUE))
+        address, count = struct.unpack('>HH', pdu[1:5])
+        limit = MAX_BITS if function in (1, 2) else MAX_REGISTERS
+        if not 1 <= count <= limit:
+            self.stats['exceptions'] += 1
+            return bytes((function | 0x80, ILLEGAL_VALUE))
+        if address + count > self.map.sizes[function]:
+            self.stats['exceptions'] += 1
+            return bytes((function | 0x80, ILLEGAL_ADDRESS))
+
+        self._sync_model()
+        words = self.map.words(self.model.values(), function, address, count)
+        if function in (1, 2):
+            data = _pack_bits(words)
+        else:
+            data = struct.pack(f'>{count}H', *words)
+        return bytes((function, len(data))) + data
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self.max_connections is not None and self.connections >= self.max_connections:
+            # Brána LG další spojení nepřijme - klient uvidí okamžité zavření
+            self.stats['rejected'] += 1
+            writer.close()
+            return
+        self.connections += 1
+        self.clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction_id, protocol_id, length, unit = struct.unpack('>HHHB', header)
+                pdu = await reader.readexactly(length - 1)
+                self.stats['requests'] += 1
+                self.stats['bytes_in'] += 7 + len(pdu)
+
+                # Zařízení obsluhuje jeden dotaz po druhém (sdílená sběrnice za bránou)
+                async with self.lock:
+                    delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if self.drop_rate and self.rng.random() < self.drop_rate:
+                        self.stats['dropped'] += 1
+                        continue
+                    response = self.respond(pdu)
+
+                frame = struct.pack('>HHHB', transaction_id, protocol_id, len(response) + 1, unit) + response
+                writer.write(frame)
+                self.stats['bytes_out'] += len(frame)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            self.clients.pop(writer, None)
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> int:
+        """Začne naslouchat; vrací skutečný port (port 0 = libovolný volný)."""
+        self.lock = asyncio.Lock()
+        self.started = time.monotonic()
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            # Zavření spojení ukončí čtení v obsluhách (IncompleteReadError)
+            tasks = list(self.clients.values())
+            for writer in list(self.clients):
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    def stats_line(self) -> str:
+        stats = self.stats
+        model = self.model
+        return (f"📥 dotazů {stats['requests']} | zahozeno {stats['dropped']} | "
+                f"odmítnuto spojení {stats['rejected']} | spojení {self.connections} | "
+                f"🔥 kompresor {'ON' if model.compressor else 'off'}{' (defrost)' if model.defrost else ''} "
+                f"{model.frequency:.0f} Hz | výstup {model.water + model.delta / 2:.1f} °C")
+
+
+class SimulatorThread:
+    """
+    Simulátor ve vlákně s vlastní asyncio smyčkou (pro benchmarky a testy).
+
+        with SimulatorThread(RegisterMap(descriptors, REGISTRY), latency=0.02) as sim:
+            ModbusTcpClient('127.0.0.1', port=sim.port) ...
+    """
+
+    def __init__(self, register_map: RegisterMap, host: str = '127.0.0.1', port: int = 0, **options):
+        self.simulator = DeviceSimulator(register_map, **options)
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+
+    def __enter__(self):
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.port = self.loop.run_until_complete(self.simulator.start(self.host, self.port))
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name='simulator', daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.simulator.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    @property
+    def stats(self) -> Dict:
+        return self.simulator.stats
+
+
+async def simulate(simulator: DeviceSimulator, host: str, port: int, report: float) -> None:
+    port = await simulator.start(host, port)
+    print(f"🔌 Simulátor naslouchá na {host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(report)
+            print(simulator.stats_line())
+    finally:
+        await simulator.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Vstupní bod podpříkazu simulate."""
+    from lgscan import handle_sigterm, load_config
+    from modbus_tcp import REGISTRY
+
+    parser = argparse.ArgumentParser(
+        prog="lgscan.py simulate",
+        description="Lokální simulátor LG Therma V (Modbus TCP) pro vývoj a zátěžové testy"
+    )
+    parser.add_argument('--yaml', type=Path, default='registers.yaml',
+                        help='Mapa registrů (sekce registers); doplní se modbus_tcp.REGISTRY')
+    parser.add_argument('--listen', default='127.0.0.1', metavar='HOST',
+                        help='Adresa, na které simulátor naslouchá (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port simulátoru (default: {DEFAULT_PORT})')
+    parser.add_argument('--latency', type=float, default=30.0, metavar='MS',
+                        help='Odezva na jeden dotaz v ms (default: 30)')
+    parser.add_argument('--jitter', type=float, default=10.0, metavar='MS',
+                        help='Rozptyl odezvy ±ms (default: 10)')
+    parser.add_argument('--drop', type=float, default=0.0, metavar='RATE',
+                        help='Podíl dotazů bez odpovědi 0-1 (default: 0)')
+    parser.add_argument('--max-connections', type=int, default=None, metavar='N',
+                        help='Max. počet současných spojení (default: bez omezení)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Semínko náhodnosti - stejné semínko = stejný průběh (default: 1)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Zrychlení času modelu, např. 60 = minuta za sekundu (default: 1)')
+    parser.add_argument('--report', type=float, default=10.0, metavar='SECONDS',
+                        help='Interval výpisu statistik (default: 10)')
+    args = parser.parse_args(argv)
+
+    descriptors = []
+    if args.yaml.exists():
+        descriptors = load_config(args.yaml).get('descriptors', [])
+    else:
+        print(f"⚠️ {args.yaml} neexistuje - jen mapa modbus_tcp.REGISTRY")
+    register_map = RegisterMap(descriptors, REGISTRY)
+    for reg, owner, function, address in register_map.aliases:
+        print(f"ℹ️  {reg} čte stejné slovo jako {owner} (fc {function}, adresa {address})")
+
+    try:
+        simulator = DeviceSimulator(register_map, args.latency / 1000.0, args.jitter / 1000.0, args.drop,
+                                    args.max_connections, args.seed, args.speed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    print(f"🧪 Simulátor LG Therma V: {len(register_map.entries)} adres | latence {args.latency:g}±{args.jitter:g} ms"
+          f" | zahazování {args.drop:.1%} | zrychlení {args.speed:g}×")
+    try:
+        asyncio.run(simulate(simulator, args.listen, args.port, args.report))
+    except KeyboardInterrupt:
+        print("\n✅ Simulátor ukončen")
+    except OSError as e:
+        print(f"❌ Nelze spustit simulátor na portu {args.port}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+SQLite úložiště historie (--db history.sqlite)
+
+Normalizované schéma místo dlouhého CSV:
+    registers - popis registrů z registers.yaml (měřítko, jednotka, ...)
+    samples   - (ts, reg) → raw hodnota; jen úspěšná čtení
+    rollups   - agregace po 1 min / 15 min / 1 h (s --rollups, viz rollups.py)
+
+Ukládají se jen raw hodnoty, škálované dopočítávají pohledy
+(samples_scaled, rollups_scaled, latest) z aktuálního měřítka v tabulce registers -
+oprava kalibrace v YAML se po dalším startu projeví i na staré historii
+bez přepisování dat.
+
+Zápis: WAL režim, jedna transakce na iteraci a dávkový executemany
+s jedním připraveným dotazem. Primární klíč (ts, reg) je zároveň index
+pro časové rozsahy, index (reg, ts) pro průběh jednoho registru.
+
+Příklad dotazu:
+    SELECT time, scaled FROM samples_scaled
+    WHERE reg = 30004 AND ts BETWEEN strftime('%s', '2025-11-18 06:00', 'utc')
+                                 AND strftime('%s', '2025-11-18 09:00', 'utc');
+"""
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registers (
+    reg         INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    table_name  TEXT NOT NULL,
+    address     INTEGER NOT NULL,
+    scale       REAL NOT NULL,
+    signed      INTEGER NOT NULL,
+    unit        TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS samples (
+    ts   REAL NOT NULL,      -- Čas snímku iterace (Unix epoch)
+    reg  INTEGER NOT NULL REFERENCES registers(reg),
+    raw  INTEGER NOT NULL,   -- Raw hodnota registru (int16 / uint16 / bit)
+    PRIMARY KEY (ts, reg)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS samples_reg_ts ON samples (reg, ts);
+
+CREATE VIEW IF NOT EXISTS samples_scaled AS
+    SELECT s.ts,
+           datetime(s.ts, 'unixepoch', 'localtime') AS time,
+           s.reg,
+           r.name,
+           s.raw,
+           s.raw * r.scale AS scaled,
+           r.unit
+    FROM samples AS s JOIN registers AS r ON r.reg = s.reg;
+
+CREATE TABLE IF NOT EXISTS rollups (
+    tier      INTEGER NOT NULL,   -- Délka kbelíku [s] (60, 900, 3600)
+    bucket    REAL NOT NULL,      -- Začátek kbelíku (Unix epoch)
+    reg       INTEGER NOT NULL REFERENCES registers(reg),
+    count     INTEGER NOT NULL,
+    raw_sum   INTEGER NOT NULL,
+    raw_min   INTEGER NOT NULL,
+    raw_max   INTEGER NOT NULL,
+    raw_last  INTEGER NOT NULL,
+    last_ts   REAL NOT NULL,
+    on_count  INTEGER,            -- Počet vzorků ve stavu 1 (jen binární statusy)
+    PRIMARY KEY (tier, reg, bucket)
+) WITHOUT ROWID;
+
+CREATE VIEW IF NOT EXISTS rollups_scaled AS
+    SELECT u.tier, u.bucket,
+           datetime(u.bucket, 'unixepoch', 'localtime') AS time,
+           u.reg, r.name, u.count,
+           u.raw_min * r.scale AS min,
+           u.raw_max * r.scale AS max,
+           u.raw_sum * r.scale / u.count AS mean,
+           u.raw_last * r.scale AS last,
+           u.on_count * 1.0 / u.count AS on_fraction,
+           r.unit
+    FROM rollups AS u JOIN registers AS r ON r.reg = u.reg;
+
+CREATE VIEW IF NOT EXISTS latest AS
+    SELECT r.reg, r.name,
+           datetime(s.ts, 'unixepoch', 'localtime') AS time,
+           s.raw, s.raw * r.scale AS scaled, r.unit
+    FROM registers AS r
+    JOIN samples AS s ON s.reg = r.reg
+                     AND s.ts = (SELECT MAX(ts) FROM samples WHERE reg = r.reg);
+"""
+
+INSERT_SAMPLE = "INSERT OR REPLACE INTO samples (ts, reg, raw) VALUES (?, ?, ?)"
+
+# Kbelík zapsaný podruhé (rozpracovaný při ukončení, dokončený po restartu) se sloučí
+UPSERT_ROLLUP = """
+INSERT INTO rollups (tier, bucket, reg, count, raw_sum, raw_min, raw_max, raw_last, last_ts, on_count)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (tier, reg, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    raw_sum = raw_sum + excluded.raw_sum,
+    raw_min = min(raw_min, excluded.raw_min),
+    raw_max = max(raw_max, excluded.raw_max),
+    raw_last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.raw_last ELSE raw_last END,
+    last_ts = max(last_ts, excluded.last_ts),
+    on_count = on_count + excluded.on_count
+"""
+
+UPSERT_REGISTER = """
+INSERT INTO registers (reg, name, table_name, address, scale, signed, unit)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (reg) DO UPDATE SET
+    name = excluded.name, table_name = excluded.table_name, address = excluded.address,
+    scale = excluded.scale, signed = excluded.signed, unit = excluded.unit
+"""
+
+
+class SqliteSink:
+    """
+    Zápis iterací do SQLite databáze.
+
+    Registry se při otevření zapíší / aktualizují z deskriptorů konfigurace.
+    Duplicitní registry (stejné číslo pod jiným jménem) se ukládají jednou.
+    """
+
+    def __init__(self, db_file: Path, descriptors, fsync: bool = False):
+        self.db_file = Path(db_file)
+        self.connection = sqlite3.connect(self.db_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # NORMAL ve WAL: commit přežije pád procesu, fsync=True i výpadek napájení
+        self.connection.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self.connection.close()
+            raise ValueError(f"Nepodporovaná verze databáze: {version}")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        self.registers = set()
+        rows = []
+        for desc in descriptors:
+            if desc.reg in self.registers:
+                continue
+            self.registers.add(desc.reg)
+            rows.append((desc.reg, desc.name, desc.table, desc.address, desc.scale,
+                         int(desc.signed), desc.unit))
+        with self.connection:
+            self.connection.executemany(UPSERT_REGISTER, rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_cycle(self, results: List[Dict], timestamp: Optional[datetime] = None) -> None:
+        """Zapíše úspěšná čtení jedné iterace v jedné transakci."""
+        ts = (timestamp or datetime.now()).timestamp()
+        rows = [(ts, result['reg'], result['raw']) for result in results
+                if result['ok'] and result['reg'] in self.registers]
+        if not rows:
+            return
+        with self.connection:
+            self.connection.executemany(INSERT_SAMPLE, rows)
+
+    def write_rollups(self, tier: int, buckets: List[tuple]) -> None:
+        """Zapíše uzavřené rollup kbelíky (viz rollups.py) v jedné transakci."""
+        rows = [(tier, bucket.start, reg, bucket.count, bucket.raw_sum, bucket.raw_min, bucket.raw_max,
+                 bucket.raw_last, bucket.last_ts, bucket.on_count) for reg, bucket in buckets]
+        with self.connection:
+            self.connection.executemany(UPSERT_ROLLUP, rows)
+
+    def close(self) -> None:
+        """Uzavře databázi (WAL se při posledním odpojení zapíše do hlavního souboru)."""
+        self.connection.close()
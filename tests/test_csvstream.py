@@ -0,0 +1,68 @@
+"""
+Skládání snímků iterací z CSV (csvstream.iter_snapshots)
+
+Použití:
+    python -m pytest tests/test_csvstream.py
+"""
+
+import csv
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from csvstream import iter_snapshots  # noqa: E402
+from lgscan import CSV_HEADER  # noqa: E402
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+# (reg, name); 40001 je v registers.yaml pod dvěma názvy
+REGISTERS = [(30003, 'Water Inlet Temperature'), (30004, 'Water Outlet Temperature'),
+             (40001, 'Operation Mode'), (40001, 'System Heating/Cooling Mode')]
+FAST_REG = (30025, 'Compressor Frequency')
+
+
+def write_csv(path: Path, rows) -> None:
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for moment, (reg, name), raw in rows:
+            writer.writerow([moment.isoformat(), name, reg, 0, 'input', raw, raw, '', '', '', True, '', ''])
+
+
+def test_mixed_periods_every_timestamp_is_a_cycle(tmp_path):
+    """Interval 3 s, 30025 s periodou 2 s - tiky jen s 30025 jsou samostatné iterace."""
+    ticks = sorted(set(range(0, 39, 3)) | set(range(0, 39, 2)))
+    rows = []
+    for second in ticks:
+        moment = START + timedelta(seconds=second)
+        if second % 3 == 0:
+            rows.extend((moment, register, second) for register in REGISTERS)
+        if second % 2 == 0:
+            rows.append((moment, FAST_REG, 1000 + second))
+    path = tmp_path / 'scan.csv'
+    write_csv(path, rows)
+
+    snapshots = list(iter_snapshots(path, columns=('raw',)))
+    assert [snapshot.epoch for snapshot in snapshots] == [
+        (START + timedelta(seconds=second)).timestamp() for second in ticks]
+    assert [snapshot.value(30025, 'raw') for snapshot in snapshots if 30025 in snapshot.rows] == [
+        1000 + second for second in ticks if second % 2 == 0]
+
+
+def test_legacy_row_timestamps_split_on_repeated_register_name(tmp_path):
+    """Starší CSV s časem po řádcích - dva názvy 40001 iteraci nerozdělí."""
+    rows = []
+    for cycle in range(5):
+        for position, register in enumerate(REGISTERS):
+            moment = START + timedelta(seconds=10 * cycle, milliseconds=40 * position)
+            rows.append((moment, register, cycle))
+    path = tmp_path / 'legacy.csv'
+    write_csv(path, rows)
+
+    snapshots = list(iter_snapshots(path, columns=('raw',)))
+    assert len(snapshots) == 5
+    assert [sorted(snapshot.rows) for snapshot in snapshots] == [[30003, 30004, 40001]] * 5
+    assert [snapshot.value(30004, 'raw') for snapshot in snapshots] == list(range(5))
@@ -0,0 +1,98 @@
+"""
+Kontrola brány na localhostu: simulátor → lgscan.py serve → klient
+
+Adresy z docs/HA_LG_ThermaV_Configuration.yaml i blokový plán lgscan
+z registers.yaml musí přes bránu projít bez výjimky a bez rozpadu bloků
+na jednotlivé dotazy.
+
+Použití:
+    python -m pytest tests/test_gateway.py
+"""
+
+import asyncio
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import yaml
+from pymodbus.client import ModbusTcpClient
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from gateway import serve_loop  # noqa: E402
+from lgscan import BLOCK_READ_TABLES, build_read_plan, load_config  # noqa: E402
+from modbus_tcp import REGISTRY  # noqa: E402
+from simulator import RegisterMap, SimulatorThread  # noqa: E402
+
+HA_CONFIG = ROOT / 'docs' / 'HA_LG_ThermaV_Configuration.yaml'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def ha_addresses() -> list:
+    """(metoda klienta, adresa) všech senzorů HA konfigurace."""
+    config = yaml.safe_load(HA_CONFIG.read_text(encoding='utf-8'))
+    addresses = []
+    for hub in config['modbus']:
+        for entity in hub.get('sensors', []) + hub.get('binary_sensors', []):
+            addresses.append((BLOCK_READ_TABLES[entity.get('input_type', 'holding')], entity['address']))
+    return addresses
+
+
+class GatewayThread:
+    """serve_loop() ve vlákně s vlastní asyncio smyčkou."""
+
+    def __init__(self, config, port: int):
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(serve_loop(config, '127.0.0.1', port, 0.5, 5.0))
+        self.port = port
+        self.thread = threading.Thread(target=self._run, name='gateway', daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            with socket.socket() as sock:
+                if sock.connect_ex(('127.0.0.1', self.port)) == 0:
+                    return self
+            time.sleep(0.1)
+        raise RuntimeError("brána nenaslouchá")
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(10)
+        self.loop.close()
+
+
+def test_gateway_serves_ha_addresses_and_lgscan_plan():
+    config = load_config(ROOT / 'registers.yaml')
+    with SimulatorThread(RegisterMap(config['descriptors'], REGISTRY)) as sim:
+        config['connection'].update(host='127.0.0.1', port=sim.port, timeout=2, delay_ms=0)
+        with GatewayThread(config, free_port()) as gateway:
+            client = ModbusTcpClient('127.0.0.1', port=gateway.port, timeout=2)
+            assert client.connect()
+            try:
+                failed = [(method, address) for method, address in ha_addresses()
+                          if getattr(client, method)(address, count=1, slave=1).isError()]
+                assert failed == []
+
+                for block in build_read_plan(config):
+                    reader = getattr(client, BLOCK_READ_TABLES[block['table']])
+                    response = reader(block['address'], count=block['count'], slave=1)
+                    assert not response.isError(), block
+            finally:
+                client.close()
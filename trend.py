@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Streamové sledování změn a trendů registrů
+
+Jeden společný engine pro delta logiku všech režimů (scan, simple, smooth,
+fleet) i výstupů (CSV, log); EMA, klouzavé statistiky a rychlost změny
+publikuje OpenMetrics endpoint (metrics.py). Pro každý registr drží kruhový buffer pevné
+velikosti s raw hodnotami (array int16) a časy vzorků, takže paměť zůstává
+omezená i při týdenním běhu. Každá statistika se aktualizuje v O(1):
+poslední změna, EMA, klouzavé min/max/průměr a rychlost změny za minutu.
+"""
+
+import time
+from array import array
+from collections import deque
+from typing import Dict, Optional
+
+# Výchozí velikost okna (počet vzorků na registr)
+DEFAULT_WINDOW = 60
+
+# Výchozí váha nového vzorku v EMA
+DEFAULT_EMA_ALPHA = 0.2
+
+
+class RegisterTrend:
+    """
+    Kruhový buffer a průběžné statistiky jednoho registru.
+
+    Hodnoty se ukládají jako raw celá čísla (int16, u registrů bez znaménka
+    uint16) a škálují se až při čtení statistik. Min/max okna drží
+    monotónní fronty, průměr průběžný součet - přidání vzorku je O(1).
+    """
+
+    __slots__ = ('scale', 'size', 'alpha', 'raw', 'times', 'head', 'count', 'seq',
+                 'raw_sum', 'min_queue', 'max_queue', 'ema', 'last_raw', 'previous_raw')
+
+    def __init__(self, scale: float, size: int = DEFAULT_WINDOW, alpha: float = DEFAULT_EMA_ALPHA,
+                 signed: bool = True):
+        if size < 2:
+            raise ValueError(f"Okno trendu musí mít alespoň 2 vzorky: {size}")
+        self.scale = scale
+        self.size = size
+        self.alpha = alpha
+        self.raw = array('h' if signed else 'H', [0]) * size
+        self.times = array('d', [0.0]) * size
+        self.head = 0          # Pozice pro další vzorek
+        self.count = 0         # Počet platných vzorků v okně
+        self.seq = 0           # Pořadové číslo dalšího vzorku (pro monotónní fronty)
+        self.raw_sum = 0
+        self.min_queue = deque()  # (seq, raw) s rostoucími raw
+        self.max_queue = deque()  # (seq, raw) s klesajícími raw
+        self.ema = None
+        self.last_raw = None
+        self.previous_raw = None
+
+    def add(self, raw: int, timestamp: float) -> None:
+        """Přidá vzorek (raw hodnota, monotónní čas v sekundách)."""
+        if self.count == self.size:
+            self.raw_sum -= self.raw[self.head]
+        else:
+            self.count += 1
+
+        self.raw[self.head] = raw
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % self.size
+        self.raw_sum += raw
+
+        # Monotónní fronty - amortizovaně O(1), vzorky mimo okno se odříznou zepředu
+        oldest_seq = self.seq - self.count + 1
+        min_queue, max_queue = self.min_queue, self.max_queue
+        while min_queue and min_queue[-1][1] >= raw:
+            min_queue.pop()
+        min_queue.append((self.seq, raw))
+        while min_queue[0][0] < oldest_seq:
+            min_queue.popleft()
+        while max_queue and max_queue[-1][1] <= raw:
+            max_queue.pop()
+        max_queue.append((self.seq, raw))
+        while max_queue[0][0] < oldest_seq:
+            max_queue.popleft()
+        self.seq += 1
+
+        value = raw * self.scale
+        self.ema = value if self.ema is None else self.ema + self.alpha * (value - self.ema)
+        self.previous_raw = self.last_raw
+        self.last_raw = raw
+
+    @property
+    def last(self) -> Optional[float]:
+        """Poslední škálovaná hodnota."""
+        return self.last_raw * self.scale if self.last_raw is not None else None
+
+    @property
+    def previous(self) -> Optional[float]:
+        """Předchozí škálovaná hodnota (None před druhým vzorkem)."""
+        return self.previous_raw * self.scale if self.previous_raw is not None else None
+
+    @property
+    def changed(self) -> bool:
+        """True, pokud se poslední vzorek liší od předchozího."""
+        return self.previous_raw is not None and self.last_raw != self.previous_raw
+
+    @property
+    def delta(self) -> Optional[float]:
+        """Změna posledního vzorku oproti předchozímu (škálovaná)."""
+        if self.previous_raw is None:
+            return None
+        return (self.last_raw - self.previous_raw) * self.scale
+
+    @property
+    def minimum(self) -> Optional[float]:
+        """Minimum v okně."""
+        return self.min_queue[0][1] * self.scale if self.count else None
+
+    @property
+    def maximum(self) -> Optional[float]:
+        """Maximum v okně."""
+        return self.max_queue[0][1] * self.scale if self.count else None
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Průměr v okně."""
+        return self.raw_sum * self.scale / self.count if self.count else None
+
+    @property
+    def rate_per_minute(self) -> Optional[float]:
+        """Rychlost změny za minutu mezi nejstarším a posledním vzorkem okna."""
+        if self.count < 2:
+            return None
+        newest = (self.head - 1) % self.size
+        oldest = (self.head - self.count) % self.size
+        elapsed = self.times[newest] - self.times[oldest]
+        if elapsed <= 0:
+            return None
+        return (self.raw[newest] - self.raw[oldest]) * self.scale * 60.0 / elapsed
+
+
+class TrendEngine:
+    """
+    Trendy všech registrů jedné konfigurace (klíč = index registru v konfiguraci).
+
+    Do enginu se posílají jen čerstvě přečtené výsledky; chybná čtení
+    se přeskakují a okno neporuší.
+    """
+
+    def __init__(self, descriptors, window: int = DEFAULT_WINDOW, alpha: float = DEFAULT_EMA_ALPHA):
+        self.trends = {
+            desc.index: RegisterTrend(desc.scale, window, alpha, desc.signed)
+            for desc in descriptors
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'TrendEngine':
+        """Vytvoří engine z konfigurace (volitelná sekce 'trend': window, ema_alpha)."""
+        options = config.get('trend') or {}
+        return cls(config['descriptors'],
+                   window=options.get('window', DEFAULT_WINDOW),
+                   alpha=options.get('ema_alpha', DEFAULT_EMA_ALPHA))
+
+    def update(self, results: Dict[int, Dict], timestamp: Optional[float] = None) -> None:
+        """
+        Zapracuje výsledky jedné iterace {index: result}.
+
+        Každý úspěšný výsledek navíc dostane 'previous_value' (předchozí
+        škálovaná hodnota) pro CSV a log.
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        for index, result in results.items():
+            if not result['ok']:
+                continue
+            trend = self.trends[index]
+            trend.add(result['raw'], now)
+            result['previous_value'] = trend.previous if trend.previous is not None else ''
+
+    def get(self, index: int) -> RegisterTrend:
+        """Vrátí trend registru podle indexu v konfiguraci."""
+        return self.trends[index]